@@ -0,0 +1,73 @@
+from contextlib import contextmanager
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from ..core.database import db_handler, get_db
+from ..core.responses import render
+from ..core.security import CurrentUser, get_token_user
+from ..schemas.attempt import AttemptStart, AttemptAnswersUpdate, AttemptResponse
+from ..schemas.result import ResultResponse
+from ..services.attempt_service import AttemptService
+from ..services.errors import ConflictError, NotFoundError, PermissionDeniedError
+from ..services.result_service import ResultService
+
+router = APIRouter(prefix="/attempts", tags=["attempts"])
+
+@contextmanager
+def _attempt_errors():
+    # ошибки AttemptService -> HTTP
+    try:
+        yield
+    except NotFoundError as error:
+        raise HTTPException(status_code=404, detail=str(error))
+    except PermissionDeniedError as error:
+        raise HTTPException(status_code=403, detail=str(error))
+    except ConflictError as error:
+        raise HTTPException(status_code=409, detail=str(error))
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+
+@router.post("", response_model=AttemptResponse, status_code=status.HTTP_201_CREATED)
+@db_handler
+def start_attempt(
+    data: AttemptStart,
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_token_user)
+):
+    with _attempt_errors():
+        attempt = AttemptService.start_attempt(db, current_user.id, data.test_id)
+    return render(AttemptResponse, AttemptService.serialize_attempt(db, attempt))
+
+@router.get("/{attempt_id}", response_model=AttemptResponse)
+@db_handler
+def get_attempt(
+    attempt_id: int,
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_token_user)
+):
+    with _attempt_errors():
+        attempt = AttemptService.get_own_attempt(db, attempt_id, current_user.id)
+    return render(AttemptResponse, AttemptService.serialize_attempt(db, attempt))
+
+@router.patch("/{attempt_id}/answers", status_code=status.HTTP_204_NO_CONTENT)
+@db_handler
+def save_attempt_answers(
+    attempt_id: int,
+    data: AttemptAnswersUpdate,
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_token_user)
+):
+    # автосохранение вызывается часто, поэтому ответ без тела
+    with _attempt_errors():
+        AttemptService.save_answers(db, attempt_id, current_user.id, data.answers)
+    return None
+
+@router.post("/{attempt_id}/finalize", response_model=ResultResponse)
+@db_handler
+def finalize_attempt(
+    attempt_id: int,
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_token_user)
+):
+    with _attempt_errors():
+        result = AttemptService.finalize_attempt(db, attempt_id, current_user.id)
+    return render(ResultResponse, ResultService.serialize_result(result))
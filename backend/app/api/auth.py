@@ -1,54 +1,68 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from datetime import timedelta
-from ..core.database import get_db
-from ..core.security import verify_password, get_password_hash, create_access_token
+from typing import Optional
+from ..core.database import get_db, run_db
+from ..core.passwords import login_limiter, password_hasher
+from ..core.security import create_access_token, token_claims
 from ..core.config import settings
 from ..models.user import User
 from ..schemas.user import UserCreate, UserLogin, Token, UserResponse
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
-@router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def register(user_data: UserCreate, db: Session = Depends(get_db)):
-    existing_user = db.query(User).filter(User.email == user_data.email).first()
-    if existing_user:
+def _find_user(db: Session, email: str) -> Optional[User]:
+    return db.query(User).filter(User.email == email).first()
+
+def _create_user(db: Session, user_data: UserCreate, hashed_password: str) -> User:
+    if _find_user(db, user_data.email):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
-    
-    hashed_password = get_password_hash(user_data.password)
+
     db_user = User(
         email=user_data.email,
         full_name=user_data.full_name,
         role=user_data.role,
         hashed_password=hashed_password
     )
-    
+
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
     return db_user
 
-@router.post("/login", response_model=Token)
-def login(credentials: UserLogin, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == credentials.email).first()
-    
-    if not user or not verify_password(credentials.password, user.hashed_password):
+@router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
+async def register(user_data: UserCreate, db: Session = Depends(get_db)):
+    if await run_db(db, _find_user, user_data.email):
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect email or password",
-            headers={"WWW-Authenticate": "Bearer"},
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered"
         )
-    
+
+    # bcrypt считается в пуле процессов, обработчик в это время не держит поток
+    hashed_password = await password_hasher.hash(user_data.password)
+    return await run_db(db, _create_user, user_data, hashed_password)
+
+@router.post("/login", response_model=Token)
+async def login(credentials: UserLogin, db: Session = Depends(get_db)):
+    async with login_limiter:
+        user = await run_db(db, _find_user, credentials.email)
+        if not user or not await password_hasher.verify(credentials.password, user.hashed_password):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Incorrect email or password",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+        data=token_claims(user), expires_delta=access_token_expires
     )
-    
+
     return {
         "access_token": access_token,
         "token_type": "bearer",
         "user": user
-    }
\ No newline at end of file
+    }
@@ -1,12 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from typing import List
-from ..core.database import get_db
-from ..core.security import get_current_teacher
-from ..models.user import User
+from ..core.database import db_handler, get_db
+from ..core.security import CurrentUser, get_current_teacher
 from ..models.question import Question, QuestionType
 from ..models.test import Test
 from ..schemas.question import QuestionCreate, QuestionUpdate, QuestionResponse
+from ..services.answer_key import AnswerKeyService
+from ..services.question_import import QuestionImportService
+from ..services.result_service import ResultService
+from ..services.test_payload import TestPayloadService
 
 router = APIRouter(prefix="/questions", tags=["questions"])
 
@@ -15,38 +18,22 @@ def _prepare_question_payload(
     options: List[str],
     correct_answers: List[str]
 ) -> tuple[List[str], List[str]]:
-    if question_type == QuestionType.TEXT:
-        # текстовые вопросы не имеют вариантов ответа и проверяются вручную
-        return [], []
+    try:
+        return QuestionImportService.prepare_payload(question_type, options, correct_answers)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
 
-    cleaned_options = [option for option in (options or []) if option.strip()]
-    if len(cleaned_options) < 2:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Необходимо указать минимум два варианта ответа"
-        )
-
-    cleaned_correct = [answer for answer in (correct_answers or []) if answer.strip()]
-    if not cleaned_correct:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Укажите хотя бы один правильный ответ"
-        )
-
-    invalid_answers = set(cleaned_correct) - set(cleaned_options)
-    if invalid_answers:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Правильные ответы должны присутствовать в списке вариантов"
-        )
-
-    return cleaned_options, cleaned_correct
+def _compile(question: Question):
+    return AnswerKeyService.compile_question(
+        question.id, question.question_type, question.points, question.correct_answers, question.options
+    )
 
 @router.post("", response_model=QuestionResponse, status_code=status.HTTP_201_CREATED)
+@db_handler
 def create_question(
     question_data: QuestionCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_teacher)
+    current_user: CurrentUser = Depends(get_current_teacher)
 ):
     test = db.query(Test).filter(Test.id == question_data.test_id).first()
     if not test:
@@ -66,15 +53,19 @@ def create_question(
 
     db_question = Question(**payload)
     db.add(db_question)
+    TestPayloadService.touch(test)
     db.commit()
+    AnswerKeyService.invalidate(db_question.test_id)
+    TestPayloadService.invalidate(db_question.test_id)
     db.refresh(db_question)
     return db_question
 
 @router.get("/{question_id}", response_model=QuestionResponse)
+@db_handler
 def get_question(
     question_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_teacher)
+    current_user: CurrentUser = Depends(get_current_teacher)
 ):
     question = db.query(Question).filter(Question.id == question_id).first()
     if not question:
@@ -82,11 +73,12 @@ def get_question(
     return question
 
 @router.put("/{question_id}", response_model=QuestionResponse)
+@db_handler(offload=True)
 def update_question(
     question_id: int,
     question_data: QuestionUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_teacher)
+    current_user: CurrentUser = Depends(get_current_teacher)
 ):
     db_question = db.query(Question).filter(Question.id == question_id).first()
     if not db_question:
@@ -109,18 +101,26 @@ def update_question(
     update_data["options"] = prepared_options
     update_data["correct_answers"] = prepared_correct_answers
 
+    # новая версия теста пишется первой: отправки, закодированные по старому ключу, либо
+    # закоммичены до нее и попадут в remap, либо отклонятся проверкой версии (AnswerKeyService.verify)
+    TestPayloadService.touch(test)
+    db.flush()
+    previous = _compile(db_question)
     for field, value in update_data.items():
         setattr(db_question, field, value)
-    
+    ResultService.remap_question_answers(db, test.id, previous, _compile(db_question))
     db.commit()
+    AnswerKeyService.invalidate(db_question.test_id)
+    TestPayloadService.invalidate(db_question.test_id)
     db.refresh(db_question)
     return db_question
 
 @router.delete("/{question_id}", status_code=status.HTTP_204_NO_CONTENT)
+@db_handler
 def delete_question(
     question_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_teacher)
+    current_user: CurrentUser = Depends(get_current_teacher)
 ):
     db_question = db.query(Question).filter(Question.id == question_id).first()
     if not db_question:
@@ -131,5 +131,8 @@ def delete_question(
         raise HTTPException(status_code=403, detail="Not authorized")
     
     db.delete(db_question)
+    TestPayloadService.touch(test)
     db.commit()
+    AnswerKeyService.invalidate(test.id)
+    TestPayloadService.invalidate(test.id)
     return None
\ No newline at end of file
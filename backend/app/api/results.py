@@ -1,60 +1,133 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
-from ..core.database import get_db
-from ..core.security import get_current_user, get_current_teacher
-from ..models.user import User
+from starlette.concurrency import run_in_threadpool
+from typing import List, Literal, Optional
+from ..core.config import settings
+from ..core.database import db_handler, get_db
+from ..core.pagination import set_next_cursor
+from ..core.responses import render
+from ..core.security import CurrentUser, get_current_user, get_current_teacher, get_token_user
 from ..models.test import Test
 from ..models.result import Result
 from ..schemas.result import (
     TestSubmit,
+    BatchSubmitItem,
+    BatchSubmitItemResult,
     ResultResponse,
     DetailedResultResponse,
     ResultDetailResponse,
     StatisticsResponse,
+    ItemAnalysisResponse,
+    SubmissionReceiptResponse,
 )
+from ..services.errors import ConflictError
+from ..services.export_service import EXPORT_MEDIA_TYPES, ResultExportService
+from ..services.item_analysis import ItemAnalysisService
 from ..services.result_service import ResultService
+from ..services.statistics_service import StatisticsService
+from ..services.submission_queue import DONE, SubmissionQueueService
 
 router = APIRouter(prefix="/results", tags=["results"])
 
 @router.post("/submit", response_model=ResultResponse)
+@db_handler
 def submit_test(
     submission: TestSubmit,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_token_user)
 ):
     test = db.query(Test).filter(Test.id == submission.test_id).first()
     if not test:
         raise HTTPException(status_code=404, detail="Test not found")
     
-    if not test.is_active:
+    if not test.is_open:
         raise HTTPException(status_code=400, detail="Test is not active")
     
-    result = ResultService.submit_test(db, current_user.id, submission)
-    payload = ResultService.serialize_result(result)
-    return ResultResponse(**payload)
+    try:
+        result = ResultService.submit_test(db, current_user.id, submission)
+    except ConflictError as error:
+        raise HTTPException(status_code=409, detail=str(error))
+    return render(ResultResponse, ResultService.serialize_result(result))
+
+@router.post("/submit/batch", response_model=List[BatchSubmitItemResult])
+@db_handler(offload=True)
+def submit_batch(
+    submissions: List[BatchSubmitItem],
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_token_user)
+):
+    if len(submissions) > settings.MAX_BATCH_SUBMISSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many submissions in one batch (max {settings.MAX_BATCH_SUBMISSIONS})"
+        )
+
+    return render(List[BatchSubmitItemResult], ResultService.submit_batch(db, current_user, submissions))
+
+@router.post("/submissions", response_model=SubmissionReceiptResponse, status_code=status.HTTP_202_ACCEPTED)
+async def enqueue_submission(
+    submission: TestSubmit,
+    current_user: CurrentUser = Depends(get_token_user)
+):
+    # к дедлайну экзамена: подтверждение сразу после записи в журнал, оценка — в фоне;
+    # запись в журнал ждет блокировку файла SQLite, поэтому в пуле потоков, а не в цикле событий
+    if not settings.SUBMISSION_QUEUE_ENABLED:
+        raise HTTPException(status_code=503, detail="Submission queue is disabled, use /results/submit")
+
+    receipt = await run_in_threadpool(SubmissionQueueService.enqueue, current_user.id, submission)
+    return render(SubmissionReceiptResponse, {"receipt": receipt, "status": "pending"}, status_code=202)
+
+@router.get("/submissions/{receipt}", response_model=SubmissionReceiptResponse)
+@db_handler
+def get_submission_status(
+    receipt: str,
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_token_user)
+):
+    entry = SubmissionQueueService.get_status(receipt) if settings.SUBMISSION_QUEUE_ENABLED else None
+    if not entry or entry["user_id"] != current_user.id:
+        raise HTTPException(status_code=404, detail="Submission not found")
+
+    payload = {"receipt": receipt, "status": entry["status"], "error": entry["error"]}
+    if entry["status"] == DONE:
+        result = db.query(Result).filter(Result.id == entry["result_id"]).first()
+        if result:
+            payload["result"] = ResultService.serialize_result(result)
+    return render(SubmissionReceiptResponse, payload)
 
 @router.get("/my", response_model=List[DetailedResultResponse])
+@db_handler(offload=True)
 def get_my_results(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    skip: int = Query(0, ge=0),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
-    results = ResultService.get_user_results(db, current_user.id)
-    serialized: List[DetailedResultResponse] = []
+    results, next_cursor = ResultService.get_user_results(db, current_user.id, cursor, limit, skip)
+    set_next_cursor(response, next_cursor)
+    serialized = []
     for result in results:
         payload = ResultService.serialize_result(result)
         payload.update({
             "test_title": result.test.title,
             "user_name": result.user.full_name
         })
-        serialized.append(DetailedResultResponse(**payload))
-    return serialized
+        serialized.append(payload)
+    return render(List[DetailedResultResponse], serialized, response)
 
 @router.get("/test/{test_id}", response_model=List[DetailedResultResponse])
+@db_handler(offload=True)
 def get_test_results(
     test_id: int,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    skip: int = Query(0, ge=0),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_teacher)
+    current_user: CurrentUser = Depends(get_current_teacher)
 ):
     test = db.query(Test).filter(Test.id == test_id).first()
     if not test:
@@ -63,22 +136,47 @@ def get_test_results(
     if test.creator_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    results = ResultService.get_test_results(db, test_id)
-    serialized: List[DetailedResultResponse] = []
+    results, next_cursor = ResultService.get_test_results(db, test_id, cursor, limit, skip)
+    set_next_cursor(response, next_cursor)
+    serialized = []
     for result in results:
         payload = ResultService.serialize_result(result)
         payload.update({
             "test_title": result.test.title,
             "user_name": result.user.full_name
         })
-        serialized.append(DetailedResultResponse(**payload))
-    return serialized
+        serialized.append(payload)
+    return render(List[DetailedResultResponse], serialized, response)
+
+@router.get("/test/{test_id}/export")
+@db_handler
+def export_test_results(
+    test_id: int,
+    format: Literal["csv", "ndjson"] = "csv",
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_teacher)
+):
+    test = db.query(Test).filter(Test.id == test_id).first()
+    if not test:
+        raise HTTPException(status_code=404, detail="Test not found")
+
+    if test.creator_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    return StreamingResponse(
+        ResultExportService.stream(test_id, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers=ResultExportService.headers(test_id, format),
+    )
 
 @router.get("/statistics/{test_id}", response_model=StatisticsResponse)
+@db_handler(offload=True)
 def get_test_statistics(
     test_id: int,
+    include_questions: bool = False,
+    exact: bool = False,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_teacher)
+    current_user: CurrentUser = Depends(get_current_teacher)
 ):
     test = db.query(Test).filter(Test.id == test_id).first()
     if not test:
@@ -87,13 +185,30 @@ def get_test_statistics(
     if test.creator_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    return ResultService.get_statistics(db, test_id)
+    return render(StatisticsResponse, StatisticsService.get_statistics(db, test_id, include_questions, exact))
+
+@router.get("/statistics/{test_id}/questions", response_model=ItemAnalysisResponse)
+@db_handler(offload=True)
+def get_item_analysis(
+    test_id: int,
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_teacher)
+):
+    test = db.query(Test).filter(Test.id == test_id).first()
+    if not test:
+        raise HTTPException(status_code=404, detail="Test not found")
+
+    if test.creator_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    return render(ItemAnalysisResponse, ItemAnalysisService.get_item_analysis(db, test_id))
 
 @router.get("/{result_id}", response_model=ResultDetailResponse)
+@db_handler
 def get_result_detail(
     result_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     result = db.query(Result).filter(Result.id == result_id).first()
     if not result:
@@ -112,4 +227,4 @@ def get_result_detail(
         "questions": ResultService.build_question_details(result)
     })
 
-    return ResultDetailResponse(**payload)
\ No newline at end of file
+    return render(ResultDetailResponse, payload)
\ No newline at end of file
@@ -1,45 +1,65 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Query, Request, Response, status
 from sqlalchemy.orm import Session
-from typing import List, Union
-from ..core.database import get_db
-from ..core.security import get_current_user, get_current_teacher
-from ..models.user import User
-from ..schemas.test import TestCreate, TestUpdate, TestResponse, TestListResponse
-from ..schemas.question import QuestionForStudent
+from typing import List, Optional, Union
+from ..core.config import settings
+from ..core.database import db_handler, get_db, run_db
+from ..core.pagination import set_next_cursor
+from ..core.security import CurrentUser, get_current_teacher, get_token_user
+from ..models.test import Test
+from ..schemas.test import TestClone, TestCreate, TestUpdate, TestResponse, TestListResponse, RegradeStatus
+from ..schemas.question import QuestionForStudent, QuestionOrder, QuestionResponse
+from ..services.question_import import QuestionImportService
+from ..services.regrade_service import RegradeService
+from ..services.submission_queue import SubmissionQueueService
+from ..services.test_payload import TestPayloadService
 from ..services.test_service import TestService
 
 router = APIRouter(prefix="/tests", tags=["tests"])
 
 @router.post("", response_model=TestResponse, status_code=status.HTTP_201_CREATED)
+@db_handler
 def create_test(
     test_data: TestCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_teacher)
+    current_user: CurrentUser = Depends(get_current_teacher)
 ):
-    return TestService.create_test(db, test_data, current_user.id)
+    # сериализуем внутри обработчика: вне сессии ленивая загрузка questions недоступна
+    return TestResponse.model_validate(TestService.create_test(db, test_data, current_user.id))
 
 @router.get("", response_model=List[TestListResponse])
+@db_handler(offload=True)
 def get_tests(
-    skip: int = 0,
-    limit: int = 100,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    skip: int = Query(0, ge=0),
     active_only: bool = True,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_token_user)
 ):
-    tests = TestService.get_tests(db, skip, limit, active_only)
+    tests, next_cursor = TestService.get_tests(db, cursor, limit, active_only, skip)
+    set_next_cursor(response, next_cursor)
     return [
         TestListResponse(
             **test.__dict__,
-            question_count=len(test.questions)
-        ) for test in tests
+            question_count=question_count
+        ) for test, question_count in tests
     ]
 
 @router.get("/my", response_model=List[TestResponse])
+@db_handler(offload=True)
 def get_my_tests(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    skip: int = Query(0, ge=0),
+    include_archived: bool = False,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_teacher)
+    current_user: CurrentUser = Depends(get_current_teacher)
 ):
-    return TestService.get_teacher_tests(db, current_user.id)
+    tests, next_cursor = TestService.get_teacher_tests(db, current_user.id, cursor, limit, include_archived, skip)
+    set_next_cursor(response, next_cursor)
+    return [TestResponse.model_validate(test) for test in tests]
 
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
@@ -53,48 +73,40 @@ from ..schemas.test import TestForStudentResponse, TestResponse
 from ..schemas.question import QuestionForStudent
 
 @router.get("/{test_id}", response_model=Union[TestResponse, TestForStudentResponse])
+@db_handler
 def get_test(
     test_id: int,
+    if_none_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_token_user)
 ):
+    if current_user.role == "student":
+        # ученикам отдаем готовые байты из кэша: содержимое одинаково для всех
+        payload = TestPayloadService.get_student_payload(db, test_id)
+        if not payload:
+            raise HTTPException(status_code=404, detail="Test not found")
+
+        headers = {"ETag": payload.etag, "Cache-Control": "private, no-cache"}
+        if TestPayloadService.etag_matches(if_none_match, payload.etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(content=payload.body, media_type="application/json", headers=headers)
+
     test = TestService.get_test(db, test_id)
     if not test:
         raise HTTPException(status_code=404, detail="Test not found")
 
-    if current_user.role == "student":
-        return TestForStudentResponse(
-            id=test.id,
-            title=test.title,
-            description=test.description,
-            duration_minutes=test.duration_minutes,
-            is_active=test.is_active,
-            created_at=test.created_at,
-            updated_at=test.updated_at,
-            questions=[
-                QuestionForStudent(
-                    id=q.id,
-                    question_text=q.question_text,
-                    question_type=q.question_type,
-                    options=q.options,
-                    points=q.points,
-                    order_number=q.order_number
-                )
-                for q in test.questions
-            ]
-        )
-    else:
-        # для учителя отдаем полный TestResponse с correct_answers
-        return TestResponse.from_orm(test)
+    # для учителя отдаем полный TestResponse с correct_answers
+    return TestResponse.from_orm(test)
 
 
 
 @router.put("/{test_id}", response_model=TestResponse)
+@db_handler
 def update_test(
     test_id: int,
     test_data: TestUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_teacher)
+    current_user: CurrentUser = Depends(get_current_teacher)
 ):
     test = TestService.get_test(db, test_id)
     if not test:
@@ -103,20 +115,174 @@ def update_test(
     if test.creator_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    return TestService.update_test(db, test_id, test_data)
+    return TestResponse.model_validate(TestService.update_test(db, test_id, test_data))
 
 @router.delete("/{test_id}", status_code=status.HTTP_204_NO_CONTENT)
+@db_handler
 def delete_test(
     test_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_teacher)
+    current_user: CurrentUser = Depends(get_current_teacher)
 ):
-    test = TestService.get_test(db, test_id)
-    if not test:
+    # для проверки владельца достаточно одной колонки, тест в сессию не загружается
+    creator_id = db.query(Test.creator_id).filter(Test.id == test_id).scalar()
+    if creator_id is None:
         raise HTTPException(status_code=404, detail="Test not found")
     
-    if test.creator_id != current_user.id:
+    if creator_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized")
     
+    if settings.SUBMISSION_QUEUE_ENABLED:
+        # отправки из журнала не должны дописать результаты в удаляемый тест
+        SubmissionQueueService.cancel_test(test_id)
     TestService.delete_test(db, test_id)
-    return None
\ No newline at end of file
+    return None
+
+@router.post("/{test_id}/archive", response_model=TestResponse)
+@db_handler
+def archive_test(
+    test_id: int,
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_teacher)
+):
+    test = TestService.get_test(db, test_id)
+    if not test:
+        raise HTTPException(status_code=404, detail="Test not found")
+
+    if test.creator_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    return TestResponse.model_validate(TestService.set_archived(db, test, True))
+
+@router.post("/{test_id}/restore", response_model=TestResponse)
+@db_handler
+def restore_test(
+    test_id: int,
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_teacher)
+):
+    test = TestService.get_test(db, test_id)
+    if not test:
+        raise HTTPException(status_code=404, detail="Test not found")
+
+    if test.creator_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    return TestResponse.model_validate(TestService.set_archived(db, test, False))
+
+@router.post("/{test_id}/clone", response_model=TestResponse, status_code=status.HTTP_201_CREATED)
+@db_handler(offload=True)
+def clone_test(
+    test_id: int,
+    clone_data: Optional[TestClone] = None,
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_teacher)
+):
+    test = TestService.get_test(db, test_id)
+    if not test:
+        raise HTTPException(status_code=404, detail="Test not found")
+
+    if test.creator_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    try:
+        clone = TestService.clone_test(db, test, clone_data or TestClone(), current_user.id)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    return TestResponse.model_validate(clone)
+
+@router.put("/{test_id}/questions/order", response_model=List[QuestionResponse])
+@db_handler
+def reorder_questions(
+    test_id: int,
+    order: QuestionOrder,
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_teacher)
+):
+    test = TestService.get_test(db, test_id)
+    if not test:
+        raise HTTPException(status_code=404, detail="Test not found")
+
+    if test.creator_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    try:
+        questions = TestService.reorder_questions(db, test, order.question_ids)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    return [QuestionResponse.model_validate(question) for question in questions]
+
+@router.post("/{test_id}/regrade", response_model=RegradeStatus, status_code=status.HTTP_202_ACCEPTED)
+@db_handler
+def regrade_test(
+    test_id: int,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_teacher)
+):
+    test = TestService.get_test(db, test_id)
+    if not test:
+        raise HTTPException(status_code=404, detail="Test not found")
+
+    if test.creator_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    if not RegradeService.start_job(test_id):
+        raise HTTPException(status_code=409, detail="Regrade already in progress")
+
+    background_tasks.add_task(RegradeService.run_job, test_id)
+    return RegradeService.get_job(test_id)
+
+@router.get("/{test_id}/regrade", response_model=RegradeStatus)
+@db_handler
+def get_regrade_status(
+    test_id: int,
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_teacher)
+):
+    test = TestService.get_test(db, test_id)
+    if not test:
+        raise HTTPException(status_code=404, detail="Test not found")
+
+    if test.creator_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    job = RegradeService.get_job(test_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="No regrade has been started for this test")
+    return job
+
+def _import_questions(db: Session, test_id: int, user_id: int, raw_rows: list):
+    test = TestService.get_test(db, test_id)
+    if not test:
+        raise HTTPException(status_code=404, detail="Test not found")
+
+    if test.creator_id != user_id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    rows, errors = QuestionImportService.validate_rows(raw_rows)
+    if errors:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail={"message": "Import rejected, nothing was saved", "rows": errors}
+        )
+    return QuestionImportService.insert_questions(db, test, rows)
+
+@router.post("/{test_id}/questions/bulk", response_model=List[QuestionResponse], status_code=status.HTTP_201_CREATED)
+async def import_questions(
+    test_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_teacher)
+):
+    # JSON-массив вопросов или файл CSV/XLSX; все строки проверяются до вставки, вставка — одним INSERT
+    raw_rows = await QuestionImportService.read_rows(request)
+    if not raw_rows:
+        raise HTTPException(status_code=400, detail="No questions to import")
+    if len(raw_rows) > settings.MAX_BULK_QUESTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many questions in one import (max {settings.MAX_BULK_QUESTIONS})"
+        )
+
+    return await run_db(db, _import_questions, test_id, current_user.id, raw_rows, offload=True)
@@ -1,12 +1,9 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from ..core.database import get_db
-from ..core.security import get_current_user
-from ..models.user import User
+from ..core.security import CurrentUser, get_current_user
 from ..schemas.user import UserResponse
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 @router.get("/me", response_model=UserResponse)
-def get_current_user_info(current_user: User = Depends(get_current_user)):
+async def get_current_user_info(current_user: CurrentUser = Depends(get_current_user)):
     return current_user
\ No newline at end of file
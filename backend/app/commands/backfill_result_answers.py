@@ -0,0 +1,27 @@
+import argparse
+from ..core.database import SessionLocal, init_db
+from ..models import attempt, question, result, result_answer, submission_receipt, test, test_statistics, user  # регистрация всех моделей в Base.metadata
+from ..services.result_answers import BACKFILL_CHUNK_SIZE, ResultAnswerService
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Заполнить таблицу result_answers по сохраненным Result.answers"
+    )
+    parser.add_argument("test_ids", nargs="*", type=int, help="id тестов (по умолчанию все)")
+    parser.add_argument("--chunk-size", type=int, default=BACKFILL_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    try:
+        processed = ResultAnswerService.backfill(db, args.test_ids or None, args.chunk_size)
+    finally:
+        db.close()
+
+    print(f"{processed} results backfilled")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,31 @@
+import argparse
+from ..core.database import SessionLocal, init_db
+from ..models import attempt, question, result, result_answer, submission_receipt, test, test_statistics, user  # регистрация всех моделей в Base.metadata
+from ..services.statistics_service import StatisticsService
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Пересчитать сводную статистику тестов по таблице results"
+    )
+    parser.add_argument("test_ids", nargs="*", type=int, help="id тестов (по умолчанию все)")
+    parser.add_argument("--check", action="store_true", help="только проверить расхождения, не записывать")
+    args = parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    try:
+        report = StatisticsService.rebuild_summaries(db, args.test_ids or None, check_only=args.check)
+    finally:
+        db.close()
+
+    drifted = [entry for entry in report if entry["drift"]]
+    for entry in drifted:
+        print(f"test {entry['test_id']}: {entry['attempts']} attempts, drift in {', '.join(entry['drift'])}")
+    action = "found" if args.check else "fixed"
+    print(f"{len(report)} tests checked, {len(drifted)} with drift {action}")
+    return 1 if args.check and drifted else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
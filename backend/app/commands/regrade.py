@@ -0,0 +1,28 @@
+import argparse
+from ..core.database import SessionLocal, init_db
+from ..models import attempt, question, result, result_answer, submission_receipt, test, test_statistics, user  # регистрация всех моделей в Base.metadata
+from ..services.regrade_service import REGRADE_CHUNK_SIZE, RegradeService
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Пересчитать баллы сохраненных результатов теста по текущему ключу ответов"
+    )
+    parser.add_argument("test_id", type=int)
+    parser.add_argument("--chunk-size", type=int, default=REGRADE_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    def report(status: dict) -> None:
+        print(f"{status['processed']}/{status['total']} processed, {status['updated']} updated", flush=True)
+
+    init_db()
+    db = SessionLocal()
+    try:
+        RegradeService.regrade_test(db, args.test_id, chunk_size=args.chunk_size, progress=report)
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -3,11 +3,51 @@ from typing import List
 
 class Settings(BaseSettings):
     DATABASE_URL: str = "sqlite:///./testing_system.db"
+    USE_ASYNC_DB: bool = False
+    ASYNC_DATABASE_URL: str = ""
+    DB_POOL_SIZE: int = 20
+    DB_MAX_OVERFLOW: int = 20  # 20 + 20 — по числу потоков anyio по умолчанию (40)
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 15000
+    SQLITE_CACHE_SIZE_KB: int = 65536
+    SQLITE_MMAP_SIZE: int = 268435456
     SECRET_KEY: str = "your-secret-key-change-this"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    TOKEN_CACHE_SIZE: int = 10000
+    TOKEN_CACHE_TTL_SECONDS: int = 60
+    TOKEN_USER_CLAIMS: bool = False  # роль и uid из токена без БД: смена роли или удаление видны только после exp
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2  # 0: хеширование в пуле потоков текущего процесса
+    PASSWORD_HASH_MAX_PENDING: int = 256
+    LOGIN_CONCURRENCY: int = 32
+    LOGIN_QUEUE_TIMEOUT_SECONDS: float = 10.0
+    FAST_JSON_RESPONSES: bool = False  # требует orjson
     CORS_ORIGINS: List[str] = ["http://localhost:3000", "http://localhost:5173", "http://127.0.0.1:5173", 'http://localhost:8080']
     PASS_PERCENTAGE: int = 60
+    ANSWER_KEY_CACHE_SIZE: int = 256
+    STUDENT_PAYLOAD_CACHE_SIZE: int = 256
+    ITEM_ANALYSIS_CACHE_SIZE: int = 64
+    MAX_BATCH_SUBMISSIONS: int = 1000
+    MAX_BULK_QUESTIONS: int = 5000
+    ATTEMPT_GRACE_SECONDS: int = 30  # запас на сетевую задержку автосохранения после дедлайна
+    STORE_RESULT_ANSWERS: bool = False  # после включения выполнить python -m app.commands.backfill_result_answers
+    SUBMISSION_QUEUE_ENABLED: bool = False  # прием отправок через журнал и фоновую запись пачками
+    SUBMISSION_QUEUE_PATH: str = "./submission_queue.db"
+    SUBMISSION_QUEUE_SYNCHRONOUS: str = "NORMAL"  # FULL — квитанция переживает и отключение питания
+    SUBMISSION_QUEUE_BATCH_SIZE: int = 500
+    SUBMISSION_QUEUE_POLL_SECONDS: float = 0.2
+    SUBMISSION_QUEUE_RETENTION_HOURS: int = 72
+    SUBMISSION_QUEUE_MAX_ATTEMPTS: int = 10  # повторы после временных ошибок базы, затем failed
+    SUBMISSION_QUEUE_RETRY_MAX_SECONDS: float = 30.0
+    SUBMISSION_QUEUE_CLAIM_TIMEOUT_SECONDS: int = 300  # записи упавшего worker снова становятся pending
+    METRICS_ENABLED: bool = True
+    SLOW_REQUEST_MS: int = 1000  # 0: не логировать медленные запросы
+    SLOW_REQUEST_TOP_STATEMENTS: int = 10
     
     class Config:
         env_file = ".env"
@@ -1,22 +1,177 @@
-from sqlalchemy import create_engine
+import functools
+from datetime import datetime
+from sqlalchemy import DateTime, bindparam, create_engine, event, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
 from .config import settings
+from .metrics import instrument_engine
+
+IS_SQLITE = settings.DATABASE_URL.startswith("sqlite")
+IS_SQLITE_MEMORY = IS_SQLITE and (":memory:" in settings.DATABASE_URL or settings.DATABASE_URL.rstrip("/") == "sqlite:")
+
+def engine_options() -> dict:
+    options = {"pool_pre_ping": settings.DB_POOL_PRE_PING}
+    if not IS_SQLITE_MEMORY:
+        # запрос держит соединение от get_current_user до конца обработчика; пул ограничен,
+        # сверх pool_size + max_overflow запросы ждут соединение не дольше pool_timeout
+        options.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+        )
+    return options
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    cursor.execute(f"PRAGMA cache_size={-int(settings.SQLITE_CACHE_SIZE_KB)}")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+    cursor.close()
 
 engine = create_engine(
     settings.DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
+    connect_args={
+        "check_same_thread": False,
+        "timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000,
+    } if IS_SQLITE else {},
+    **engine_options()
 )
 
+if IS_SQLITE:
+    event.listen(engine, "connect", apply_sqlite_pragmas)
+if settings.METRICS_ENABLED:
+    instrument_engine(engine)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
-def get_db():
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+def get_async_database_url() -> str:
+    if settings.ASYNC_DATABASE_URL:
+        return settings.ASYNC_DATABASE_URL
+    scheme, separator, rest = settings.DATABASE_URL.partition("://")
+    return ASYNC_DRIVERS.get(scheme.split("+")[0], scheme) + separator + rest
+
+async_engine = None
+AsyncSessionLocal = None
+AsyncSession = None
+
+if settings.USE_ASYNC_DB:
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+    async_engine = create_async_engine(get_async_database_url(), **engine_options())
+    if IS_SQLITE:
+        event.listen(async_engine.sync_engine, "connect", apply_sqlite_pragmas)
+    if settings.METRICS_ENABLED:
+        instrument_engine(async_engine.sync_engine)
+    # expire_on_commit=False: после commit атрибуты читаются без ленивого SELECT вне run_sync
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+def get_sync_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+get_db = get_async_db if settings.USE_ASYNC_DB else get_sync_db
+
+def _run_with_sync_session(func, *args, **kwargs):
+    # отдельная синхронная сессия на время вызова в потоке пула
+    db = SessionLocal()
+    try:
+        return func(*args, **{**kwargs, "db": db})
+    finally:
+        db.close()
+
+async def run_db(db, func, *args, offload: bool = False, **kwargs):
+    # func(sync_session, ...) выполняется там, где можно работать с синхронной сессией;
+    # offload=True — в async-режиме тоже в пуле потоков, со своей синхронной сессией
+    if AsyncSession is not None and isinstance(db, AsyncSession):
+        if offload:
+            return await run_in_threadpool(
+                _run_with_sync_session, lambda db: func(db, *args, **kwargs)
+            )
+        return await db.run_sync(func, *args, **kwargs)
+    return await run_in_threadpool(func, db, *args, **kwargs)
+
+def db_handler(func=None, *, offload: bool = False):
+    # Превращает синхронный обработчик с параметром db в async def.
+    # Sync-режим: тело выполняется в пуле потоков, как у обычного def-роута.
+    # Async-режим: тело выполняется через AsyncSession.run_sync на event loop, без потоков,
+    # поэтому пока оно считает, остальные запросы ждут. Обработчики с заметной работой
+    # на CPU (сериализация списков, статистика, пакетная проверка) помечаются offload=True
+    # и выполняются в пуле потоков с синхронной сессией.
+    if func is None:
+        return functools.partial(db_handler, offload=offload)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        db = kwargs.get("db")
+        if AsyncSession is not None and isinstance(db, AsyncSession):
+            if offload:
+                return await run_in_threadpool(_run_with_sync_session, func, *args, **kwargs)
+            return await db.run_sync(lambda sync_db: func(*args, **{**kwargs, "db": sync_db}))
+        return await run_in_threadpool(func, *args, **kwargs)
+
+    return wrapper
+
+def add_missing_columns():
+    # create_all не добавляет новые столбцы к существующим таблицам; добавляются только
+    # nullable-столбцы без значения по умолчанию, остальное требует ручной миграции
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable or column.default is not None:
+                continue
+            with engine.begin() as connection:
+                connection.execute(text(
+                    f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}"
+                ))
+
+def drop_legacy_statistics():
+    # сводки test_statistics производные от results: таблица с гистограммой в JSON удаляется
+    # и создается заново, строки пересчитываются при следующей отправке или rebuild_summaries
+    inspector = inspect(engine)
+    if not inspector.has_table("test_statistics"):
+        return
+    if "bucket_0" not in {column["name"] for column in inspector.get_columns("test_statistics")}:
+        Base.metadata.tables["test_statistics"].drop(bind=engine)
+
+def fill_missing_timestamps():
+    # (created_at, id) и (completed_at, id) — ключи курсора: в таблицах, созданных до NOT NULL,
+    # строки с NULL не попали бы ни на одну страницу
+    now = bindparam("now", datetime.utcnow(), type_=DateTime)
+    with engine.begin() as connection:
+        connection.execute(
+            text("UPDATE tests SET created_at = COALESCE(updated_at, :now) WHERE created_at IS NULL").bindparams(now)
+        )
+        connection.execute(
+            text("UPDATE results SET completed_at = :now WHERE completed_at IS NULL").bindparams(now)
+        )
+
 def init_db():
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    drop_legacy_statistics()
+    Base.metadata.create_all(bind=engine)
+    add_missing_columns()
+    fill_missing_timestamps()
+    # create_all не добавляет новые индексы к уже существующим таблицам
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
@@ -0,0 +1,242 @@
+import logging
+import time
+from contextvars import ContextVar
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import event
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UNMATCHED_ROUTE = "unmatched"
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class RequestStats:
+    # SQL текущего запроса; объект общий для обработчика в пуле потоков и run_sync
+    __slots__ = ("statements", "db_seconds", "breakdown")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.breakdown: Dict[str, List] = {}
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.statements += 1
+        self.db_seconds += elapsed
+        entry = self.breakdown.get(statement)
+        if entry is None:
+            self.breakdown[statement] = [1, elapsed]
+        else:
+            entry[0] += 1
+            entry[1] += elapsed
+
+    def top_statements(self, limit: int) -> List[Tuple[str, int, float]]:
+        ordered = sorted(self.breakdown.items(), key=lambda item: item[1][1], reverse=True)
+        return [(statement, count, total) for statement, (count, total) in ordered[:limit]]
+
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+class RouteMetrics:
+    __slots__ = ("buckets", "latency_sum", "count", "response_bytes", "statements", "db_seconds")
+
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.latency_sum = 0.0
+        self.count = 0
+        self.response_bytes = 0
+        self.statements = 0
+        self.db_seconds = 0.0
+
+
+class MetricsRegistry:
+    # метки — шаблон маршрута, а не фактический путь: число рядов не растет с числом id
+    def __init__(self):
+        self._routes: Dict[Tuple[str, str, str], RouteMetrics] = {}
+        self._in_flight: Dict[str, int] = {}
+        self._statements = 0
+        self._db_seconds = 0.0
+        self._lock = Lock()
+
+    def started(self, method: str) -> None:
+        with self._lock:
+            self._in_flight[method] = self._in_flight.get(method, 0) + 1
+
+    def finished(
+        self, method: str, route: str, status: int, elapsed: float, size: int, stats: RequestStats
+    ) -> None:
+        key = (method, route, str(status))
+        with self._lock:
+            self._in_flight[method] -= 1
+            metrics = self._routes.get(key)
+            if metrics is None:
+                metrics = self._routes[key] = RouteMetrics()
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if elapsed <= bound:
+                    metrics.buckets[index] += 1
+                    break
+            metrics.latency_sum += elapsed
+            metrics.count += 1
+            metrics.response_bytes += size
+            metrics.statements += stats.statements
+            metrics.db_seconds += stats.db_seconds
+
+    def record_statement(self, elapsed: float) -> None:
+        with self._lock:
+            self._statements += 1
+            self._db_seconds += elapsed
+
+    def db_totals(self) -> Tuple[int, float]:
+        with self._lock:
+            return self._statements, self._db_seconds
+
+    def render(self) -> str:
+        with self._lock:
+            routes = [(key, list(metrics.buckets), metrics.latency_sum, metrics.count, metrics.response_bytes,
+                       metrics.statements, metrics.db_seconds) for key, metrics in self._routes.items()]
+            in_flight = dict(self._in_flight)
+            statements, db_seconds = self._statements, self._db_seconds
+
+        lines = [
+            "# HELP http_request_duration_seconds Request latency by route.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (method, route, status), buckets, latency_sum, count, _, _, _ in routes:
+            labels = f'method="{method}",route="{_escape(route)}",status="{status}"'
+            cumulative = 0
+            for bound, bucket in zip(LATENCY_BUCKETS, buckets):
+                cumulative += bucket
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f"http_request_duration_seconds_sum{{{labels}}} {latency_sum:.6f}")
+            lines.append(f"http_request_duration_seconds_count{{{labels}}} {count}")
+
+        for name, kind, help_text, position in (
+            ("http_response_size_bytes_total", "counter", "Response body bytes by route.", 4),
+            ("http_db_statements_total", "counter", "SQL statements issued by requests.", 5),
+            ("http_db_duration_seconds_total", "counter", "Time spent in SQL by requests.", 6),
+        ):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for row in routes:
+                method, route, status = row[0]
+                value = row[position]
+                value = f"{value:.6f}" if isinstance(value, float) else value
+                lines.append(f'{name}{{method="{method}",route="{_escape(route)}",status="{status}"}} {value}')
+
+        lines.append("# HELP http_requests_in_flight Requests currently being processed.")
+        lines.append("# TYPE http_requests_in_flight gauge")
+        for method, value in in_flight.items():
+            lines.append(f'http_requests_in_flight{{method="{method}"}} {value}')
+
+        lines.append("# HELP db_statements_total SQL statements issued by the process, background work included.")
+        lines.append("# TYPE db_statements_total counter")
+        lines.append(f"db_statements_total {statements}")
+        lines.append("# HELP db_duration_seconds_total Time spent in SQL by the process.")
+        lines.append("# TYPE db_duration_seconds_total counter")
+        lines.append(f"db_duration_seconds_total {db_seconds:.6f}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+metrics_registry = MetricsRegistry()
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # время начала хранится в контексте выполнения: он живет один запрос и не переживает ошибку
+    context._query_started = time.perf_counter()
+
+
+def record_statement(context, statement: str) -> None:
+    started = getattr(context, "_query_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    metrics_registry.record_statement(elapsed)
+    stats = current_request.get()
+    if stats is not None:
+        stats.record(statement, elapsed)
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    record_statement(context, statement)
+
+
+def handle_error(exception_context):
+    # неудачный запрос тоже занимал базу, например ожидая блокировку
+    if exception_context.execution_context is not None:
+        record_statement(exception_context.execution_context, exception_context.statement)
+
+
+def instrument_engine(engine) -> None:
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(engine, "handle_error", handle_error)
+
+
+def route_template(scope) -> str:
+    # роутер кладет в scope маршрут без префикса include_router; префикс — часть пути перед ним
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if template is None:
+        return UNMATCHED_ROUTE
+    path = scope["path"]
+    regex = getattr(route, "path_regex", None)
+    if regex is not None and not regex.match(path):
+        for index in range(1, len(path)):
+            if path[index] == "/" and regex.match(path[index:]):
+                return path[:index] + template
+    return template
+
+
+class MetricsMiddleware:
+    # чистый ASGI, без BaseHTTPMiddleware: тело ответа не буферизуется, потоковые ответы не ломаются
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        # маршрут известен только после роутинга, поэтому in-flight — по методу
+        metrics_registry.started(method)
+        stats = RequestStats()
+        token = current_request.set(stats)
+        response = {"status": 500, "size": 0}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["size"] += len(message.get("body", b""))
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            current_request.reset(token)
+            route = route_template(scope)
+            metrics_registry.finished(method, route, response["status"], elapsed, response["size"], stats)
+            if settings.SLOW_REQUEST_MS and elapsed * 1000 >= settings.SLOW_REQUEST_MS:
+                log_slow_request(method, route, response["status"], elapsed, stats)
+
+
+def log_slow_request(method: str, route: str, status: int, elapsed: float, stats: RequestStats) -> None:
+    breakdown = "".join(
+        f"\n  {count:>4} x {total * 1000:9.2f} ms  {' '.join(statement.split())[:200]}"
+        for statement, count, total in stats.top_statements(settings.SLOW_REQUEST_TOP_STATEMENTS)
+    )
+    logger.warning(
+        "slow request %s %s -> %s in %.1f ms: %s statements, %.1f ms in SQL%s",
+        method, route, status, elapsed * 1000, stats.statements, stats.db_seconds * 1000, breakdown,
+    )
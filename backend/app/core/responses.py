@@ -0,0 +1,33 @@
+from functools import lru_cache
+from typing import Any, Optional
+from fastapi import Response
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import TypeAdapter
+from .config import settings
+
+if settings.FAST_JSON_RESPONSES:
+    import orjson  # noqa: F401  необязательная зависимость, нужна только в быстром режиме
+
+DefaultResponse = ORJSONResponse if settings.FAST_JSON_RESPONSES else JSONResponse
+
+# заголовки тела формирует сам ответ; остальное переносится из Response-параметра обработчика
+_BODY_HEADERS = {"content-length", "content-type"}
+
+@lru_cache(maxsize=None)
+def type_adapter(response_type: Any) -> TypeAdapter:
+    return TypeAdapter(response_type)
+
+def render(response_type: Any, content: Any, response: Optional[Response] = None, status_code: int = 200):
+    # одна проверка через pydantic; в быстром режиме результат сразу кодируется orjson,
+    # минуя повторную валидацию response_model и jsonable_encoder
+    adapter = type_adapter(response_type)
+    validated = adapter.validate_python(content)
+    if not settings.FAST_JSON_RESPONSES:
+        return validated
+
+    fast = ORJSONResponse(adapter.dump_python(validated), status_code=status_code)
+    if response is not None:
+        for name, value in response.headers.items():
+            if name not in _BODY_HEADERS:
+                fast.headers.append(name, value)
+    return fast
@@ -1,22 +1,75 @@
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional
+from threading import Lock
+from typing import Dict, NamedTuple, Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 from .config import settings
-from .database import get_db
-from ..models.user import User
+from .database import get_db, run_db
+from ..models.user import User, UserRole
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+class CurrentUser(NamedTuple):
+    # снимок пользователя для авторизации; ORM-объект User в обработчики не передается
+    id: int
+    email: str
+    full_name: str
+    role: UserRole
 
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+class TokenCacheEntry(NamedTuple):
+    claims: Dict
+    user: CurrentUser
+    expires_at: float
+
+class TokenCache:
+    def __init__(self, max_size: int, ttl_seconds: int):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._items: "OrderedDict[str, TokenCacheEntry]" = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, token: str) -> Optional[TokenCacheEntry]:
+        with self._lock:
+            entry = self._items.get(token)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.time():
+                del self._items[token]
+                return None
+            self._items.move_to_end(token)
+            return entry
+
+    def put(self, token: str, claims: Dict, user: CurrentUser) -> None:
+        if self.max_size <= 0:
+            return
+        # запись живет не дольше TTL и не дольше exp самого токена
+        expires_at = min(time.time() + self.ttl_seconds, float(claims.get("exp", 0)))
+        with self._lock:
+            self._items[token] = TokenCacheEntry(claims, user, expires_at)
+            self._items.move_to_end(token)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            for token in [token for token, entry in self._items.items() if entry.user.id == user_id]:
+                del self._items[token]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+token_cache = TokenCache(settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_TTL_SECONDS)
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_cached_user(mapper, connection, target):
+    token_cache.invalidate_user(target.id)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -28,29 +81,74 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+def token_claims(user: User) -> dict:
+    claims = {"sub": user.email}
+    if settings.TOKEN_USER_CLAIMS:
+        claims.update({"uid": user.id, "role": UserRole(user.role).value, "name": user.full_name})
+    return claims
+
+credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Could not validate credentials",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+def decode_token(token: str) -> Dict:
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
     except JWTError:
         raise credentials_exception
-    
-    user = db.query(User).filter(User.email == email).first()
+    if payload.get("sub") is None:
+        raise credentials_exception
+    return payload
+
+def _load_user(db: Session, email: str) -> Optional[CurrentUser]:
+    row = (
+        db.query(User.id, User.email, User.full_name, User.role)
+        .filter(User.email == email)
+        .first()
+    )
+    return CurrentUser(*row) if row else None
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> CurrentUser:
+    entry = token_cache.get(token)
+    if entry is not None:
+        return entry.user
+
+    payload = decode_token(token)
+    user = await run_db(db, _load_user, payload["sub"])
     if user is None:
         raise credentials_exception
+
+    token_cache.put(token, payload, user)
     return user
 
-def get_current_teacher(current_user: User = Depends(get_current_user)) -> User:
+async def get_token_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> CurrentUser:
+    # для горячих маршрутов: если в токене есть uid/role, пользователь берется из claims без БД
+    entry = token_cache.get(token)
+    if entry is not None:
+        return entry.user
+
+    payload = decode_token(token)
+    if settings.TOKEN_USER_CLAIMS and "uid" in payload and "role" in payload:
+        try:
+            user = CurrentUser(
+                id=int(payload["uid"]),
+                email=payload["sub"],
+                full_name=payload.get("name", ""),
+                role=UserRole(payload["role"]),
+            )
+        except ValueError:
+            raise credentials_exception
+        token_cache.put(token, payload, user)
+        return user
+
+    return await get_current_user(token, db)
+
+async def get_current_teacher(current_user: CurrentUser = Depends(get_current_user)) -> CurrentUser:
     if current_user.role != "teacher":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
         )
-    return current_user
\ No newline at end of file
+    return current_user
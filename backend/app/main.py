@@ -1,13 +1,20 @@
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from .core.config import settings
 from .core.database import init_db
-from .api import auth, tests, questions, results, users
+from .core.metrics import PROMETHEUS_MEDIA_TYPE, MetricsMiddleware, metrics_registry
+from .core.passwords import password_hasher
+from .core.pagination import NEXT_CURSOR_HEADER
+from .core.responses import DefaultResponse
+from .services.submission_queue import SubmissionQueueService
+from .api import attempts, auth, tests, questions, results, users
 
 app = FastAPI(
     title="Testing System API",
     description="API для системы тестирования знаний",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=DefaultResponse
 )
 
 app.add_middleware(
@@ -16,17 +23,31 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag"],
 )
 
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 app.include_router(auth.router, prefix="/api")
 app.include_router(tests.router, prefix="/api")
 app.include_router(questions.router, prefix="/api")
 app.include_router(results.router, prefix="/api")
+app.include_router(attempts.router, prefix="/api")
 app.include_router(users.router, prefix="/api")
 
 @app.on_event("startup")
 def on_startup():
     init_db()
+    password_hasher.start()
+    if settings.SUBMISSION_QUEUE_ENABLED:
+        # незавершенные записи журнала дорабатываются первым же проходом worker
+        SubmissionQueueService.start()
+
+@app.on_event("shutdown")
+def on_shutdown():
+    password_hasher.shutdown()
+    SubmissionQueueService.stop()
 
 @app.get("/")
 def root():
@@ -34,4 +55,16 @@ def root():
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    if not settings.METRICS_ENABLED:
+        return PlainTextResponse("metrics are disabled\n", status_code=404)
+    # исходы и задержка входа — в http_request_duration_seconds{route="/api/auth/login"}
+    lines = [
+        "# HELP password_hash_queue Password hashing tasks waiting or running.",
+        "# TYPE password_hash_queue gauge",
+        f"password_hash_queue {password_hasher.pending}",
+    ]
+    return PlainTextResponse(metrics_registry.render() + "\n".join(lines) + "\n", media_type=PROMETHEUS_MEDIA_TYPE)
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, ForeignKey, DateTime, JSON, Index
+from datetime import datetime
+from ..core.database import Base
+
+class Attempt(Base):
+    # незавершенная попытка прохождения теста: ответы сохраняются по мере ввода
+    __tablename__ = "attempts"
+    __table_args__ = (
+        Index("ix_attempts_user_test", "user_id", "test_id", "submitted_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    test_id = Column(Integer, ForeignKey("tests.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    answers = Column(JSON, nullable=False, default=dict)  # тот же формат, что и Result.answers
+    started_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    deadline_at = Column(DateTime)  # None: тест без ограничения времени
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    submitted_at = Column(DateTime)
+    result_id = Column(Integer, ForeignKey("results.id"))
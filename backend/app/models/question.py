@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, Enum, JSON
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, Enum, JSON, Index
 from sqlalchemy.orm import relationship
 import enum
 from ..core.database import Base
@@ -10,6 +10,10 @@ class QuestionType(str, enum.Enum):
 
 class Question(Base):
     __tablename__ = "questions"
+    __table_args__ = (
+        # вопросы теста читаются по test_id сразу в порядке order_number, id
+        Index("ix_questions_test_order", "test_id", "order_number", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     test_id = Column(Integer, ForeignKey("tests.id"), nullable=False)
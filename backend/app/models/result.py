@@ -1,10 +1,15 @@
-from sqlalchemy import Column, Integer, ForeignKey, DateTime, JSON, Float
+from sqlalchemy import Column, Integer, ForeignKey, DateTime, JSON, Float, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from ..core.database import Base
 
 class Result(Base):
     __tablename__ = "results"
+    __table_args__ = (
+        Index("ix_results_test_percentage", "test_id", "percentage"),
+        Index("ix_results_test_completed", "test_id", "completed_at", "id"),
+        Index("ix_results_user_completed", "user_id", "completed_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     test_id = Column(Integer, ForeignKey("tests.id"), nullable=False)
@@ -14,7 +19,7 @@ class Result(Base):
     max_score = Column(Float, nullable=False)
     percentage = Column(Float, nullable=False)
     time_spent_minutes = Column(Integer)
-    completed_at = Column(DateTime, default=datetime.utcnow)
+    completed_at = Column(DateTime, nullable=False, default=datetime.utcnow)  # ключ постраничной выдачи
     
     test = relationship("Test", back_populates="results")
     user = relationship("User", back_populates="results")
\ No newline at end of file
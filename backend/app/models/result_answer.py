@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, ForeignKey, Boolean, Index
+from ..core.database import Base
+
+class ResultAnswer(Base):
+    # нормализованная копия Result.answers: строка на каждый выбранный вариант
+    __tablename__ = "result_answers"
+    __table_args__ = (
+        Index("ix_result_answers_question_correct", "question_id", "is_correct", "result_id"),
+        Index("ix_result_answers_result", "result_id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    result_id = Column(Integer, ForeignKey("results.id", ondelete="CASCADE"), nullable=False)
+    question_id = Column(Integer, ForeignKey("questions.id", ondelete="CASCADE"), nullable=False)
+    option_index = Column(Integer)  # None: выбранного ответа нет среди вариантов вопроса
+    is_correct = Column(Boolean, nullable=False)  # оценка вопроса целиком, одинакова для всех его строк
+    earned_points = Column(Integer, nullable=False, default=0)
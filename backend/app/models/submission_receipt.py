@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from datetime import datetime
+from ..core.database import Base
+
+class SubmissionReceipt(Base):
+    # квитанции из очереди отправок, уже записанные в results: защищают от повторной
+    # вставки при воспроизведении журнала после сбоя
+    __tablename__ = "submission_receipts"
+
+    receipt = Column(String, primary_key=True)
+    result_id = Column(Integer, ForeignKey("results.id"), nullable=False)
+    processed_at = Column(DateTime, default=datetime.utcnow)
@@ -1,10 +1,15 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Boolean
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Boolean, Index
+from sqlalchemy import and_
+from sqlalchemy.orm import column_property, relationship
 from datetime import datetime
 from ..core.database import Base
 
 class Test(Base):
     __tablename__ = "tests"
+    __table_args__ = (
+        Index("ix_tests_active_created", "is_active", "created_at", "id"),
+        Index("ix_tests_creator_created", "creator_id", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False, index=True)
@@ -12,9 +17,16 @@ class Test(Base):
     creator_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     duration_minutes = Column(Integer, default=60)
     is_active = Column(Boolean, default=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)  # ключ постраничной выдачи
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    archived_at = Column(DateTime)  # архивный тест скрыт из каталога, его результаты сохраняются
+    # принимает попытки и отправки: активен и не в архиве
+    is_open = column_property(and_(is_active == True, archived_at.is_(None)))
     
     creator = relationship("User", back_populates="created_tests", foreign_keys=[creator_id])
-    questions = relationship("Question", back_populates="test", cascade="all, delete-orphan")
-    results = relationship("Result", back_populates="test")
\ No newline at end of file
+    questions = relationship(
+        "Question", back_populates="test", cascade="all, delete-orphan",
+        order_by="(Question.order_number, Question.id)"
+    )
+    results = relationship("Result", back_populates="test")
+    statistics = relationship("TestStatistics", back_populates="test", uselist=False, cascade="all, delete-orphan")
\ No newline at end of file
@@ -0,0 +1,42 @@
+from sqlalchemy import Column, Integer, ForeignKey, DateTime, Float
+from sqlalchemy.orm import relationship
+from datetime import datetime
+from typing import List
+from ..core.database import Base
+
+class TestStatistics(Base):
+    __tablename__ = "test_statistics"
+    
+    test_id = Column(Integer, ForeignKey("tests.id"), primary_key=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    score_sum = Column(Float, nullable=False, default=0)
+    score_sum_sq = Column(Float, nullable=False, default=0)
+    min_score = Column(Float)
+    max_score = Column(Float)
+    pass_count = Column(Integer, nullable=False, default=0)
+    # число попыток в каждом интервале процентов; отдельные столбцы, чтобы отправка
+    # увеличивала их одним UPDATE col = col + n без чтения строки
+    bucket_0 = Column(Integer, nullable=False, default=0)
+    bucket_1 = Column(Integer, nullable=False, default=0)
+    bucket_2 = Column(Integer, nullable=False, default=0)
+    bucket_3 = Column(Integer, nullable=False, default=0)
+    bucket_4 = Column(Integer, nullable=False, default=0)
+    bucket_5 = Column(Integer, nullable=False, default=0)
+    bucket_6 = Column(Integer, nullable=False, default=0)
+    bucket_7 = Column(Integer, nullable=False, default=0)
+    bucket_8 = Column(Integer, nullable=False, default=0)
+    bucket_9 = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    test = relationship("Test", back_populates="statistics")
+
+    BUCKET_COLUMNS = tuple(f"bucket_{index}" for index in range(10))
+
+    @property
+    def histogram(self) -> List[int]:
+        return [getattr(self, column) or 0 for column in self.BUCKET_COLUMNS]
+
+    @histogram.setter
+    def histogram(self, counts: List[int]) -> None:
+        for column, count in zip(self.BUCKET_COLUMNS, counts):
+            setattr(self, column, count)
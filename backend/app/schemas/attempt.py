@@ -0,0 +1,23 @@
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+from datetime import datetime
+
+
+class AttemptStart(BaseModel):
+    test_id: int
+
+
+class AttemptAnswersUpdate(BaseModel):
+    # только измененные вопросы; пустой список очищает ответ
+    answers: Dict[int, List[str]] = Field(default_factory=dict)
+
+
+class AttemptResponse(BaseModel):
+    id: int
+    test_id: int
+    started_at: datetime
+    deadline_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    submitted_at: Optional[datetime] = None
+    result_id: Optional[int] = None
+    answers: Dict[int, List[str]] = Field(default_factory=dict)
@@ -28,6 +28,10 @@ class QuestionUpdate(BaseModel):
     points: Optional[int] = None
     order_number: Optional[int] = None
 
+class QuestionOrder(BaseModel):
+    # полный новый порядок: все вопросы теста, каждый ровно один раз
+    question_ids: List[int]
+
 class QuestionResponse(QuestionBase):
     id: int
     test_id: int
@@ -5,9 +5,14 @@ from ..models.question import QuestionType
 
 
 class TestSubmit(BaseModel):
+    # время решения не принимается от клиента: его считает сервер по попытке (см. /attempts)
     test_id: int
     answers: Dict[int, List[str]] = Field(default_factory=dict)
-    time_spent_minutes: Optional[int] = None
+
+
+class BatchSubmitItem(TestSubmit):
+    # для загрузки из экзаменационного центра: чей результат; по умолчанию — отправителя
+    user_id: Optional[int] = None
 
 
 class QuestionResultDetail(BaseModel):
@@ -38,6 +43,19 @@ class ResultResponse(BaseModel):
         from_attributes = True
 
 
+class SubmissionReceiptResponse(BaseModel):
+    receipt: str
+    status: str
+    result: Optional[ResultResponse] = None
+    error: Optional[str] = None
+
+
+class BatchSubmitItemResult(BaseModel):
+    index: int
+    result: Optional[ResultResponse] = None
+    error: Optional[str] = None
+
+
 class DetailedResultResponse(ResultResponse):
     test_title: str
     user_name: str
@@ -47,9 +65,51 @@ class ResultDetailResponse(DetailedResultResponse):
     questions: List[QuestionResultDetail] = Field(default_factory=list)
 
 
+class ScoreBucket(BaseModel):
+    lower: float
+    upper: float
+    count: int
+
+
+class QuestionCorrectness(BaseModel):
+    question_id: int
+    attempts: int
+    correct: int
+    correct_rate: float
+
+
 class StatisticsResponse(BaseModel):
     total_attempts: int
     average_score: float
     max_score: float
     min_score: float
-    pass_rate: float
\ No newline at end of file
+    pass_rate: float
+    std_dev: float = 0
+    histogram: List[ScoreBucket] = Field(default_factory=list)
+    percentiles: Dict[int, float] = Field(default_factory=dict)
+    questions: List[QuestionCorrectness] = Field(default_factory=list)
+
+class OptionDistribution(BaseModel):
+    option: str
+    is_correct: bool
+    count: int
+    share: float
+
+
+class QuestionItemAnalysis(BaseModel):
+    question_id: int
+    question_text: str
+    question_type: QuestionType
+    order_number: int
+    points: int
+    responses: int
+    omitted: int
+    p_value: Optional[float] = None
+    point_biserial: Optional[float] = None
+    options: List[OptionDistribution] = Field(default_factory=list)
+
+
+class ItemAnalysisResponse(BaseModel):
+    test_id: int
+    total_attempts: int
+    questions: List[QuestionItemAnalysis] = Field(default_factory=list)
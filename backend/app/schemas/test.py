@@ -18,11 +18,17 @@ class TestUpdate(BaseModel):
     duration_minutes: Optional[int] = None
     is_active: Optional[bool] = None
 
+class TestClone(BaseModel):
+    title: Optional[str] = None
+    # подмножество вопросов в новом порядке; None — все вопросы в прежнем порядке
+    question_ids: Optional[List[int]] = None
+
 class TestResponse(TestBase):
     id: int
     creator_id: int
     created_at: datetime
     updated_at: datetime
+    archived_at: Optional[datetime] = None
     questions: List[QuestionResponse] = Field(default_factory=list)
     
     class Config:
@@ -35,6 +41,7 @@ class TestListResponse(BaseModel):
     duration_minutes: int
     is_active: bool
     created_at: datetime
+    archived_at: Optional[datetime] = None
     question_count: int
     
     class Config:
@@ -52,3 +59,11 @@ class TestForStudentResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+class RegradeStatus(BaseModel):
+    test_id: int
+    total: Optional[int] = None
+    processed: int = 0
+    updated: int = 0
+    done: bool = False
+    error: Optional[str] = None
@@ -0,0 +1,212 @@
+from collections import OrderedDict
+from datetime import datetime
+from threading import Lock
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple, Union
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from ..core.config import settings
+from ..models.question import Question, QuestionType
+from ..models.test import Test
+
+# сохраненный ответ на вопрос: битовая маска вариантов или (текст, старые записи) список строк
+StoredAnswer = Union[int, List[str]]
+
+
+class StaleAnswerKeyError(Exception):
+    # вопросы теста изменились после чтения ключа: транзакцию нужно повторить с новым ключом
+    pass
+
+
+class CompiledQuestion(NamedTuple):
+    question_id: int
+    question_type: QuestionType
+    points: int
+    correct_answers: FrozenSet[str]
+    options: Tuple[str, ...]
+    correct_mask: int
+
+    def encode(self, selected: Iterable[str]) -> StoredAnswer:
+        # варианты хранятся битовой маской индексов (для SINGLE — один бит);
+        # текстовые ответы и ответы вне списка вариантов остаются строками
+        selected = [str(answer) for answer in selected]
+        if self.question_type == QuestionType.TEXT:
+            return selected
+        mask = 0
+        for answer in selected:
+            if answer not in self.options:
+                return selected
+            mask |= 1 << self.options.index(answer)
+        return mask
+
+    def decode(self, stored: StoredAnswer) -> List[str]:
+        if isinstance(stored, int):
+            return [option for index, option in enumerate(self.options) if stored >> index & 1]
+        return [str(answer) for answer in (stored or [])]
+
+    def recode(self, stored: StoredAnswer, previous: "CompiledQuestion") -> StoredAnswer:
+        # маска по прежним вариантам вопроса переводится в маску по текущим;
+        # выбранный вариант, которого больше нет, сохраняется строкой
+        if isinstance(stored, int):
+            return self.encode(previous.decode(stored))
+        return stored
+
+    def is_correct(self, stored: StoredAnswer) -> bool:
+        if isinstance(stored, int):
+            return bool(self.correct_mask) and stored == self.correct_mask
+        return bool(self.correct_answers) and frozenset(str(answer) for answer in stored) == self.correct_answers
+
+
+class CompiledAnswerKey(NamedTuple):
+    test_id: int
+    questions: Dict[int, CompiledQuestion]
+    max_score: int
+    # Test.updated_at, по которому собран ключ; правка вопросов меняет его (TestPayloadService.touch)
+    version: Optional[datetime] = None
+
+
+class AnswerKeyCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items: "OrderedDict[int, CompiledAnswerKey]" = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, test_id: int, version: Optional[datetime]) -> Optional[CompiledAnswerKey]:
+        with self._lock:
+            key = self._items.get(test_id)
+            if key is None or key.version != version:
+                return None
+            self._items.move_to_end(test_id)
+            return key
+
+    def put(self, key: CompiledAnswerKey) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            current = self._items.get(key.test_id)
+            # сборка, начатая до правки, не вытесняет более новый ключ
+            if current is not None and current.version is not None and (
+                key.version is None or key.version < current.version
+            ):
+                return
+            self._items[key.test_id] = key
+            self._items.move_to_end(key.test_id)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def invalidate(self, test_id: int) -> None:
+        with self._lock:
+            self._items.pop(test_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+answer_key_cache = AnswerKeyCache(settings.ANSWER_KEY_CACHE_SIZE)
+
+# ключи, уже сверенные с версией теста в текущей транзакции сессии
+SESSION_KEYS = "answer_keys"
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _forget_session_keys(session, transaction) -> None:
+    # только внешняя транзакция: конец SAVEPOINT не меняет снимок, в котором сверены версии
+    if transaction.parent is None:
+        session.info.pop(SESSION_KEYS, None)
+
+
+class AnswerKeyService:
+    @staticmethod
+    def compile(db: Session, test_id: int, version: Optional[datetime] = None) -> CompiledAnswerKey:
+        rows = (
+            db.query(
+                Question.id,
+                Question.question_type,
+                Question.points,
+                Question.correct_answers,
+                Question.options,
+            )
+            .filter(Question.test_id == test_id)
+            .all()
+        )
+
+        questions: Dict[int, CompiledQuestion] = {}
+        max_score = 0
+        for row in rows:
+            question = AnswerKeyService.compile_question(*row)
+            max_score += question.points
+            questions[question.question_id] = question
+
+        return CompiledAnswerKey(test_id=test_id, questions=questions, max_score=max_score, version=version)
+
+    @staticmethod
+    def compile_question(
+        question_id: int,
+        question_type: QuestionType,
+        points: Optional[int],
+        correct_answers: Optional[List[str]],
+        options: Optional[List[str]],
+    ) -> CompiledQuestion:
+        options = tuple(str(option) for option in (options or []))
+        correct_answers = frozenset(str(answer) for answer in (correct_answers or []))
+        correct_mask = sum(1 << index for index, option in enumerate(options) if option in correct_answers)
+        if not correct_answers <= set(options):
+            # правильный ответ вне списка вариантов: выбором вариантов вопрос не решается
+            correct_mask = 0
+        return CompiledQuestion(
+            question_id=question_id,
+            question_type=question_type,
+            points=points or 0,
+            correct_answers=correct_answers,
+            options=options,
+            correct_mask=correct_mask,
+        )
+
+    @staticmethod
+    def get_answer_key(db: Session, test_id: int) -> CompiledAnswerKey:
+        # версия читается по первичному ключу в той же транзакции, что и вопросы, как у
+        # StudentPayloadCache: ключ, собранный другим процессом до правки, не используется.
+        # В пределах транзакции версия не меняется, поэтому сверка — один раз на тест
+        key = db.info.get(SESSION_KEYS, {}).get(test_id)
+        if key is not None:
+            return key
+        version = db.query(Test.updated_at).filter(Test.id == test_id).scalar()
+        return AnswerKeyService.resolve(db, test_id, version)
+
+    @staticmethod
+    def preload(db: Session, versions: Dict[int, Optional[datetime]]) -> None:
+        # test_id -> updated_at, уже прочитанные вместе со строками (например, JOIN в списках результатов)
+        for test_id, version in versions.items():
+            if test_id not in db.info.get(SESSION_KEYS, {}):
+                AnswerKeyService.resolve(db, test_id, version)
+
+    @staticmethod
+    def resolve(db: Session, test_id: int, version: Optional[datetime]) -> CompiledAnswerKey:
+        key = answer_key_cache.get(test_id, version)
+        if key is None:
+            key = AnswerKeyService.compile(db, test_id, version)
+            answer_key_cache.put(key)
+        db.info.setdefault(SESSION_KEYS, {})[test_id] = key
+        return key
+
+    @staticmethod
+    def verify(db: Session, keys: Iterable[CompiledAnswerKey]) -> None:
+        # вызывается после первой записи транзакции, закодированной по этим ключам: SQLite к этому
+        # моменту держит блокировку записи, в других СУБД FOR SHARE не дает правке вопросов
+        # (она начинается с обновления Test.updated_at) закоммититься раньше. Правка, успевшая
+        # раньше, видна здесь новой версией — и тогда маски, записанные по старому порядку
+        # вариантов, не попадут в базу мимо remap_question_answers
+        versions = {key.test_id: key.version for key in keys}
+        if not versions:
+            return
+        current = dict(
+            db.query(Test.id, Test.updated_at).filter(Test.id.in_(versions)).with_for_update(read=True).all()
+        )
+        stale = sorted(test_id for test_id, version in versions.items() if current.get(test_id) != version)
+        if stale:
+            raise StaleAnswerKeyError(f"Answer key changed for tests {stale}")
+
+    @staticmethod
+    def invalidate(test_id: int) -> None:
+        # освобождает память сразу; корректность обеспечивает сверка версии в get_answer_key
+        answer_key_cache.invalidate(test_id)
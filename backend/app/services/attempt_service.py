@@ -0,0 +1,161 @@
+from datetime import datetime, timedelta
+from typing import Dict, List
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from ..models.attempt import Attempt
+from ..models.result import Result
+from ..models.test import Test
+from .answer_key import AnswerKeyService, StaleAnswerKeyError
+from .errors import ConflictError, NotFoundError, PermissionDeniedError
+from .item_analysis import ItemAnalysisService
+from .result_service import ResultService
+
+# каждый неудачный круг означает чужую успешную запись: хватает с запасом на много вкладок
+ANSWERS_SAVE_RETRIES = 20
+
+
+class AttemptService:
+    @staticmethod
+    def get_own_attempt(db: Session, attempt_id: int, user_id: int) -> Attempt:
+        attempt = db.query(Attempt).filter(Attempt.id == attempt_id).first()
+        if not attempt:
+            raise NotFoundError("Attempt not found")
+        if attempt.user_id != user_id:
+            raise PermissionDeniedError("Not authorized")
+        return attempt
+
+    @staticmethod
+    def start_attempt(db: Session, user_id: int, test_id: int) -> Attempt:
+        test = db.query(Test.is_open, Test.duration_minutes).filter(Test.id == test_id).first()
+        if not test:
+            raise NotFoundError("Test not found")
+
+        # незавершенная попытка продолжается, даже если время вышло: заново начать нельзя
+        existing = (
+            db.query(Attempt)
+            .filter(Attempt.user_id == user_id, Attempt.test_id == test_id, Attempt.submitted_at.is_(None))
+            .order_by(Attempt.id.desc())
+            .first()
+        )
+        if existing:
+            return existing
+
+        is_open, duration_minutes = test
+        if not is_open:
+            raise ValueError("Test is not active")
+
+        started_at = datetime.utcnow()
+        attempt = Attempt(
+            test_id=test_id,
+            user_id=user_id,
+            answers={},
+            started_at=started_at,
+            deadline_at=started_at + timedelta(minutes=duration_minutes) if duration_minutes else None,
+        )
+        db.add(attempt)
+        db.commit()
+        db.refresh(attempt)
+        return attempt
+
+    @staticmethod
+    def save_answers(db: Session, attempt_id: int, user_id: int, answers: Dict[int, List[str]]) -> Attempt:
+        attempt = AttemptService.get_own_attempt(db, attempt_id, user_id)
+        if attempt.submitted_at is not None:
+            raise ConflictError("Attempt already submitted")
+
+        if ResultService.is_late(attempt.deadline_at, datetime.utcnow()):
+            raise ConflictError("Time is over")
+
+        # compare-and-swap по updated_at: параллельное автосохранение или завершение между
+        # чтением и записью не теряется — ответы сливаются заново с уже сохраненными
+        for _ in range(ANSWERS_SAVE_RETRIES):
+            answer_key = AnswerKeyService.get_answer_key(db, attempt.test_id)
+            unknown = set(answers) - set(answer_key.questions)
+            if unknown:
+                raise ValueError(f"Unknown questions: {sorted(unknown)}")
+
+            # ответы кодируются сразу, при завершении остается только сравнить маски
+            encoded = {
+                str(question_id): answer_key.questions[question_id].encode(selected)
+                for question_id, selected in answers.items()
+            }
+            seen = attempt.updated_at
+            saved = db.execute(
+                update(Attempt)
+                .where(
+                    Attempt.id == attempt.id,
+                    Attempt.submitted_at.is_(None),
+                    Attempt.updated_at.is_(None) if seen is None else Attempt.updated_at == seen,
+                )
+                .values(answers={**(attempt.answers or {}), **encoded}, updated_at=datetime.utcnow())
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if saved:
+                try:
+                    # правка вопросов после чтения ключа: маски пересчитываются по новому ключу
+                    AnswerKeyService.verify(db, [answer_key])
+                except StaleAnswerKeyError:
+                    saved = 0
+            if saved:
+                db.commit()
+                db.refresh(attempt)
+                return attempt
+            db.rollback()
+            db.refresh(attempt)
+            if attempt.submitted_at is not None:
+                raise ConflictError("Attempt already submitted")
+        raise ConflictError("Attempt is being updated concurrently, retry")
+
+    @staticmethod
+    def finalize_attempt(db: Session, attempt_id: int, user_id: int) -> Result:
+        return ResultService.retry_on_stale_key(db, AttemptService._finalize_attempt, attempt_id, user_id)
+
+    @staticmethod
+    def _finalize_attempt(db: Session, attempt_id: int, user_id: int) -> Result:
+        attempt = AttemptService.get_own_attempt(db, attempt_id, user_id)
+        if attempt.result_id is not None:
+            # повторный запрос после обрыва соединения получает тот же результат
+            return db.get(Result, attempt.result_id)
+
+        # атомарно занимаем попытку: параллельное завершение не создаст второй результат
+        finished_at = datetime.utcnow()
+        claimed = db.execute(
+            update(Attempt)
+            .where(Attempt.id == attempt.id, Attempt.submitted_at.is_(None))
+            .values(submitted_at=finished_at)
+        ).rowcount
+        if not claimed:
+            db.rollback()
+            raise ConflictError("Attempt already submitted")
+        # ответы перечитываются после захвата: автосохранение, успевшее до него, тоже оценивается
+        db.refresh(attempt)
+
+        # время считает сервер по started_at; ответы после дедлайна уже отклонены save_answers
+        result = ResultService.add_result(
+            db,
+            attempt.test_id,
+            attempt.user_id,
+            attempt.answers or {},
+            ResultService.time_spent_minutes(attempt.started_at, attempt.deadline_at, finished_at),
+        )
+        db.flush()
+        attempt.result_id = result.id
+        db.commit()
+        ItemAnalysisService.invalidate(attempt.test_id)
+        db.refresh(result)
+        return result
+
+    @staticmethod
+    def serialize_attempt(db: Session, attempt: Attempt) -> Dict:
+        return {
+            "id": attempt.id,
+            "test_id": attempt.test_id,
+            "started_at": attempt.started_at,
+            "deadline_at": attempt.deadline_at,
+            "updated_at": attempt.updated_at,
+            "submitted_at": attempt.submitted_at,
+            "result_id": attempt.result_id,
+            "answers": ResultService.normalize_answers(
+                attempt.answers, AnswerKeyService.get_answer_key(db, attempt.test_id)
+            ),
+        }
@@ -0,0 +1,14 @@
+# ошибки предметной области; в HTTP-статусы их переводят обработчики API,
+# неверные входные данные по-прежнему ValueError (400)
+
+
+class NotFoundError(Exception):
+    pass
+
+
+class PermissionDeniedError(Exception):
+    pass
+
+
+class ConflictError(Exception):
+    pass
@@ -0,0 +1,120 @@
+import csv
+import io
+import json
+from typing import Dict, Iterator, Tuple
+from sqlalchemy.orm import Session
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..models.result import Result
+from ..models.user import User
+
+EXPORT_CHUNK_SIZE = 1000
+
+EXPORT_COLUMNS = (
+    "result_id",
+    "user_id",
+    "user_name",
+    "user_email",
+    "score",
+    "max_score",
+    "percentage",
+    "passed",
+    "time_spent_minutes",
+    "completed_at",
+)
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+class ResultExportService:
+    @staticmethod
+    def iter_rows(db: Session, test_id: int, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[Tuple]:
+        # только нужные столбцы, имя пользователя через JOIN; yield_per читает курсор порциями,
+        # не собирая весь результат в памяти
+        query = (
+            db.query(
+                Result.id,
+                Result.user_id,
+                User.full_name,
+                User.email,
+                Result.score,
+                Result.max_score,
+                Result.percentage,
+                Result.time_spent_minutes,
+                Result.completed_at,
+            )
+            .join(User, User.id == Result.user_id)
+            .filter(Result.test_id == test_id)
+            .order_by(Result.completed_at, Result.id)
+            .yield_per(chunk_size)
+        )
+        for result_id, user_id, full_name, email, score, max_score, percentage, time_spent, completed_at in query:
+            yield (
+                result_id,
+                user_id,
+                full_name,
+                email,
+                score,
+                max_score,
+                percentage,
+                percentage >= settings.PASS_PERCENTAGE,
+                time_spent,
+                completed_at.isoformat() if completed_at else None,
+            )
+
+    @staticmethod
+    def iter_csv(rows: Iterator[Tuple], chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[str]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        # заголовок уходит клиенту сразу, до выполнения запроса
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+        buffered = 0
+        for index, row in enumerate(rows, start=1):
+            writer.writerow(row)
+            buffered += 1
+            # первая строка уходит сразу, дальше порциями по chunk_size
+            if index == 1 or buffered >= chunk_size:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                buffered = 0
+
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    @staticmethod
+    def iter_ndjson(rows: Iterator[Tuple], chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[str]:
+        lines = []
+        for index, row in enumerate(rows, start=1):
+            lines.append(json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False))
+            # первая строка уходит сразу: клиент получает данные, не дожидаясь полной порции
+            if index == 1 or len(lines) >= chunk_size:
+                yield "\n".join(lines) + "\n"
+                lines = []
+
+        if lines:
+            yield "\n".join(lines) + "\n"
+
+    @staticmethod
+    def stream(test_id: int, export_format: str) -> Iterator[str]:
+        # собственная сессия: ответ читается уже после выхода из обработчика и его зависимостей
+        db = SessionLocal()
+        try:
+            rows = ResultExportService.iter_rows(db, test_id)
+            if export_format == "csv":
+                yield from ResultExportService.iter_csv(rows)
+            else:
+                yield from ResultExportService.iter_ndjson(rows)
+        finally:
+            db.close()
+
+    @staticmethod
+    def headers(test_id: int, export_format: str) -> Dict[str, str]:
+        return {"Content-Disposition": f'attachment; filename="test_{test_id}_results.{export_format}"'}
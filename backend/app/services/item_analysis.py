@@ -0,0 +1,258 @@
+import math
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from ..core.config import settings
+from ..models.question import Question, QuestionType
+from ..models.result import Result
+from ..models.test import Test
+from ..models.test_statistics import TestStatistics
+
+ITEM_ANALYSIS_CHUNK_SIZE = 5000
+MASK_SIGN_BIT = 63
+
+
+class CachedAnalysis(NamedTuple):
+    test_id: int
+    version: Tuple
+    analysis: Dict
+
+
+class ItemAnalysisCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items: "OrderedDict[int, CachedAnalysis]" = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, test_id: int, version: Tuple) -> Optional[Dict]:
+        with self._lock:
+            cached = self._items.get(test_id)
+            if cached is None or cached.version != version:
+                return None
+            self._items.move_to_end(test_id)
+            return cached.analysis
+
+    def put(self, test_id: int, version: Tuple, analysis: Dict) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._items[test_id] = CachedAnalysis(test_id, version, analysis)
+            self._items.move_to_end(test_id)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def invalidate(self, test_id: int) -> None:
+        with self._lock:
+            self._items.pop(test_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+item_analysis_cache = ItemAnalysisCache(settings.ITEM_ANALYSIS_CACHE_SIZE)
+
+
+class ItemLayout(NamedTuple):
+    # все варианты всех вопросов разложены в один ряд столбцов матрицы выбора
+    questions: List
+    offsets: List[int]
+    option_index: List[Dict[str, int]]
+    correct_masks: List[np.ndarray]
+    width: int
+    # для каждого столбца матрицы выбора: номер вопроса и разряд варианта в маске
+    option_question: np.ndarray
+    option_bit: np.ndarray
+
+
+class ItemAnalysisService:
+    @staticmethod
+    def get_version(db: Session, test_id: int) -> Optional[Tuple]:
+        # версия меняется при каждой отправке (сводка) и правке вопросов (тест)
+        row = (
+            db.query(Test.updated_at, TestStatistics.updated_at, TestStatistics.attempts)
+            .outerjoin(TestStatistics, TestStatistics.test_id == Test.id)
+            .filter(Test.id == test_id)
+            .first()
+        )
+        return tuple(row) if row else None
+
+    @staticmethod
+    def build_layout(questions: List) -> ItemLayout:
+        offsets, option_index, correct_masks = [], [], []
+        option_question, option_bit = [], []
+        width = 0
+        for column, question in enumerate(questions):
+            options = [str(option) for option in (question.options or [])]
+            correct = {str(answer) for answer in (question.correct_answers or [])}
+            offsets.append(width)
+            option_index.append({option: index for index, option in enumerate(options)})
+            correct_masks.append(np.array([option in correct for option in options], dtype=bool))
+            option_question.extend([column] * len(options))
+            # варианты за пределами int64 в маску не попадают: 63-й разряд неотрицательной маски всегда 0
+            option_bit.extend(min(position, MASK_SIGN_BIT) for position in range(len(options)))
+            width += len(options)
+        return ItemLayout(
+            questions, offsets, option_index, correct_masks, width,
+            np.array(option_question, dtype=np.intp), np.array(option_bit, dtype=np.int64),
+        )
+
+    @staticmethod
+    def is_mask(chosen) -> bool:
+        return isinstance(chosen, int) and 0 <= chosen < 1 << MASK_SIGN_BIT
+
+    @staticmethod
+    def selection_matrix(layout: ItemLayout, answers: List[Dict]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # selected: попытки × все варианты; answered/foreign: попытки × вопросы
+        # (foreign — выбран ответ, которого нет среди вариантов: такой ответ неверен)
+        keys = [str(question.id) for question in layout.questions]
+        shape = (len(answers), len(keys))
+        rows = [[answer.get(key) or 0 for key in keys] for answer in answers]
+        foreign = np.zeros(shape, dtype=bool)
+        legacy = []
+        try:
+            # обычный случай: все ответы уже битовые маски индексов вариантов
+            masks = np.array(rows, dtype=np.int64).reshape(shape)
+            answered = masks != 0
+        except (TypeError, ValueError, OverflowError):
+            masks = np.array(
+                [[chosen if ItemAnalysisService.is_mask(chosen) else 0 for chosen in row] for row in rows],
+                dtype=np.int64,
+            ).reshape(shape)
+            answered = np.array([[bool(chosen) for chosen in row] for row in rows], dtype=bool).reshape(shape)
+            legacy = [
+                (row, column, chosen)
+                for row, values in enumerate(rows)
+                for column, chosen in enumerate(values)
+                if chosen and not ItemAnalysisService.is_mask(chosen)
+            ]
+
+        # разряды масок раскладываются по столбцам вариантов одним сдвигом
+        selected = ((masks[:, layout.option_question] >> layout.option_bit) & 1).astype(bool)
+
+        # старый формат: список вариантов
+        for row, column, chosen in legacy:
+            index = layout.option_index[column]
+            if isinstance(chosen, int):
+                # маска шире int64
+                for position in range(len(index)):
+                    if chosen >> position & 1:
+                        selected[row, layout.offsets[column] + position] = True
+                continue
+            for option in chosen:
+                position = index.get(str(option))
+                if position is None:
+                    foreign[row, column] = True
+                else:
+                    selected[row, layout.offsets[column] + position] = True
+        return selected, answered, foreign
+
+    @staticmethod
+    def correctness(layout: ItemLayout, selected: np.ndarray, foreign: np.ndarray) -> np.ndarray:
+        correct = np.zeros(foreign.shape, dtype=bool)
+        for column, question in enumerate(layout.questions):
+            mask = layout.correct_masks[column]
+            if question.question_type == QuestionType.TEXT or not mask.any():
+                continue
+            block = selected[:, layout.offsets[column]:layout.offsets[column] + mask.size]
+            correct[:, column] = (block == mask).all(axis=1) & ~foreign[:, column]
+        return correct
+
+    @staticmethod
+    def point_biserial(n: int, sum_x: float, sum_xx: float, sum_y: float, sum_xy: float) -> Optional[float]:
+        if n == 0:
+            return None
+        mean_x = sum_x / n
+        p = sum_y / n
+        variance = (sum_xx / n - mean_x * mean_x) * p * (1 - p)
+        if variance <= 1e-12:
+            return None
+        return round((sum_xy / n - mean_x * p) / math.sqrt(variance), 4)
+
+    @staticmethod
+    def compute(db: Session, test_id: int, chunk_size: int = ITEM_ANALYSIS_CHUNK_SIZE) -> Dict:
+        questions = (
+            db.query(Question)
+            .filter(Question.test_id == test_id)
+            .order_by(Question.order_number, Question.id)
+            .all()
+        )
+        layout = ItemAnalysisService.build_layout(questions)
+        count = len(questions)
+
+        # один проход по answers: накапливаются только суммы, память ограничена чанком
+        n = 0
+        sum_x = sum_xx = 0.0
+        sum_y = np.zeros(count, dtype=np.float64)
+        sum_xy = np.zeros(count, dtype=np.float64)
+        responses = np.zeros(count, dtype=np.int64)
+        option_counts = np.zeros(layout.width, dtype=np.int64)
+
+        rows = db.execute(
+            select(Result.answers, Result.score)
+            .where(Result.test_id == test_id)
+            .execution_options(yield_per=chunk_size)
+        )
+        for chunk in rows.partitions():
+            answers = [answer or {} for answer, _ in chunk]
+            scores = np.fromiter((score or 0 for _, score in chunk), dtype=np.float64, count=len(chunk))
+            selected, answered, foreign = ItemAnalysisService.selection_matrix(layout, answers)
+            correct = ItemAnalysisService.correctness(layout, selected, foreign).astype(np.float64)
+
+            n += len(chunk)
+            sum_x += float(scores.sum())
+            sum_xx += float(scores @ scores)
+            sum_y += correct.sum(axis=0)
+            sum_xy += correct.T @ scores
+            responses += answered.sum(axis=0)
+            option_counts += selected.sum(axis=0)
+
+        items = []
+        for column, question in enumerate(layout.questions):
+            gradable = question.question_type != QuestionType.TEXT and layout.correct_masks[column].any()
+            offset = layout.offsets[column]
+            options = [
+                {
+                    "option": option,
+                    "is_correct": bool(layout.correct_masks[column][position]),
+                    "count": int(option_counts[offset + position]),
+                    "share": round(float(option_counts[offset + position]) / n, 4) if n else 0.0,
+                }
+                for option, position in layout.option_index[column].items()
+            ]
+            items.append({
+                "question_id": question.id,
+                "question_text": question.question_text,
+                "question_type": question.question_type,
+                "order_number": question.order_number,
+                "points": question.points,
+                "responses": int(responses[column]),
+                "omitted": n - int(responses[column]),
+                "p_value": round(float(sum_y[column]) / n, 4) if n and gradable else None,
+                "point_biserial": (
+                    ItemAnalysisService.point_biserial(n, sum_x, sum_xx, float(sum_y[column]), float(sum_xy[column]))
+                    if gradable else None
+                ),
+                "options": options,
+            })
+
+        return {"test_id": test_id, "total_attempts": n, "questions": items}
+
+    @staticmethod
+    def get_item_analysis(db: Session, test_id: int) -> Optional[Dict]:
+        version = ItemAnalysisService.get_version(db, test_id)
+        if version is None:
+            return None
+
+        analysis = item_analysis_cache.get(test_id, version)
+        if analysis is None:
+            analysis = ItemAnalysisService.compute(db, test_id)
+            item_analysis_cache.put(test_id, version, analysis)
+        return analysis
+
+    @staticmethod
+    def invalidate(test_id: int) -> None:
+        item_analysis_cache.invalidate(test_id)
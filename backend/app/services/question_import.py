@@ -0,0 +1,177 @@
+import csv
+import io
+import json
+from typing import Dict, List, Optional, Tuple
+from fastapi import HTTPException, Request, status
+from pydantic import ValidationError
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+from ..models.question import Question, QuestionType
+from ..models.test import Test
+from ..schemas.question import QuestionBase
+from .answer_key import AnswerKeyService
+from .test_payload import TestPayloadService
+
+# в CSV/XLSX варианты и правильные ответы перечисляются в одной ячейке через "|"
+LIST_SEPARATOR = "|"
+LIST_COLUMNS = ("options", "correct_answers")
+CSV_MEDIA_TYPES = ("text/csv", "application/csv", "text/plain")
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+class QuestionImportService:
+    @staticmethod
+    async def read_rows(request: Request) -> List[Dict]:
+        # JSON-массив в теле или файл CSV/XLSX в поле file формы multipart
+        content_type = request.headers.get("content-type", "")
+        if content_type.startswith("multipart/form-data"):
+            form = await request.form()
+            upload = form.get("file")
+            if upload is None or isinstance(upload, str):
+                raise HTTPException(status_code=400, detail="Upload the question file in the 'file' field")
+            content = await upload.read()
+            filename = (upload.filename or "").lower()
+            if filename.endswith(".xlsx") or upload.content_type == XLSX_MEDIA_TYPE:
+                return QuestionImportService.parse_xlsx(content)
+            if filename.endswith(".csv") or upload.content_type in CSV_MEDIA_TYPES:
+                return QuestionImportService.parse_csv(content)
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail="Supported files: .csv, .xlsx"
+            )
+        if content_type.startswith(CSV_MEDIA_TYPES):
+            return QuestionImportService.parse_csv(await request.body())
+
+        try:
+            rows = json.loads(await request.body())
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Request body must be a JSON array of questions")
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise HTTPException(status_code=400, detail="Request body must be a JSON array of questions")
+        return rows
+
+    @staticmethod
+    def parse_csv(content: bytes) -> List[Dict]:
+        try:
+            text = content.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=400, detail="CSV file must be UTF-8 encoded")
+        reader = csv.DictReader(io.StringIO(text))
+        return [QuestionImportService.normalize_cells(row) for row in reader]
+
+    @staticmethod
+    def parse_xlsx(content: bytes) -> List[Dict]:
+        try:
+            import openpyxl
+        except ImportError:
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail="XLSX import requires openpyxl; upload CSV instead"
+            )
+        try:
+            workbook = openpyxl.load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+        except Exception:
+            raise HTTPException(status_code=400, detail="Cannot read XLSX file")
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(cell or "").strip() for cell in next(rows, ())]
+        parsed = []
+        for values in rows:
+            if all(value is None for value in values):
+                continue
+            parsed.append(QuestionImportService.normalize_cells(dict(zip(header, values))))
+        workbook.close()
+        return parsed
+
+    @staticmethod
+    def normalize_cells(row: Dict) -> Dict:
+        # пустые ячейки считаются незаданными, чтобы сработали значения по умолчанию схемы
+        normalized = {}
+        for column, value in row.items():
+            if column is None:
+                continue
+            column = column.strip().lower()
+            if value is None or (isinstance(value, str) and not value.strip()):
+                continue
+            if column in LIST_COLUMNS:
+                value = [item.strip() for item in str(value).split(LIST_SEPARATOR)]
+            elif isinstance(value, str):
+                value = value.strip()
+            normalized[column] = value
+        return normalized
+
+    @staticmethod
+    def prepare_payload(
+        question_type: QuestionType, options: List[str], correct_answers: List[str]
+    ) -> Tuple[List[str], List[str]]:
+        if question_type == QuestionType.TEXT:
+            # текстовые вопросы не имеют вариантов ответа и проверяются вручную
+            return [], []
+
+        cleaned_options = [option for option in (options or []) if option.strip()]
+        if len(cleaned_options) < 2:
+            raise ValueError("Необходимо указать минимум два варианта ответа")
+
+        cleaned_correct = [answer for answer in (correct_answers or []) if answer.strip()]
+        if not cleaned_correct:
+            raise ValueError("Укажите хотя бы один правильный ответ")
+
+        if set(cleaned_correct) - set(cleaned_options):
+            raise ValueError("Правильные ответы должны присутствовать в списке вариантов")
+
+        return cleaned_options, cleaned_correct
+
+    @staticmethod
+    def validate_rows(raw_rows: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+        # те же правила, что и для одиночного вопроса; ошибки собираются по всем строкам сразу
+        rows, errors = [], []
+        for number, raw in enumerate(raw_rows, start=1):
+            try:
+                question = QuestionBase.model_validate(raw)
+            except ValidationError as exc:
+                errors.append({
+                    "row": number,
+                    "errors": [f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in exc.errors()]
+                })
+                continue
+            try:
+                options, correct_answers = QuestionImportService.prepare_payload(
+                    question.question_type, question.options, question.correct_answers
+                )
+            except ValueError as exc:
+                errors.append({"row": number, "errors": [str(exc)]})
+                continue
+
+            row = question.model_dump()
+            row["options"] = options
+            row["correct_answers"] = correct_answers
+            if "order_number" not in question.model_fields_set:
+                row["order_number"] = None
+            rows.append(row)
+        return rows, errors
+
+    @staticmethod
+    def insert_questions(db: Session, test: Test, rows: List[Dict]) -> List[Dict]:
+        # строки без order_number добавляются в конец теста в порядке файла
+        last_order: Optional[int] = (
+            db.query(func.max(Question.order_number)).filter(Question.test_id == test.id).scalar()
+        )
+        next_order = 0 if last_order is None else last_order + 1
+        for row in rows:
+            row["test_id"] = test.id
+            if row.get("order_number") is None:
+                row["order_number"] = next_order
+                next_order += 1
+
+        if db.get_bind().dialect.name == "sqlite":
+            # как в ResultService.insert_results: rowid одного многострочного INSERT идут по порядку VALUES
+            question_ids = sorted(db.execute(insert(Question).returning(Question.id), rows).scalars().all())
+        else:
+            question_ids = db.execute(
+                insert(Question).returning(Question.id, sort_by_parameter_order=True),
+                rows
+            ).scalars().all()
+        TestPayloadService.touch(test)
+        db.commit()
+        AnswerKeyService.invalidate(test.id)
+        TestPayloadService.invalidate(test.id)
+        return [{**row, "id": question_id} for question_id, row in zip(question_ids, rows)]
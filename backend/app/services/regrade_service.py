@@ -0,0 +1,190 @@
+import logging
+from threading import Lock
+from typing import Callable, Dict, List, Optional
+import numpy as np
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..models.question import QuestionType
+from ..models.result import Result
+from .answer_key import AnswerKeyService, CompiledAnswerKey, CompiledQuestion
+from .item_analysis import ItemAnalysisService
+from .result_answers import ResultAnswerService
+from .statistics_service import StatisticsService
+
+logger = logging.getLogger(__name__)
+
+REGRADE_CHUNK_SIZE = 5000
+MASK_BITS = 62
+NOT_A_MASK = -1
+
+ProgressCallback = Callable[[Dict], None]
+
+
+class RegradeService:
+    _jobs: Dict[int, Dict] = {}
+    _lock = Lock()
+
+    @staticmethod
+    def answer_mask(question: CompiledQuestion, stored) -> int:
+        # маска выбранных вариантов; ответ, не выразимый маской, не совпадет ни с одной маской ключа
+        if isinstance(stored, int):
+            return stored
+        if not stored:
+            return 0
+        encoded = question.encode(stored)
+        return encoded if isinstance(encoded, int) else NOT_A_MASK
+
+    @staticmethod
+    def correctness_matrix(answer_key: CompiledAnswerKey, answers: List[Dict]) -> np.ndarray:
+        # попытки × вопросы: JSON один раз раскладывается в матрицу масок,
+        # правильность — одно сравнение с вектором масок ключа
+        gradable = [
+            question for question in answer_key.questions.values()
+            if question.question_type != QuestionType.TEXT
+        ]
+        matrix = np.zeros((len(answers), len(gradable)), dtype=bool)
+        # вопросы, решаемые сравнением масок; остальные без правильного ответа или (единично)
+        # с правильным ответом вне вариантов либо с вариантами сверх разрядов int64
+        by_mask = [
+            column for column, question in enumerate(gradable)
+            if question.correct_mask and len(question.options) <= MASK_BITS
+        ]
+        questions = [gradable[column] for column in by_mask]
+        keys = [str(question.question_id) for question in questions]
+
+        rows = [[selected.get(key, 0) for key in keys] for selected in answers]
+        try:
+            # обычный случай: все ответы уже маски
+            masks = np.array(rows, dtype=np.int64)
+        except (TypeError, ValueError, OverflowError):
+            masks = np.array(
+                [[RegradeService.answer_mask(question, stored) for question, stored in zip(questions, row)] for row in rows],
+                dtype=np.int64,
+            )
+        correct_masks = np.array([question.correct_mask for question in questions], dtype=np.int64)
+        matrix[:, by_mask] = masks.reshape(len(answers), len(keys)) == correct_masks
+
+        for column, question in enumerate(gradable):
+            if question.correct_answers and column not in by_mask:
+                key = str(question.question_id)
+                matrix[:, column] = [question.is_correct(selected.get(key) or ()) for selected in answers]
+        return matrix
+
+    @staticmethod
+    def points_vector(answer_key: CompiledAnswerKey) -> np.ndarray:
+        return np.array(
+            [
+                question.points for question in answer_key.questions.values()
+                if question.question_type != QuestionType.TEXT
+            ],
+            dtype=np.int64,
+        )
+
+    @staticmethod
+    def regrade_test(
+        db: Session,
+        test_id: int,
+        chunk_size: int = REGRADE_CHUNK_SIZE,
+        progress: Optional[ProgressCallback] = None,
+    ) -> Dict:
+        AnswerKeyService.invalidate(test_id)
+        answer_key = AnswerKeyService.get_answer_key(db, test_id)
+        points = RegradeService.points_vector(answer_key)
+        max_score = answer_key.max_score
+
+        total = db.query(Result.id).filter(Result.test_id == test_id).count()
+        status = {"test_id": test_id, "total": total, "processed": 0, "updated": 0, "done": False}
+        last_id = 0
+
+        # keyset-чанки по id: память ограничена размером чанка, commit после каждого
+        while True:
+            rows = (
+                db.query(Result.id, Result.answers, Result.score, Result.max_score)
+                .filter(Result.test_id == test_id, Result.id > last_id)
+                .order_by(Result.id)
+                .limit(chunk_size)
+                .all()
+            )
+            if not rows:
+                break
+
+            ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+            stored_scores = np.fromiter((row[2] for row in rows), dtype=np.float64, count=len(rows))
+            stored_max = np.fromiter((row[3] for row in rows), dtype=np.float64, count=len(rows))
+            matrix = RegradeService.correctness_matrix(answer_key, [row[1] or {} for row in rows])
+
+            scores = matrix.astype(np.int64) @ points if points.size else np.zeros(len(rows), dtype=np.int64)
+            changed = np.flatnonzero((scores != stored_scores) | (stored_max != max_score))
+
+            if changed.size:
+                db.execute(
+                    update(Result),
+                    [
+                        {
+                            "id": int(ids[index]),
+                            "score": int(scores[index]),
+                            "max_score": max_score,
+                            # то же округление, что и в ResultService.calculate_score
+                            "percentage": round(int(scores[index]) / max_score * 100, 2) if max_score > 0 else 0,
+                        }
+                        for index in changed
+                    ],
+                )
+            if settings.STORE_RESULT_ANSWERS:
+                # правильность отдельных вопросов могла измениться и при неизменном балле
+                ResultAnswerService.replace_for_results(db, answer_key, ((row[0], row[1]) for row in rows))
+            if changed.size or settings.STORE_RESULT_ANSWERS:
+                db.commit()
+
+            last_id = int(ids[-1])
+            status["processed"] += len(rows)
+            status["updated"] += int(changed.size)
+            if progress:
+                progress(dict(status))
+
+        if status["updated"]:
+            StatisticsService.rebuild_summaries(db, [test_id])
+            ItemAnalysisService.invalidate(test_id)
+
+        status["done"] = True
+        if progress:
+            progress(dict(status))
+        return status
+
+    @staticmethod
+    def start_job(test_id: int) -> bool:
+        with RegradeService._lock:
+            job = RegradeService._jobs.get(test_id)
+            if job and not job["done"]:
+                return False
+            RegradeService._jobs[test_id] = {
+                "test_id": test_id, "total": None, "processed": 0, "updated": 0, "done": False, "error": None
+            }
+            return True
+
+    @staticmethod
+    def get_job(test_id: int) -> Optional[Dict]:
+        with RegradeService._lock:
+            job = RegradeService._jobs.get(test_id)
+            return dict(job) if job else None
+
+    @staticmethod
+    def run_job(test_id: int) -> None:
+        def report(status: Dict) -> None:
+            with RegradeService._lock:
+                RegradeService._jobs[test_id].update(status)
+            logger.info("regrade test %s: %s/%s processed, %s updated",
+                        test_id, status["processed"], status["total"], status["updated"])
+
+        db = SessionLocal()
+        try:
+            RegradeService.regrade_test(db, test_id, progress=report)
+        except Exception as exc:
+            db.rollback()
+            logger.exception("regrade test %s failed", test_id)
+            with RegradeService._lock:
+                RegradeService._jobs[test_id].update({"done": True, "error": str(exc)})
+        finally:
+            db.close()
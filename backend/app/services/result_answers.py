@@ -0,0 +1,85 @@
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import delete, func, insert
+from sqlalchemy.orm import Session
+from ..models.question import Question, QuestionType
+from ..models.result import Result
+from ..models.result_answer import ResultAnswer
+from .answer_key import AnswerKeyService, CompiledAnswerKey
+
+BACKFILL_CHUNK_SIZE = 2000
+
+
+class ResultAnswerService:
+    @staticmethod
+    def build_rows(answer_key: CompiledAnswerKey, result_id: int, answers: Dict) -> List[Dict]:
+        rows = []
+        for question_id, selected in answers.items():
+            question = answer_key.questions.get(int(question_id))
+            if question is None or question.question_type == QuestionType.TEXT or not selected:
+                continue
+            is_correct = question.is_correct(selected)
+            selected = question.decode(selected)
+            earned_points = question.points if is_correct else 0
+            for answer in dict.fromkeys(selected):
+                rows.append({
+                    "result_id": result_id,
+                    "question_id": question.question_id,
+                    "option_index": question.options.index(answer) if answer in question.options else None,
+                    "is_correct": is_correct,
+                    "earned_points": earned_points,
+                })
+        return rows
+
+    @staticmethod
+    def insert_rows(db: Session, rows: List[Dict]) -> None:
+        if rows:
+            db.execute(insert(ResultAnswer), rows)
+
+    @staticmethod
+    def replace_for_results(db: Session, answer_key: CompiledAnswerKey, results: Iterable) -> None:
+        # results: пары (result_id, answers); используется при перепроверке
+        results = list(results)
+        db.execute(delete(ResultAnswer).where(ResultAnswer.result_id.in_([result_id for result_id, _ in results])))
+        rows = []
+        for result_id, answers in results:
+            rows.extend(ResultAnswerService.build_rows(answer_key, result_id, answers or {}))
+        ResultAnswerService.insert_rows(db, rows)
+
+    @staticmethod
+    def get_question_correctness(db: Session, test_id: int) -> Dict[int, int]:
+        # один агрегат по индексу (question_id, is_correct, result_id) вместо разбора всех JSON
+        rows = (
+            db.query(ResultAnswer.question_id, func.count(func.distinct(ResultAnswer.result_id)))
+            .join(Question, Question.id == ResultAnswer.question_id)
+            .filter(Question.test_id == test_id, ResultAnswer.is_correct == True)
+            .group_by(ResultAnswer.question_id)
+            .all()
+        )
+        return dict(rows)
+
+    @staticmethod
+    def backfill(db: Session, test_ids: Optional[Iterable[int]] = None, chunk_size: int = BACKFILL_CHUNK_SIZE) -> int:
+        # идемпотентно: заполняются только результаты, у которых еще нет строк
+        query = (
+            db.query(Result.id, Result.test_id, Result.answers)
+            .filter(~Result.id.in_(db.query(ResultAnswer.result_id)))
+            .order_by(Result.id)
+        )
+        if test_ids:
+            query = query.filter(Result.test_id.in_(list(test_ids)))
+
+        processed = 0
+        last_id = 0
+        while True:
+            chunk = query.filter(Result.id > last_id).limit(chunk_size).all()
+            if not chunk:
+                break
+            rows = []
+            for result_id, test_id, answers in chunk:
+                answer_key = AnswerKeyService.get_answer_key(db, test_id)
+                rows.extend(ResultAnswerService.build_rows(answer_key, result_id, answers or {}))
+            ResultAnswerService.insert_rows(db, rows)
+            db.commit()
+            processed += len(chunk)
+            last_id = chunk[-1][0]
+        return processed
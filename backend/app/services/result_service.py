@@ -1,30 +1,54 @@
-from sqlalchemy.orm import Session
-from typing import Dict, List
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import case, insert, update
+from sqlalchemy.orm import Session, joinedload, object_session
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
 from ..core.config import settings
+from ..core.pagination import paginate
+from ..core.security import CurrentUser
+from ..models.attempt import Attempt
 from ..models.result import Result
-from ..models.question import Question, QuestionType
-from ..schemas.result import TestSubmit
+from ..models.result_answer import ResultAnswer
+from ..models.test import Test
+from ..models.user import User
+from ..models.question import QuestionType
+from ..schemas.result import BatchSubmitItem, TestSubmit
+from .answer_key import AnswerKeyService, CompiledAnswerKey, CompiledQuestion, StaleAnswerKeyError, StoredAnswer
+from .errors import ConflictError
+from .item_analysis import ItemAnalysisService
+from .result_answers import ResultAnswerService
+from .statistics_service import StatisticsService
+
+REMAP_CHUNK_SIZE = 2000
+STALE_KEY_RETRIES = 3
+
+
+class OpenAttempt(NamedTuple):
+    id: int
+    started_at: datetime
+    deadline_at: Optional[datetime]
 
 
 class ResultService:
     @staticmethod
-    def calculate_score(db: Session, test_id: int, answers: Dict[int, List[str]]) -> Dict:
-        questions = db.query(Question).filter(Question.test_id == test_id).all()
+    def calculate_score(
+        db: Session, test_id: int, answers: Dict[int, List[str]], answer_key: Optional[CompiledAnswerKey] = None
+    ) -> Dict:
+        answer_key = answer_key or AnswerKeyService.get_answer_key(db, test_id)
 
         total_score = 0
-        max_score = sum(q.points for q in questions)
+        max_score = answer_key.max_score
 
-        answers_dict = ResultService.normalize_answers(answers)
+        # ответы хранятся в сжатом виде (см. CompiledQuestion.encode), проверка — сравнение масок
+        encoded = ResultService.encode_answers(answer_key, answers)
 
-        for question in questions:
+        for question in answer_key.questions.values():
             if question.question_type == QuestionType.TEXT:
                 # Текстовые ответы не оцениваются автоматически
                 continue
 
-            user_answers = sorted(answers_dict.get(question.id, []))
-            correct_answers = sorted(str(answer) for answer in (question.correct_answers or []))
-
-            if correct_answers and user_answers == correct_answers:
+            if question.is_correct(encoded.get(question.question_id, [])):
                 total_score += question.points
 
         percentage = (total_score / max_score * 100) if max_score > 0 else 0
@@ -35,66 +59,413 @@ class ResultService:
             "max_score": max_score,
             "percentage": round(percentage, 2),
             "passed": passed,
-            "answers": answers_dict
+            "answers": encoded
         }
 
     @staticmethod
-    def submit_test(db: Session, user_id: int, submission: TestSubmit) -> Result:
-        result_data = ResultService.calculate_score(db, submission.test_id, submission.answers)
+    def add_result(
+        db: Session, test_id: int, user_id: int, answers: Dict, time_spent_minutes: Optional[int]
+    ) -> Result:
+        # оценка, сводка и вставка в текущую транзакцию; commit — на вызывающей стороне
+        answer_key = AnswerKeyService.get_answer_key(db, test_id)
+        result_data = ResultService.calculate_score(db, test_id, answers, answer_key)
+        StatisticsService.record_result(db, test_id, result_data["percentage"])
 
         db_result = Result(
-            test_id=submission.test_id,
+            test_id=test_id,
             user_id=user_id,
             answers=result_data["answers"],
             score=result_data["score"],
             max_score=result_data["max_score"],
             percentage=result_data["percentage"],
-            time_spent_minutes=submission.time_spent_minutes
+            time_spent_minutes=time_spent_minutes
         )
 
         db.add(db_result)
+        db.flush()
+        AnswerKeyService.verify(db, [answer_key])
+        if settings.STORE_RESULT_ANSWERS:
+            ResultAnswerService.insert_rows(db, ResultAnswerService.build_rows(
+                answer_key, db_result.id, result_data["answers"]
+            ))
+        return db_result
+
+    @staticmethod
+    def time_spent_minutes(started_at: datetime, deadline_at: Optional[datetime], finished_at: datetime) -> int:
+        if deadline_at is not None:
+            finished_at = min(finished_at, deadline_at)
+        return max(0, math.ceil((finished_at - started_at).total_seconds() / 60))
+
+    @staticmethod
+    def open_attempts(db: Session, keys: Iterable[Tuple[int, int]]) -> Dict[Tuple[int, int], OpenAttempt]:
+        # (user_id, test_id) -> последняя незавершенная попытка;
+        # время решения считается от нее, без попытки оно неизвестно
+        keys = set(keys)
+        if not keys:
+            return {}
+        rows = (
+            db.query(Attempt.id, Attempt.user_id, Attempt.test_id, Attempt.started_at, Attempt.deadline_at)
+            .filter(
+                Attempt.user_id.in_({user_id for user_id, _ in keys}),
+                Attempt.test_id.in_({test_id for _, test_id in keys}),
+                Attempt.submitted_at.is_(None),
+            )
+            .order_by(Attempt.id)
+        )
+        return {
+            (user_id, test_id): OpenAttempt(attempt_id, started_at, deadline_at)
+            for attempt_id, user_id, test_id, started_at, deadline_at in rows
+            if (user_id, test_id) in keys
+        }
+
+    @staticmethod
+    def is_late(deadline_at: Optional[datetime], finished_at: datetime) -> bool:
+        # запас ATTEMPT_GRACE_SECONDS — на сетевую задержку отправки у самого дедлайна
+        grace = timedelta(seconds=settings.ATTEMPT_GRACE_SECONDS)
+        return deadline_at is not None and finished_at > deadline_at + grace
+
+    @staticmethod
+    def claim_attempts(
+        db: Session, submissions: List[Tuple[int, int, datetime]]
+    ) -> List[Tuple[Optional[OpenAttempt], Optional[str]]]:
+        # для каждой отправки (user_id, test_id, finished_at): открытая попытка, которую она закрывает,
+        # или причина отказа. Попытка закрывается атомарно в текущей транзакции, поэтому вторая
+        # отправка (или finalize) ее уже не найдет. Отправка без попытки принимается как раньше.
+        attempts = ResultService.open_attempts(db, ((user_id, test_id) for user_id, test_id, _ in submissions))
+        outcomes: List[Tuple[Optional[OpenAttempt], Optional[str]]] = []
+        finished: Dict[int, datetime] = {}
+        for user_id, test_id, finished_at in submissions:
+            attempt = attempts.get((user_id, test_id))
+            if attempt is None:
+                outcomes.append((None, None))
+            elif attempt.id in finished:
+                outcomes.append((None, "Attempt already submitted"))
+            elif ResultService.is_late(attempt.deadline_at, finished_at):
+                outcomes.append((None, "Time is over"))
+            else:
+                finished[attempt.id] = finished_at
+                outcomes.append((attempt, None))
+        if not finished:
+            return outcomes
+
+        claimed = set(db.execute(
+            update(Attempt)
+            .where(Attempt.id.in_(finished), Attempt.submitted_at.is_(None))
+            .values(submitted_at=case(finished, value=Attempt.id))
+            .returning(Attempt.id)
+            .execution_options(synchronize_session=False)
+        ).scalars())
+        return [
+            (None, "Attempt already submitted") if attempt is not None and attempt.id not in claimed
+            else (attempt, error)
+            for attempt, error in outcomes
+        ]
+
+    @staticmethod
+    def link_attempts(db: Session, result_ids: Dict[int, int]) -> None:
+        # attempt_id -> result_id для попыток, закрытых claim_attempts
+        if not result_ids:
+            return
+        db.execute(
+            update(Attempt)
+            .where(Attempt.id.in_(result_ids))
+            .values(result_id=case(result_ids, value=Attempt.id))
+            .execution_options(synchronize_session=False)
+        )
+
+    @staticmethod
+    def attempt_time_spent(attempt: Optional[OpenAttempt], finished_at: datetime) -> Optional[int]:
+        if attempt is None:
+            return None
+        return ResultService.time_spent_minutes(attempt.started_at, attempt.deadline_at, finished_at)
+
+    @staticmethod
+    def retry_on_stale_key(db: Session, func, *args):
+        # ответы кодируются по ключу, прочитанному до записи; если вопросы успели измениться
+        # (AnswerKeyService.verify), транзакция откатывается и повторяется с новым ключом
+        for _ in range(STALE_KEY_RETRIES - 1):
+            try:
+                return func(db, *args)
+            except StaleAnswerKeyError:
+                db.rollback()
+        return func(db, *args)
+
+    @staticmethod
+    def submit_test(db: Session, user_id: int, submission: TestSubmit) -> Result:
+        return ResultService.retry_on_stale_key(db, ResultService._submit_test, user_id, submission)
+
+    @staticmethod
+    def _submit_test(db: Session, user_id: int, submission: TestSubmit) -> Result:
+        finished_at = datetime.utcnow()
+        (attempt, error), = ResultService.claim_attempts(db, [(user_id, submission.test_id, finished_at)])
+        if error:
+            db.rollback()
+            raise ConflictError(error)
+        db_result = ResultService.add_result(
+            db, submission.test_id, user_id, submission.answers,
+            ResultService.attempt_time_spent(attempt, finished_at)
+        )
+        if attempt is not None:
+            db.flush()
+            ResultService.link_attempts(db, {attempt.id: db_result.id})
         db.commit()
+        ItemAnalysisService.invalidate(submission.test_id)
         db.refresh(db_result)
         return db_result
 
     @staticmethod
-    def get_user_results(db: Session, user_id: int) -> List[Result]:
-        return db.query(Result).filter(Result.user_id == user_id).all()
+    def submit_batch(db: Session, submitter: CurrentUser, items: List[BatchSubmitItem]) -> List[Dict]:
+        return ResultService.retry_on_stale_key(db, ResultService._submit_batch, submitter, items)
 
     @staticmethod
-    def get_test_results(db: Session, test_id: int) -> List[Result]:
-        return db.query(Result).filter(Result.test_id == test_id).all()
+    def _submit_batch(db: Session, submitter: CurrentUser, items: List[BatchSubmitItem]) -> List[Dict]:
+        # один запрос на тесты, один на пользователей, один на попытки, один ключ ответов на тест,
+        # один INSERT ... RETURNING на все строки и один commit
+        tests = {
+            test_id: (is_open, creator_id)
+            for test_id, is_open, creator_id in db.query(Test.id, Test.is_open, Test.creator_id)
+            .filter(Test.id.in_({item.test_id for item in items}))
+        }
+        other_user_ids = {
+            item.user_id for item in items
+            if item.user_id is not None and item.user_id != submitter.id
+        }
+        known_users = (
+            {user_id for (user_id,) in db.query(User.id).filter(User.id.in_(other_user_ids))}
+            if other_user_ids else set()
+        )
 
-    @staticmethod
-    def get_statistics(db: Session, test_id: int) -> Dict:
-        results = db.query(Result).filter(Result.test_id == test_id).all()
+        outcomes: List[Dict] = [{"index": index, "result": None, "error": None} for index in range(len(items))]
+        accepted: List[Tuple[int, int]] = []
+        completed_at = datetime.utcnow()
 
-        if not results:
-            return {
-                "total_attempts": 0,
-                "average_score": 0,
-                "max_score": 0,
-                "min_score": 0,
-                "pass_rate": 0
-            }
+        for index, item in enumerate(items):
+            user_id = item.user_id if item.user_id is not None else submitter.id
+            test = tests.get(item.test_id)
+
+            if test is None:
+                outcomes[index]["error"] = "Test not found"
+                continue
+            is_open, creator_id = test
+            if not is_open:
+                outcomes[index]["error"] = "Test is not active"
+                continue
+            if user_id != submitter.id:
+                # за другого пользователя может отправлять только автор теста
+                if submitter.role != "teacher" or creator_id != submitter.id:
+                    outcomes[index]["error"] = "Not authorized"
+                    continue
+                if user_id not in known_users:
+                    outcomes[index]["error"] = "User not found"
+                    continue
+            accepted.append((index, user_id))
+
+        claims = ResultService.claim_attempts(db, [
+            (user_id, items[index].test_id, completed_at) for index, user_id in accepted
+        ])
+        rows: List[Dict] = []
+        row_indexes: List[int] = []
+        row_attempts: List[Optional[OpenAttempt]] = []
+        for (index, user_id), (attempt, error) in zip(accepted, claims):
+            if error:
+                outcomes[index]["error"] = error
+                continue
+            item = items[index]
+            rows.append(ResultService.build_row(
+                db, item.test_id, user_id, item.answers,
+                ResultService.attempt_time_spent(attempt, completed_at), completed_at
+            ))
+            row_indexes.append(index)
+            row_attempts.append(attempt)
+
+        if not rows:
+            db.commit()
+            return outcomes
+
+        result_ids = ResultService.insert_results(db, rows)
+        ResultService.link_attempts(db, {
+            attempt.id: result_id for attempt, result_id in zip(row_attempts, result_ids) if attempt is not None
+        })
+        db.commit()
+        for test_id in {row["test_id"] for row in rows}:
+            ItemAnalysisService.invalidate(test_id)
 
-        scores = [r.percentage for r in results]
-        passed = sum(1 for s in scores if s >= settings.PASS_PERCENTAGE)
+        for index, result_id, row in zip(row_indexes, result_ids, rows):
+            outcomes[index]["result"] = {
+                "id": result_id,
+                **row,
+                "answers": ResultService.normalize_answers(
+                    row["answers"], AnswerKeyService.get_answer_key(db, row["test_id"])
+                ),
+                "passed": row["percentage"] >= settings.PASS_PERCENTAGE,
+            }
+        return outcomes
 
+    @staticmethod
+    def build_row(
+        db: Session, test_id: int, user_id: int, answers: Dict,
+        time_spent_minutes: Optional[int], completed_at: datetime
+    ) -> Dict:
+        result_data = ResultService.calculate_score(db, test_id, answers)
         return {
-            "total_attempts": len(results),
-            "average_score": round(sum(scores) / len(scores), 2),
-            "max_score": max(scores),
-            "min_score": min(scores),
-            "pass_rate": round(passed / len(results) * 100, 2)
+            "test_id": test_id,
+            "user_id": user_id,
+            "answers": result_data["answers"],
+            "score": result_data["score"],
+            "max_score": result_data["max_score"],
+            "percentage": result_data["percentage"],
+            "time_spent_minutes": time_spent_minutes,
+            "completed_at": completed_at,
         }
 
     @staticmethod
-    def normalize_answers(answers: Dict[int, List[str]] | None) -> Dict[int, List[str]]:
-        return {
-            int(question_id): [str(answer) for answer in (selected or [])]
-            for question_id, selected in (answers or {}).items()
+    def insert_results(db: Session, rows: List[Dict]) -> List[int]:
+        # сводки, один INSERT ... RETURNING на все строки и result_answers; commit — на вызывающей стороне
+        percentages_by_test: Dict[int, List[float]] = defaultdict(list)
+        for row in rows:
+            percentages_by_test[row["test_id"]].append(row["percentage"])
+        for test_id in sorted(percentages_by_test):
+            StatisticsService.record_results(db, test_id, percentages_by_test[test_id])
+
+        if db.get_bind().dialect.name == "sqlite":
+            # SQLite не гарантирует порядок RETURNING, и SQLAlchemy тогда вставляет по строке;
+            # rowid внутри многострочного INSERT выдаются по порядку VALUES, поэтому сортируем id
+            result_ids = sorted(db.execute(insert(Result).returning(Result.id), rows).scalars().all())
+        else:
+            result_ids = db.execute(
+                insert(Result).returning(Result.id, sort_by_parameter_order=True),
+                rows
+            ).scalars().all()
+        AnswerKeyService.verify(db, [
+            AnswerKeyService.get_answer_key(db, test_id) for test_id in percentages_by_test
+        ])
+        if settings.STORE_RESULT_ANSWERS:
+            answer_rows = []
+            for result_id, row in zip(result_ids, rows):
+                answer_key = AnswerKeyService.get_answer_key(db, row["test_id"])
+                answer_rows.extend(ResultAnswerService.build_rows(answer_key, result_id, row["answers"]))
+            ResultAnswerService.insert_rows(db, answer_rows)
+        return list(result_ids)
+
+    @staticmethod
+    def _with_listing_relations(query):
+        # title теста и имя пользователя подгружаются одним JOIN вместо 2N ленивых запросов
+        return query.options(
+            joinedload(Result.test).load_only(Test.id, Test.title, Test.updated_at),
+            joinedload(Result.user).load_only(User.id, User.full_name),
+        )
+
+    @staticmethod
+    def _paginate_results(
+        query, cursor: Optional[str], limit: int, skip: int = 0
+    ) -> Tuple[List[Result], Optional[str]]:
+        results, next_cursor = paginate(
+            ResultService._with_listing_relations(query),
+            Result.completed_at, Result.id, cursor, limit,
+            key=lambda result: (result.completed_at, result.id), skip=skip,
+        )
+        # версии ключей ответов пришли вместе с тестами в JOIN: отдельных запросов на тест нет
+        AnswerKeyService.preload(query.session, {result.test_id: result.test.updated_at for result in results})
+        return results, next_cursor
+
+    @staticmethod
+    def get_user_results(
+        db: Session, user_id: int, cursor: Optional[str] = None, limit: int = 100, skip: int = 0
+    ) -> Tuple[List[Result], Optional[str]]:
+        query = db.query(Result).filter(Result.user_id == user_id)
+        return ResultService._paginate_results(query, cursor, limit, skip)
+
+    @staticmethod
+    def get_test_results(
+        db: Session, test_id: int, cursor: Optional[str] = None, limit: int = 100, skip: int = 0
+    ) -> Tuple[List[Result], Optional[str]]:
+        query = db.query(Result).filter(Result.test_id == test_id)
+        return ResultService._paginate_results(query, cursor, limit, skip)
+
+    @staticmethod
+    def encode_answers(answer_key: CompiledAnswerKey, answers: Dict[int, List[str]] | None) -> Dict[int, StoredAnswer]:
+        encoded: Dict[int, StoredAnswer] = {}
+        for question_id, selected in (answers or {}).items():
+            if isinstance(selected, int):
+                # уже закодированный ответ
+                encoded[int(question_id)] = selected
+                continue
+            question = answer_key.questions.get(int(question_id))
+            selected = [str(answer) for answer in (selected or [])]
+            encoded[int(question_id)] = question.encode(selected) if question else selected
+        return encoded
+
+    @staticmethod
+    def normalize_answers(
+        answers: Dict[int, StoredAnswer] | None, answer_key: Optional[CompiledAnswerKey] = None
+    ) -> Dict[int, List[str]]:
+        # маски раскрываются в тексты вариантов по ключу; старые записи хранят строки как есть
+        normalized: Dict[int, List[str]] = {}
+        for question_id, selected in (answers or {}).items():
+            question_id = int(question_id)
+            if isinstance(selected, int):
+                question = answer_key.questions.get(question_id) if answer_key else None
+                normalized[question_id] = question.decode(selected) if question else []
+            else:
+                normalized[question_id] = [str(answer) for answer in (selected or [])]
+        return normalized
+
+    @staticmethod
+    def remap_question_answers(
+        db: Session,
+        test_id: int,
+        previous: CompiledQuestion,
+        current: CompiledQuestion,
+        chunk_size: int = REMAP_CHUNK_SIZE,
+    ) -> int:
+        # маски хранят индексы вариантов: при перестановке или удалении вариантов сохраненные
+        # ответы переписываются в той же транзакции, что и сам вопрос; commit делает вызывающий
+        if previous.question_type == QuestionType.TEXT:
+            return 0
+        if current.question_type != QuestionType.TEXT and current.options[:len(previous.options)] == previous.options:
+            # варианты только дописаны в конец: индексы прежних не изменились
+            return 0
+
+        key = str(current.question_id)
+        remapped = 0
+        for model in (Result, Attempt):
+            last_id = 0
+            while True:
+                rows = (
+                    db.query(model.id, model.answers)
+                    .filter(model.test_id == test_id, model.id > last_id)
+                    .order_by(model.id)
+                    .limit(chunk_size)
+                    .all()
+                )
+                if not rows:
+                    break
+                changed = [
+                    {"id": row_id, "answers": {**answers, key: current.recode(answers[key], previous)}}
+                    for row_id, answers in rows
+                    if isinstance((answers or {}).get(key), int)
+                ]
+                if changed:
+                    db.execute(update(model), changed)
+                    remapped += len(changed)
+                last_id = rows[-1][0]
+
+        moved = {
+            index: current.options.index(option) if option in current.options else None
+            for index, option in enumerate(previous.options)
         }
+        if any(index != new_index for index, new_index in moved.items()):
+            db.execute(
+                update(ResultAnswer)
+                .where(ResultAnswer.question_id == current.question_id, ResultAnswer.option_index.isnot(None))
+                .values(option_index=case(moved, value=ResultAnswer.option_index, else_=None))
+                .execution_options(synchronize_session=False)
+            )
+        return remapped
+
+    @staticmethod
+    def answer_key_for(result: Result) -> CompiledAnswerKey:
+        return AnswerKeyService.get_answer_key(object_session(result), result.test_id)
 
     @staticmethod
     def serialize_result(result: Result, include_answers: bool = True) -> Dict:
@@ -111,7 +482,7 @@ class ResultService:
         }
 
         if include_answers:
-            base["answers"] = ResultService.normalize_answers(result.answers)
+            base["answers"] = ResultService.normalize_answers(result.answers, ResultService.answer_key_for(result))
         else:
             base["answers"] = {}
 
@@ -119,10 +490,10 @@ class ResultService:
 
     @staticmethod
     def build_question_details(result: Result) -> List[Dict]:
-        answers = ResultService.normalize_answers(result.answers)
+        answers = ResultService.normalize_answers(result.answers, ResultService.answer_key_for(result))
         details: List[Dict] = []
 
-        for question in sorted(result.test.questions, key=lambda q: q.order_number):
+        for question in result.test.questions:
             selected = answers.get(question.id, [])
             correct = [str(answer) for answer in (question.correct_answers or [])]
 
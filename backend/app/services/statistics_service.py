@@ -0,0 +1,367 @@
+import math
+from sqlalchemy import case, func, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from typing import Dict, Iterable, List, Optional, Sequence
+from ..core.config import settings
+from ..models.question import QuestionType
+from ..models.result import Result
+from ..models.test import Test
+from ..models.test_statistics import TestStatistics
+from .answer_key import AnswerKeyService
+from .result_answers import ResultAnswerService
+
+HISTOGRAM_BUCKETS = len(TestStatistics.BUCKET_COLUMNS)
+PERCENTILES = (25, 50, 75, 90)
+STREAM_CHUNK_SIZE = 1000
+
+
+class StatisticsService:
+    @staticmethod
+    def empty_statistics() -> Dict:
+        return {
+            "total_attempts": 0,
+            "average_score": 0,
+            "max_score": 0,
+            "min_score": 0,
+            "pass_rate": 0,
+            "std_dev": 0,
+            "histogram": StatisticsService.build_histogram([0] * HISTOGRAM_BUCKETS),
+            "percentiles": {},
+            "questions": [],
+        }
+
+    @staticmethod
+    def bucket_index(percentage: float) -> int:
+        # 100% попадает в последний интервал, а не в отдельный
+        return min(max(int(percentage // (100 / HISTOGRAM_BUCKETS)), 0), HISTOGRAM_BUCKETS - 1)
+
+    @staticmethod
+    def build_histogram(counts: Sequence[int]) -> List[Dict]:
+        width = 100 / HISTOGRAM_BUCKETS
+        return [
+            {"lower": round(index * width, 2), "upper": round((index + 1) * width, 2), "count": count}
+            for index, count in enumerate(counts)
+        ]
+
+    @staticmethod
+    def percentile_rank(percentile: int, total: int) -> int:
+        # nearest-rank: индекс (с нуля) в отсортированном списке
+        return max(math.ceil(percentile / 100 * total), 1) - 1
+
+    @staticmethod
+    def std_dev(total: int, score_sum: float, score_sum_sq: float) -> float:
+        mean = score_sum / total
+        return round(math.sqrt(max(score_sum_sq / total - mean * mean, 0)), 2)
+
+    @staticmethod
+    def get_statistics(
+        db: Session, test_id: int, include_questions: bool = False, exact: bool = False
+    ) -> Dict:
+        if not exact and not include_questions:
+            summary = db.get(TestStatistics, test_id)
+            if summary is not None:
+                return StatisticsService.summary_to_statistics(summary)
+        return StatisticsService.get_live_statistics(db, test_id, include_questions)
+
+    @staticmethod
+    def summary_to_statistics(summary: TestStatistics) -> Dict:
+        total = summary.attempts
+        if not total:
+            return StatisticsService.empty_statistics()
+
+        return {
+            "total_attempts": total,
+            "average_score": round(summary.score_sum / total, 2),
+            "max_score": summary.max_score,
+            "min_score": summary.min_score,
+            "pass_rate": round(summary.pass_count / total * 100, 2),
+            "std_dev": StatisticsService.std_dev(total, summary.score_sum, summary.score_sum_sq),
+            "histogram": StatisticsService.build_histogram(summary.histogram),
+            "percentiles": StatisticsService.estimate_percentiles(summary),
+            "questions": [],
+        }
+
+    @staticmethod
+    def estimate_percentiles(summary: TestStatistics) -> Dict[int, float]:
+        # по сводке доступны только интервалы: значения интервала считаются равномерно
+        # разложенными от нижней границы, искомое смещено на долю тех, что ниже него по рангу
+        width = 100 / HISTOGRAM_BUCKETS
+        estimates: Dict[int, float] = {}
+        for percentile in PERCENTILES:
+            rank = StatisticsService.percentile_rank(percentile, summary.attempts)
+            seen = 0
+            for index, count in enumerate(summary.histogram):
+                if count and seen + count > rank:
+                    value = index * width + (rank - seen) / count * width
+                    estimates[percentile] = round(min(max(value, summary.min_score), summary.max_score), 2)
+                    break
+                seen += count
+        return estimates
+
+    @staticmethod
+    def get_live_statistics(db: Session, test_id: int, include_questions: bool = False) -> Dict:
+        aggregates = StatisticsService.get_aggregates(db, test_id)
+        total = aggregates["attempts"]
+
+        if not total:
+            return StatisticsService.empty_statistics()
+
+        statistics = {
+            "total_attempts": total,
+            "average_score": round(aggregates["score_sum"] / total, 2),
+            "max_score": aggregates["max_score"],
+            "min_score": aggregates["min_score"],
+            "pass_rate": round(aggregates["pass_count"] / total * 100, 2),
+            "std_dev": StatisticsService.std_dev(total, aggregates["score_sum"], aggregates["score_sum_sq"]),
+            "histogram": StatisticsService.build_histogram(StatisticsService.get_histogram_counts(db, test_id)),
+            "percentiles": StatisticsService.get_percentiles(db, test_id, total),
+            "questions": [],
+        }
+        if include_questions:
+            statistics["questions"] = StatisticsService.get_question_correctness(db, test_id, total)
+        return statistics
+
+    @staticmethod
+    def get_aggregates(db: Session, test_id: int) -> Dict:
+        total, score_sum, score_sum_sq, min_score, max_score, passed = (
+            db.query(
+                func.count(Result.id),
+                func.sum(Result.percentage),
+                func.sum(Result.percentage * Result.percentage),
+                func.min(Result.percentage),
+                func.max(Result.percentage),
+                func.sum(case((Result.percentage >= settings.PASS_PERCENTAGE, 1), else_=0)),
+            )
+            .filter(Result.test_id == test_id)
+            .one()
+        )
+        return {
+            "attempts": total,
+            "score_sum": score_sum or 0,
+            "score_sum_sq": score_sum_sq or 0,
+            "min_score": min_score,
+            "max_score": max_score,
+            "pass_count": passed or 0,
+        }
+
+    @staticmethod
+    def get_histogram_counts(db: Session, test_id: int) -> List[int]:
+        width = 100 / HISTOGRAM_BUCKETS
+        # явные границы вместо CAST: округление при приведении типов отличается между СУБД
+        bucket = case(
+            *[(Result.percentage < width * (index + 1), index) for index in range(HISTOGRAM_BUCKETS - 1)],
+            else_=HISTOGRAM_BUCKETS - 1,
+        )
+        rows = (
+            db.query(bucket, func.count(Result.id))
+            .filter(Result.test_id == test_id)
+            .group_by(bucket)
+            .all()
+        )
+
+        counts = [0] * HISTOGRAM_BUCKETS
+        for index, count in rows:
+            counts[index] = count
+        return counts
+
+    @staticmethod
+    def get_percentiles(db: Session, test_id: int, total: int) -> Dict[int, float]:
+        # каждая точка — один шаг по индексу (test_id, percentage), без выборки всех строк
+        return {
+            percentile: (
+                db.query(Result.percentage)
+                .filter(Result.test_id == test_id)
+                .order_by(Result.percentage)
+                .offset(StatisticsService.percentile_rank(percentile, total))
+                .limit(1)
+                .scalar()
+            )
+            for percentile in PERCENTILES
+        }
+
+    @staticmethod
+    def get_question_correctness(db: Session, test_id: int, total: int) -> List[Dict]:
+        answer_key = AnswerKeyService.get_answer_key(db, test_id)
+        gradable = [
+            question for question in answer_key.questions.values()
+            if question.question_type != QuestionType.TEXT
+        ]
+        correct = {question.question_id: 0 for question in gradable}
+
+        if settings.STORE_RESULT_ANSWERS:
+            correct.update(ResultAnswerService.get_question_correctness(db, test_id))
+            return StatisticsService.correctness_rows(gradable, correct, total)
+
+        rows = (
+            db.query(Result.answers)
+            .filter(Result.test_id == test_id)
+            .yield_per(STREAM_CHUNK_SIZE)
+        )
+        for (answers,) in rows:
+            answers_dict = {int(question_id): selected for question_id, selected in (answers or {}).items()}
+            for question in gradable:
+                if question.is_correct(answers_dict.get(question.question_id, [])):
+                    correct[question.question_id] += 1
+
+        return StatisticsService.correctness_rows(gradable, correct, total)
+
+    @staticmethod
+    def correctness_rows(gradable: List, correct: Dict[int, int], total: int) -> List[Dict]:
+        return [
+            {
+                "question_id": question.question_id,
+                "attempts": total,
+                "correct": correct[question.question_id],
+                "correct_rate": round(correct[question.question_id] / total * 100, 2),
+            }
+            for question in gradable
+        ]
+
+    @staticmethod
+    def get_statistics_python(db: Session, test_id: int) -> Dict:
+        # прежняя реализация в памяти; используется только для сверки с SQL-версией
+        results = db.query(Result).filter(Result.test_id == test_id).all()
+
+        if not results:
+            return StatisticsService.empty_statistics()
+
+        scores = [r.percentage for r in results]
+        passed = sum(1 for s in scores if s >= settings.PASS_PERCENTAGE)
+        ordered = sorted(scores)
+
+        counts = [0] * HISTOGRAM_BUCKETS
+        for score in scores:
+            counts[StatisticsService.bucket_index(score)] += 1
+
+        return {
+            "total_attempts": len(results),
+            "average_score": round(sum(scores) / len(scores), 2),
+            "max_score": max(scores),
+            "min_score": min(scores),
+            "pass_rate": round(passed / len(results) * 100, 2),
+            "std_dev": StatisticsService.std_dev(len(scores), sum(scores), sum(s * s for s in scores)),
+            "histogram": StatisticsService.build_histogram(counts),
+            "percentiles": {
+                percentile: ordered[StatisticsService.percentile_rank(percentile, len(ordered))]
+                for percentile in PERCENTILES
+            },
+            "questions": [],
+        }
+
+    @staticmethod
+    def record_result(db: Session, test_id: int, percentage: float) -> None:
+        StatisticsService.record_results(db, test_id, [percentage])
+
+    @staticmethod
+    def record_results(db: Session, test_id: int, percentages: Sequence[float]) -> None:
+        # вызывается до добавления Result в ту же транзакцию. Приращения считаются в самом UPDATE
+        # (col = col + n): чтение и запись сводки не разделены, параллельные отправки не теряются
+        # и на SQLite, где SELECT ... FOR UPDATE ничего не блокирует
+        if not percentages:
+            return
+        buckets = [0] * HISTOGRAM_BUCKETS
+        for percentage in percentages:
+            buckets[StatisticsService.bucket_index(percentage)] += 1
+        low, high = min(percentages), max(percentages)
+
+        values = {
+            "attempts": TestStatistics.attempts + len(percentages),
+            "score_sum": TestStatistics.score_sum + sum(percentages),
+            "score_sum_sq": TestStatistics.score_sum_sq + sum(percentage * percentage for percentage in percentages),
+            "min_score": case(
+                ((TestStatistics.min_score.is_(None)) | (TestStatistics.min_score > low), low),
+                else_=TestStatistics.min_score,
+            ),
+            "max_score": case(
+                ((TestStatistics.max_score.is_(None)) | (TestStatistics.max_score < high), high),
+                else_=TestStatistics.max_score,
+            ),
+            "pass_count": TestStatistics.pass_count + sum(
+                1 for percentage in percentages if percentage >= settings.PASS_PERCENTAGE
+            ),
+        }
+        for column, count in zip(TestStatistics.BUCKET_COLUMNS, buckets):
+            if count:
+                values[column] = getattr(TestStatistics, column) + count
+
+        statement = (
+            update(TestStatistics)
+            .where(TestStatistics.test_id == test_id)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        if db.execute(statement).rowcount == 0:
+            # сводки еще нет: она создается по уже сохраненным результатам, затем приращение
+            StatisticsService.create_summary(db, test_id)
+            db.execute(statement)
+
+    @staticmethod
+    def create_summary(db: Session, test_id: int) -> None:
+        summary = TestStatistics(test_id=test_id, **StatisticsService.compute_summary(db, test_id))
+        try:
+            with db.begin_nested():
+                db.add(summary)
+        except IntegrityError:
+            # сводку параллельно создал другой запрос
+            pass
+
+    @staticmethod
+    def empty_summary() -> Dict:
+        return {
+            "attempts": 0,
+            "score_sum": 0,
+            "score_sum_sq": 0,
+            "min_score": None,
+            "max_score": None,
+            "pass_count": 0,
+            "histogram": [0] * HISTOGRAM_BUCKETS,
+        }
+
+    @staticmethod
+    def compute_summary(db: Session, test_id: int) -> Dict:
+        aggregates = StatisticsService.get_aggregates(db, test_id)
+        aggregates["histogram"] = StatisticsService.get_histogram_counts(db, test_id)
+        return aggregates
+
+    @staticmethod
+    def find_drift(summary: Optional[TestStatistics], expected: Dict) -> List[str]:
+        if summary is None:
+            return ["missing"] if expected["attempts"] else []
+
+        drift = []
+        for field, value in expected.items():
+            stored = getattr(summary, field)
+            if isinstance(value, float) or isinstance(stored, float):
+                if stored is None or value is None:
+                    matches = stored == value
+                else:
+                    matches = math.isclose(stored, value, rel_tol=1e-9, abs_tol=1e-6)
+            else:
+                matches = stored == value
+            if not matches:
+                drift.append(field)
+        return drift
+
+    @staticmethod
+    def rebuild_summaries(
+        db: Session, test_ids: Optional[Iterable[int]] = None, check_only: bool = False
+    ) -> List[Dict]:
+        if test_ids is None:
+            test_ids = [test_id for (test_id,) in db.query(Test.id).order_by(Test.id)]
+
+        report = []
+        for test_id in test_ids:
+            expected = StatisticsService.compute_summary(db, test_id)
+            summary = db.get(TestStatistics, test_id)
+            drift = StatisticsService.find_drift(summary, expected)
+            report.append({"test_id": test_id, "attempts": expected["attempts"], "drift": drift})
+
+            if drift and not check_only:
+                if summary is None:
+                    db.add(TestStatistics(test_id=test_id, **expected))
+                else:
+                    for field, value in expected.items():
+                        setattr(summary, field, value)
+                db.commit()
+        return report
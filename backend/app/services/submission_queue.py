@@ -0,0 +1,388 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from sqlalchemy import insert
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import Session
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..models.submission_receipt import SubmissionReceipt
+from ..models.test import Test
+from ..schemas.result import TestSubmit
+from .answer_key import StaleAnswerKeyError
+from .item_analysis import ItemAnalysisService
+from .result_service import ResultService
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+PROCESSING = "processing"
+DONE = "done"
+FAILED = "failed"
+
+# блокировка базы, таймаут пула, обрыв соединения, правка вопросов во время записи:
+# запись остается в очереди и повторяется; остальные ошибки (валидация, IntegrityError)
+# повтором не исправить
+TRANSIENT_ERRORS = (OperationalError, PoolTimeoutError, StaleAnswerKeyError)
+
+
+class QueuedSubmission(NamedTuple):
+    receipt: str
+    user_id: int
+    test_id: int
+    answers: Dict
+    accepted_at: datetime
+
+
+class SubmissionJournal:
+    # журнал в отдельном файле SQLite: прием отправки — одна короткая запись,
+    # без блокировок основной базы
+    def __init__(self, path: str, synchronous: str = "NORMAL"):
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(f"PRAGMA synchronous={synchronous}")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS submissions ("
+                " receipt TEXT PRIMARY KEY,"
+                " user_id INTEGER NOT NULL,"
+                " test_id INTEGER NOT NULL,"
+                " payload TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " result_id INTEGER,"
+                " error TEXT,"
+                " accepted_at TEXT NOT NULL,"
+                " processed_at TEXT,"
+                " owner TEXT,"
+                " claimed_at TEXT,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " retry_at TEXT)"
+            )
+            existing = {row[1] for row in self._connection.execute("PRAGMA table_info(submissions)")}
+            for column, definition in (
+                ("owner", "TEXT"), ("claimed_at", "TEXT"),
+                ("attempts", "INTEGER NOT NULL DEFAULT 0"), ("retry_at", "TEXT"),
+            ):
+                if column not in existing:
+                    self._connection.execute(f"ALTER TABLE submissions ADD COLUMN {column} {definition}")
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_submissions_status ON submissions (status)"
+            )
+
+    def append(self, user_id: int, submission: TestSubmit) -> str:
+        receipt = uuid.uuid4().hex
+        payload = json.dumps({"answers": submission.answers})
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO submissions (receipt, user_id, test_id, payload, status, accepted_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (receipt, user_id, submission.test_id, payload, PENDING, datetime.utcnow().isoformat()),
+            )
+        return receipt
+
+    def claim(self, owner: str, limit: int) -> List[QueuedSubmission]:
+        # выборка и захват одним UPDATE ... RETURNING: несколько worker (и процессов) на одном
+        # журнале не получат одну запись дважды
+        now = datetime.utcnow().isoformat()
+        with self._lock:
+            rows = self._connection.execute(
+                "UPDATE submissions SET status = ?, owner = ?, claimed_at = ?"
+                " WHERE rowid IN (SELECT rowid FROM submissions WHERE status = ?"
+                " AND (retry_at IS NULL OR retry_at <= ?) ORDER BY rowid LIMIT ?)"
+                " RETURNING receipt, user_id, test_id, payload, accepted_at",
+                (PROCESSING, owner, now, PENDING, now, limit),
+            ).fetchall()
+        entries = []
+        for receipt, user_id, test_id, payload, accepted_at in rows:
+            data = json.loads(payload)
+            # ключи JSON — строки, ResultService ждет id вопросов
+            answers = {int(question_id): selected for question_id, selected in data["answers"].items()}
+            entries.append(QueuedSubmission(
+                receipt, user_id, test_id, answers, datetime.fromisoformat(accepted_at),
+            ))
+        # RETURNING не гарантирует порядок строк
+        entries.sort(key=lambda entry: entry.accepted_at)
+        return entries
+
+    def release_stale(self, older_than: datetime) -> int:
+        # записи, захваченные worker, который не дожил до отметки результата; это тоже попытка,
+        # иначе запись, на которой worker падает, возвращалась бы в очередь бесконечно
+        with self._lock:
+            return self._connection.execute(
+                "UPDATE submissions SET attempts = attempts + 1, owner = NULL,"
+                " status = CASE WHEN attempts + 1 >= ? THEN ? ELSE ? END,"
+                " error = CASE WHEN attempts + 1 >= ? THEN ? ELSE error END,"
+                " processed_at = CASE WHEN attempts + 1 >= ? THEN ? ELSE processed_at END"
+                " WHERE status = ? AND claimed_at < ?",
+                (
+                    settings.SUBMISSION_QUEUE_MAX_ATTEMPTS, FAILED, PENDING,
+                    settings.SUBMISSION_QUEUE_MAX_ATTEMPTS, "Worker did not finish",
+                    settings.SUBMISSION_QUEUE_MAX_ATTEMPTS, datetime.utcnow().isoformat(),
+                    PROCESSING, older_than.isoformat(),
+                ),
+            ).rowcount
+
+    def complete(
+        self, owner: str, done: Dict[str, int], failed: Dict[str, str], retry: Optional[Dict[str, str]] = None
+    ) -> None:
+        # отмечаются только записи, которые этот worker все еще держит
+        now = datetime.utcnow()
+        processed_at = now.isoformat()
+        with self._lock:
+            self._connection.execute("BEGIN")
+            self._connection.executemany(
+                "UPDATE submissions SET status = ?, result_id = ?, processed_at = ?, owner = NULL"
+                " WHERE receipt = ? AND owner = ?",
+                [(DONE, result_id, processed_at, receipt, owner) for receipt, result_id in done.items()],
+            )
+            self._connection.executemany(
+                "UPDATE submissions SET status = ?, error = ?, processed_at = ?, owner = NULL"
+                " WHERE receipt = ? AND owner = ?",
+                [(FAILED, error, processed_at, receipt, owner) for receipt, error in failed.items()],
+            )
+            for receipt, error in (retry or {}).items():
+                attempts = self._connection.execute(
+                    "SELECT attempts FROM submissions WHERE receipt = ? AND owner = ?", (receipt, owner)
+                ).fetchone()
+                if attempts is None:
+                    continue
+                attempts = attempts[0] + 1
+                if attempts >= settings.SUBMISSION_QUEUE_MAX_ATTEMPTS:
+                    self._connection.execute(
+                        "UPDATE submissions SET status = ?, error = ?, attempts = ?, processed_at = ?, owner = NULL"
+                        " WHERE receipt = ?",
+                        (FAILED, error, attempts, processed_at, receipt),
+                    )
+                    continue
+                delay = min(settings.SUBMISSION_QUEUE_POLL_SECONDS * 2 ** attempts,
+                            settings.SUBMISSION_QUEUE_RETRY_MAX_SECONDS)
+                self._connection.execute(
+                    "UPDATE submissions SET status = ?, error = ?, attempts = ?, retry_at = ?, owner = NULL"
+                    " WHERE receipt = ?",
+                    (PENDING, error, attempts, (now + timedelta(seconds=delay)).isoformat(), receipt),
+                )
+            self._connection.execute("COMMIT")
+
+    def get(self, receipt: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT receipt, user_id, test_id, status, result_id, error, accepted_at FROM submissions"
+                " WHERE receipt = ?",
+                (receipt,),
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("receipt", "user_id", "test_id", "status", "result_id", "error", "accepted_at"), row))
+
+    def purge(self, older_than: datetime) -> int:
+        with self._lock:
+            return self._connection.execute(
+                "DELETE FROM submissions WHERE status IN (?, ?) AND processed_at < ?",
+                (DONE, FAILED, older_than.isoformat()),
+            ).rowcount
+
+    def cancel_test(self, test_id: int, error: str) -> int:
+        # незаписанные отправки удаленного теста; owner сбрасывается, чтобы complete их не перезаписал
+        with self._lock:
+            return self._connection.execute(
+                "UPDATE submissions SET status = ?, error = ?, processed_at = ?, owner = NULL"
+                " WHERE test_id = ? AND status IN (?, ?)",
+                (FAILED, error, datetime.utcnow().isoformat(), test_id, PENDING, PROCESSING),
+            ).rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class SubmissionQueueService:
+    _journal: Optional[SubmissionJournal] = None
+    _worker: Optional[threading.Thread] = None
+    _stop = threading.Event()
+    _wakeup = threading.Event()
+    _owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    @staticmethod
+    def journal() -> SubmissionJournal:
+        if SubmissionQueueService._journal is None:
+            SubmissionQueueService._journal = SubmissionJournal(
+                settings.SUBMISSION_QUEUE_PATH, settings.SUBMISSION_QUEUE_SYNCHRONOUS
+            )
+        return SubmissionQueueService._journal
+
+    @staticmethod
+    def enqueue(user_id: int, submission: TestSubmit) -> str:
+        receipt = SubmissionQueueService.journal().append(user_id, submission)
+        SubmissionQueueService._wakeup.set()
+        return receipt
+
+    @staticmethod
+    def get_status(receipt: str) -> Optional[Dict]:
+        return SubmissionQueueService.journal().get(receipt)
+
+    @staticmethod
+    def cancel_test(test_id: int) -> int:
+        return SubmissionQueueService.journal().cancel_test(test_id, "Test deleted")
+
+    @staticmethod
+    def insert_batch(db: Session, entries: List[QueuedSubmission]) -> Tuple[Dict[str, int], Dict[str, str]]:
+        # время решения и дедлайн — по моменту приема отправки в журнал; отправка закрывает
+        # открытую попытку так же, как /results/submit
+        claims = ResultService.claim_attempts(
+            db, [(entry.user_id, entry.test_id, entry.accepted_at) for entry in entries]
+        )
+        rows, receipts, attempts = [], [], []
+        failed: Dict[str, str] = {}
+        for entry, (attempt, error) in zip(entries, claims):
+            if error:
+                failed[entry.receipt] = error
+                continue
+            rows.append(ResultService.build_row(
+                db, entry.test_id, entry.user_id, entry.answers,
+                ResultService.attempt_time_spent(attempt, entry.accepted_at),
+                entry.accepted_at,
+            ))
+            receipts.append(entry.receipt)
+            attempts.append(attempt)
+        if not rows:
+            return {}, failed
+        result_ids = ResultService.insert_results(db, rows)
+        ResultService.link_attempts(db, {
+            attempt.id: result_id for attempt, result_id in zip(attempts, result_ids) if attempt is not None
+        })
+        db.execute(insert(SubmissionReceipt), [
+            {"receipt": receipt, "result_id": result_id} for receipt, result_id in zip(receipts, result_ids)
+        ])
+        return dict(zip(receipts, result_ids)), failed
+
+    @staticmethod
+    def process_batch(db: Session, entries: List[QueuedSubmission]) -> Dict[str, Dict]:
+        # после сбоя между commit основной базы и отметкой в журнале квитанция уже есть в
+        # submission_receipts: такие записи отмечаются выполненными без повторной вставки
+        done = dict(
+            db.query(SubmissionReceipt.receipt, SubmissionReceipt.result_id)
+            .filter(SubmissionReceipt.receipt.in_([entry.receipt for entry in entries]))
+            .all()
+        )
+        failed: Dict[str, str] = {}
+        retry: Dict[str, str] = {}
+
+        tests = dict(
+            db.query(Test.id, Test.is_open).filter(Test.id.in_({entry.test_id for entry in entries})).all()
+        )
+        accepted = []
+        for entry in entries:
+            if entry.receipt in done:
+                continue
+            if entry.test_id not in tests:
+                failed[entry.receipt] = "Test not found"
+            elif not tests[entry.test_id]:
+                failed[entry.receipt] = "Test is not active"
+            else:
+                accepted.append(entry)
+
+        try:
+            inserted, rejected = SubmissionQueueService.insert_batch(db, accepted)
+            db.commit()
+            done.update(inserted)
+            failed.update(rejected)
+        except TRANSIENT_ERRORS as exc:
+            # база занята или недоступна: вся пачка остается в очереди
+            db.rollback()
+            logger.warning("submission batch of %s deferred: %s", len(accepted), exc)
+            retry.update((entry.receipt, str(exc)) for entry in accepted)
+            accepted = []
+        except Exception:
+            # одна испорченная запись не должна блокировать очередь: повтор по одной
+            db.rollback()
+            logger.exception("submission batch of %s failed, retrying one by one", len(accepted))
+            for entry in accepted:
+                try:
+                    inserted, rejected = SubmissionQueueService.insert_batch(db, [entry])
+                    db.commit()
+                    done.update(inserted)
+                    failed.update(rejected)
+                except TRANSIENT_ERRORS as exc:
+                    db.rollback()
+                    retry[entry.receipt] = str(exc)
+                except Exception as exc:
+                    db.rollback()
+                    failed[entry.receipt] = str(exc) or exc.__class__.__name__
+
+        for test_id in {entry.test_id for entry in accepted}:
+            ItemAnalysisService.invalidate(test_id)
+        return {"done": done, "failed": failed, "retry": retry}
+
+    @staticmethod
+    def drain_once(batch_size: int, owner: Optional[str] = None) -> int:
+        owner = owner or SubmissionQueueService._owner
+        journal = SubmissionQueueService.journal()
+        entries = journal.claim(owner, batch_size)
+        if not entries:
+            return 0
+        db = SessionLocal()
+        try:
+            outcome = SubmissionQueueService.process_batch(db, entries)
+        except TRANSIENT_ERRORS as exc:
+            logger.warning("submission batch of %s deferred: %s", len(entries), exc)
+            outcome = {"done": {}, "failed": {}, "retry": {entry.receipt: str(exc) for entry in entries}}
+        except Exception as exc:
+            # сбой до разбора пачки по записям: записи не остаются захваченными, повтор
+            # с увеличением attempts, после SUBMISSION_QUEUE_MAX_ATTEMPTS — failed
+            logger.exception("submission batch of %s failed", len(entries))
+            error = str(exc) or exc.__class__.__name__
+            outcome = {"done": {}, "failed": {}, "retry": {entry.receipt: error for entry in entries}}
+        finally:
+            db.close()
+        journal.complete(owner, outcome["done"], outcome["failed"], outcome["retry"])
+        return len(entries)
+
+    @staticmethod
+    def run_worker() -> None:
+        retention = timedelta(hours=settings.SUBMISSION_QUEUE_RETENTION_HOURS)
+        claim_timeout = timedelta(seconds=settings.SUBMISSION_QUEUE_CLAIM_TIMEOUT_SECONDS)
+        last_purge = 0.0
+        while not SubmissionQueueService._stop.is_set():
+            try:
+                processed = SubmissionQueueService.drain_once(settings.SUBMISSION_QUEUE_BATCH_SIZE)
+            except Exception:
+                logger.exception("submission queue worker failed")
+                processed = 0
+            if processed:
+                continue
+            if time.monotonic() - last_purge > 60:
+                journal = SubmissionQueueService.journal()
+                journal.purge(datetime.utcnow() - retention)
+                journal.release_stale(datetime.utcnow() - claim_timeout)
+                last_purge = time.monotonic()
+            SubmissionQueueService._wakeup.wait(settings.SUBMISSION_QUEUE_POLL_SECONDS)
+            SubmissionQueueService._wakeup.clear()
+
+    @staticmethod
+    def start() -> None:
+        # при старте worker сначала дорабатывает записи, оставшиеся pending после сбоя
+        if SubmissionQueueService._worker is not None:
+            return
+        SubmissionQueueService.journal()
+        SubmissionQueueService._stop.clear()
+        SubmissionQueueService._worker = threading.Thread(
+            target=SubmissionQueueService.run_worker, name="submission-queue", daemon=True
+        )
+        SubmissionQueueService._worker.start()
+
+    @staticmethod
+    def stop() -> None:
+        if SubmissionQueueService._worker is None:
+            return
+        SubmissionQueueService._stop.set()
+        SubmissionQueueService._wakeup.set()
+        SubmissionQueueService._worker.join()
+        SubmissionQueueService._worker = None
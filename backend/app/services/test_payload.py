@@ -0,0 +1,130 @@
+from collections import OrderedDict
+from datetime import datetime
+from threading import Lock
+from typing import NamedTuple, Optional
+from sqlalchemy.orm import Session, selectinload
+from ..core.config import settings
+from ..models.test import Test
+from ..schemas.question import QuestionForStudent
+from ..schemas.test import TestForStudentResponse
+
+
+class StudentPayload(NamedTuple):
+    test_id: int
+    version: datetime
+    etag: str
+    body: bytes
+
+
+class StudentPayloadCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items: "OrderedDict[int, StudentPayload]" = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, test_id: int, version: datetime) -> Optional[StudentPayload]:
+        with self._lock:
+            payload = self._items.get(test_id)
+            if payload is None or payload.version != version:
+                return None
+            self._items.move_to_end(test_id)
+            return payload
+
+    def put(self, payload: StudentPayload) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._items[payload.test_id] = payload
+            self._items.move_to_end(payload.test_id)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def invalidate(self, test_id: int) -> None:
+        with self._lock:
+            self._items.pop(test_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+student_payload_cache = StudentPayloadCache(settings.STUDENT_PAYLOAD_CACHE_SIZE)
+
+
+class TestPayloadService:
+    @staticmethod
+    def make_etag(test_id: int, version: datetime) -> str:
+        return f'"{test_id}-{int(version.timestamp() * 1_000_000)}"'
+
+    @staticmethod
+    def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+        # If-None-Match сравнивается слабо: W/"x" совпадает с "x"
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        candidates = (value.strip() for value in if_none_match.split(","))
+        return any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+    @staticmethod
+    def build(db: Session, test_id: int) -> Optional[StudentPayload]:
+        test = (
+            db.query(Test)
+            .options(selectinload(Test.questions))
+            .filter(Test.id == test_id)
+            .first()
+        )
+        if not test:
+            return None
+
+        response = TestForStudentResponse(
+            id=test.id,
+            title=test.title,
+            description=test.description,
+            duration_minutes=test.duration_minutes,
+            is_active=test.is_active,
+            created_at=test.created_at,
+            updated_at=test.updated_at,
+            questions=[
+                QuestionForStudent(
+                    id=q.id,
+                    question_text=q.question_text,
+                    question_type=q.question_type,
+                    options=q.options,
+                    points=q.points,
+                    order_number=q.order_number
+                )
+                for q in test.questions
+            ]
+        )
+        return StudentPayload(
+            test_id=test.id,
+            version=test.updated_at,
+            etag=TestPayloadService.make_etag(test.id, test.updated_at),
+            body=response.model_dump_json().encode(),
+        )
+
+    @staticmethod
+    def get_student_payload(db: Session, test_id: int) -> Optional[StudentPayload]:
+        # версия читается по первичному ключу на каждом запросе, поэтому кэш
+        # остается корректным и при нескольких процессах приложения
+        row = db.query(Test.updated_at, Test.archived_at).filter(Test.id == test_id).first()
+        if row is None or row.archived_at is not None:
+            return None
+        version = row.updated_at
+
+        payload = student_payload_cache.get(test_id, version)
+        if payload is None:
+            payload = TestPayloadService.build(db, test_id)
+            if payload is not None:
+                student_payload_cache.put(payload)
+        return payload
+
+    @staticmethod
+    def touch(test: Test) -> None:
+        # правка вопросов меняет версию теста, а с ней и ETag
+        test.updated_at = datetime.utcnow()
+
+    @staticmethod
+    def invalidate(test_id: int) -> None:
+        student_payload_cache.invalidate(test_id)
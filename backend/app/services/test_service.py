@@ -1,13 +1,26 @@
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from datetime import datetime
+from sqlalchemy import case, delete, func, insert, literal, select, update
+from sqlalchemy.orm import Session, selectinload
+from typing import List, Optional, Tuple
+from ..core.pagination import paginate
+from ..models.attempt import Attempt
 from ..models.test import Test
 from ..models.question import Question
-from ..schemas.test import TestCreate, TestUpdate
+from ..models.result import Result
+from ..models.result_answer import ResultAnswer
+from ..models.submission_receipt import SubmissionReceipt
+from ..models.test_statistics import TestStatistics
+from ..schemas.test import TestClone, TestCreate, TestUpdate
+from .answer_key import AnswerKeyService
+from .item_analysis import ItemAnalysisService
+from .statistics_service import StatisticsService
+from .test_payload import TestPayloadService
 
 class TestService:
     @staticmethod
     def create_test(db: Session, test_data: TestCreate, creator_id: int) -> Test:
         db_test = Test(**test_data.model_dump(), creator_id=creator_id)
+        db_test.statistics = TestStatistics(**StatisticsService.empty_summary())
         db.add(db_test)
         db.commit()
         db.refresh(db_test)
@@ -18,15 +31,47 @@ class TestService:
         return db.query(Test).filter(Test.id == test_id).first()
     
     @staticmethod
-    def get_tests(db: Session, skip: int = 0, limit: int = 100, active_only: bool = False) -> List[Test]:
-        query = db.query(Test)
+    def question_counts_subquery(db: Session):
+        return (
+            db.query(Question.test_id, func.count(Question.id).label("question_count"))
+            .group_by(Question.test_id)
+            .subquery()
+        )
+
+    @staticmethod
+    def get_tests(
+        db: Session, cursor: Optional[str] = None, limit: int = 100, active_only: bool = False, skip: int = 0
+    ) -> Tuple[List[Tuple[Test, int]], Optional[str]]:
+        counts = TestService.question_counts_subquery(db)
+        query = (
+            db.query(Test, func.coalesce(counts.c.question_count, 0))
+            .outerjoin(counts, counts.c.test_id == Test.id)
+        )
+        # архивные тесты в каталог не попадают
+        query = query.filter(Test.archived_at.is_(None))
         if active_only:
             query = query.filter(Test.is_active == True)
-        return query.offset(skip).limit(limit).all()
-    
+        return paginate(
+            query, Test.created_at, Test.id, cursor, limit,
+            key=lambda row: (row[0].created_at, row[0].id), skip=skip,
+        )
+
     @staticmethod
-    def get_teacher_tests(db: Session, teacher_id: int) -> List[Test]:
-        return db.query(Test).filter(Test.creator_id == teacher_id).all()
+    def get_teacher_tests(
+        db: Session, teacher_id: int, cursor: Optional[str] = None, limit: int = 100,
+        include_archived: bool = False, skip: int = 0
+    ) -> Tuple[List[Test], Optional[str]]:
+        query = (
+            db.query(Test)
+            .options(selectinload(Test.questions))
+            .filter(Test.creator_id == teacher_id)
+        )
+        if not include_archived:
+            query = query.filter(Test.archived_at.is_(None))
+        return paginate(
+            query, Test.created_at, Test.id, cursor, limit,
+            key=lambda test: (test.created_at, test.id), skip=skip,
+        )
     
     @staticmethod
     def update_test(db: Session, test_id: int, test_data: TestUpdate) -> Optional[Test]:
@@ -39,14 +84,123 @@ class TestService:
             setattr(db_test, field, value)
         
         db.commit()
+        AnswerKeyService.invalidate(test_id)
+        TestPayloadService.invalidate(test_id)
         db.refresh(db_test)
         return db_test
     
+    @staticmethod
+    def clone_test(db: Session, source: Test, clone_data: TestClone, creator_id: int) -> Test:
+        # копирование целиком в БД: INSERT ... SELECT для теста и вопросов, без загрузки вопросов в сессию
+        question_filter = [Question.test_id == source.id]
+        order_number = Question.order_number
+        if clone_data.question_ids is not None:
+            ids = clone_data.question_ids
+            if len(set(ids)) != len(ids):
+                raise ValueError("Duplicate question ids")
+            found = {
+                question_id for (question_id,) in
+                db.query(Question.id).filter(Question.test_id == source.id, Question.id.in_(ids))
+            }
+            missing = [question_id for question_id in ids if question_id not in found]
+            if missing:
+                raise ValueError(f"Questions not in this test: {missing}")
+            question_filter.append(Question.id.in_(ids))
+            if ids:
+                order_number = case({question_id: position for position, question_id in enumerate(ids)}, value=Question.id)
+
+        test_columns = ("title", "description", "creator_id", "duration_minutes", "is_active")
+        new_test_id = db.execute(
+            insert(Test)
+            .from_select(test_columns, select(
+                literal(clone_data.title) if clone_data.title else Test.title,
+                Test.description,
+                literal(creator_id),
+                Test.duration_minutes,
+                Test.is_active,
+            ).where(Test.id == source.id))
+            .returning(Test.id)
+        ).scalar_one()
+
+        question_columns = (
+            "test_id", "question_text", "question_type", "options", "correct_answers", "points", "order_number"
+        )
+        db.execute(
+            insert(Question).from_select(question_columns, select(
+                literal(new_test_id),
+                Question.question_text,
+                Question.question_type,
+                Question.options,
+                Question.correct_answers,
+                Question.points,
+                order_number,
+            ).where(*question_filter))
+        )
+        db.add(TestStatistics(test_id=new_test_id, **StatisticsService.empty_summary()))
+        db.commit()
+        return db.query(Test).filter(Test.id == new_test_id).first()
+
+    @staticmethod
+    def reorder_questions(db: Session, test: Test, question_ids: List[int]) -> List[Question]:
+        current = {question_id for (question_id,) in db.query(Question.id).filter(Question.test_id == test.id)}
+        if len(set(question_ids)) != len(question_ids):
+            raise ValueError("Duplicate question ids")
+        unknown = [question_id for question_id in question_ids if question_id not in current]
+        missing = sorted(current - set(question_ids))
+        if unknown or missing:
+            raise ValueError(
+                f"Order must list every question of the test exactly once (unknown: {unknown}, missing: {missing})"
+            )
+
+        if question_ids:
+            # один UPDATE ... SET order_number = CASE id WHEN ... END на весь тест
+            db.execute(
+                update(Question)
+                .where(Question.test_id == test.id)
+                .values(order_number=case(
+                    {question_id: position for position, question_id in enumerate(question_ids)},
+                    value=Question.id
+                ))
+                .execution_options(synchronize_session=False)
+            )
+        TestPayloadService.touch(test)
+        db.commit()
+        AnswerKeyService.invalidate(test.id)
+        TestPayloadService.invalidate(test.id)
+        return (
+            db.query(Question)
+            .filter(Question.test_id == test.id)
+            .order_by(Question.order_number, Question.id)
+            .all()
+        )
+
+    @staticmethod
+    def set_archived(db: Session, test: Test, archived: bool) -> Test:
+        # мгновенно для теста любого размера: меняется одна строка, результаты не трогаются
+        test.archived_at = (test.archived_at or datetime.utcnow()) if archived else None
+        db.commit()
+        TestPayloadService.invalidate(test.id)
+        db.refresh(test)
+        return test
+
     @staticmethod
     def delete_test(db: Session, test_id: int) -> bool:
-        db_test = db.query(Test).filter(Test.id == test_id).first()
-        if not db_test:
-            return False
-        db.delete(db_test)
+        # DELETE по множествам в порядке зависимостей, одна транзакция; строки в сессию не загружаются
+        result_ids = select(Result.id).where(Result.test_id == test_id)
+        for statement in (
+            delete(ResultAnswer).where(ResultAnswer.result_id.in_(result_ids)),
+            delete(SubmissionReceipt).where(SubmissionReceipt.result_id.in_(result_ids)),
+            delete(Attempt).where(Attempt.test_id == test_id),
+            delete(Result).where(Result.test_id == test_id),
+            delete(Question).where(Question.test_id == test_id),
+            delete(TestStatistics).where(TestStatistics.test_id == test_id),
+        ):
+            db.execute(statement.execution_options(synchronize_session=False))
+        deleted = db.execute(
+            delete(Test).where(Test.id == test_id).execution_options(synchronize_session=False)
+        ).rowcount
         db.commit()
-        return True
\ No newline at end of file
+        AnswerKeyService.invalidate(test_id)
+        TestPayloadService.invalidate(test_id)
+        ItemAnalysisService.invalidate(test_id)
+        return bool(deleted)
\ No newline at end of file
@@ -0,0 +1,105 @@
+"""Хранение ответов: строки вариантов против битовых масок индексов.
+
+Генерирует случайные отправки для теста из SINGLE/MULTIPLE вопросов и
+сравнивает размер JSON в Result.answers и время проверки одной отправки.
+База данных не нужна.
+
+    python -m benchmarks.answer_encoding --submissions 10000 --questions 40
+"""
+import argparse
+import json
+import random
+import time
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--submissions", type=int, default=10000)
+    parser.add_argument("--questions", type=int, default=40)
+    parser.add_argument("--options", type=int, default=5)
+    parser.add_argument("--option-length", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    from app.models.question import QuestionType
+    from app.services.answer_key import CompiledAnswerKey, CompiledQuestion
+
+    rng = random.Random(args.seed)
+
+    def option_text() -> str:
+        return "".join(rng.choice("абвгдежзиклмнопрстуфхцчшщэюя ") for _ in range(args.option_length))
+
+    questions = {}
+    for question_id in range(1, args.questions + 1):
+        question_type = QuestionType.SINGLE if question_id % 2 else QuestionType.MULTIPLE
+        options = tuple(option_text() for _ in range(args.options))
+        correct = rng.sample(options, 1 if question_type == QuestionType.SINGLE else 2)
+        questions[question_id] = CompiledQuestion(
+            question_id=question_id,
+            question_type=question_type,
+            points=1,
+            correct_answers=frozenset(correct),
+            options=options,
+            correct_mask=sum(1 << index for index, option in enumerate(options) if option in correct),
+        )
+    answer_key = CompiledAnswerKey(test_id=1, questions=questions, max_score=len(questions))
+
+    legacy = []
+    for _ in range(args.submissions):
+        answers = {}
+        for question in questions.values():
+            count = 1 if question.question_type == QuestionType.SINGLE else rng.randint(1, 3)
+            answers[str(question.question_id)] = rng.sample(question.options, count)
+        legacy.append(answers)
+    encoded = [
+        {question_id: questions[int(question_id)].encode(selected) for question_id, selected in answers.items()}
+        for answers in legacy
+    ]
+
+    def grade_legacy(answers) -> int:
+        # прежняя проверка: сравнение отсортированных списков строк
+        score = 0
+        for question in questions.values():
+            selected = sorted(str(answer) for answer in answers.get(str(question.question_id), []))
+            if selected == sorted(question.correct_answers):
+                score += question.points
+        return score
+
+    def grade_encoded(answers) -> int:
+        score = 0
+        for question in questions.values():
+            if answers.get(str(question.question_id), 0) == question.correct_mask:
+                score += question.points
+        return score
+
+    def timed(grade, submissions) -> tuple:
+        started = time.perf_counter()
+        scores = [grade(answers) for answers in submissions]
+        return time.perf_counter() - started, scores
+
+    legacy_time, legacy_scores = timed(grade_legacy, legacy)
+    encoded_time, encoded_scores = timed(grade_encoded, encoded)
+    assert legacy_scores == encoded_scores
+
+    legacy_bytes = sum(len(json.dumps(answers)) for answers in legacy)
+    encoded_bytes = sum(len(json.dumps(answers)) for answers in encoded)
+
+    print(json.dumps({
+        "submissions": args.submissions,
+        "questions": args.questions,
+        "answer_key_max_score": answer_key.max_score,
+        "storage_bytes_per_result": {
+            "strings": round(legacy_bytes / args.submissions),
+            "masks": round(encoded_bytes / args.submissions),
+            "ratio": round(legacy_bytes / encoded_bytes, 1),
+        },
+        "grading_us_per_result": {
+            "strings": round(legacy_time / args.submissions * 1e6, 2),
+            "masks": round(encoded_time / args.submissions * 1e6, 2),
+            "speedup": round(legacy_time / encoded_time, 1),
+        },
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
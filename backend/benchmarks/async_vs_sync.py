@@ -0,0 +1,120 @@
+"""Сравнение пропускной способности sync- и async-режима БД.
+
+Каждый режим запускается в отдельном процессе (режим выбирается при импорте
+app.core.database), приложение вызывается в процессе через httpx.ASGITransport.
+
+    python -m benchmarks.async_vs_sync --requests 2000 --concurrency 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def run_mode(args) -> dict:
+    import httpx
+    from app.main import app
+    from app.core.database import init_db
+
+    init_db()
+
+    async def scenario() -> dict:
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            async def register(email: str, role: str) -> dict:
+                await client.post("/api/auth/register", json={
+                    "email": email, "full_name": email, "role": role, "password": "benchmark"
+                })
+                response = await client.post("/api/auth/login", json={"email": email, "password": "benchmark"})
+                return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+            teacher = await register("teacher@bench.io", "teacher")
+            student = await register("student@bench.io", "student")
+
+            test_id = (await client.post("/api/tests", json={"title": "Benchmark"}, headers=teacher)).json()["id"]
+            question_ids = []
+            for number in range(args.questions):
+                response = await client.post("/api/questions", json={
+                    "test_id": test_id,
+                    "question_text": f"Question {number}",
+                    "question_type": "single",
+                    "options": ["a", "b", "c", "d"],
+                    "correct_answers": ["a"],
+                    "order_number": number,
+                }, headers=teacher)
+                question_ids.append(response.json()["id"])
+
+            semaphore = asyncio.Semaphore(args.concurrency)
+            answers = {question_id: ["a"] for question_id in question_ids}
+            latencies = []
+            errors = 0
+
+            async def one(index: int) -> None:
+                nonlocal errors
+                async with semaphore:
+                    started = time.perf_counter()
+                    if index % 2:
+                        response = await client.get(f"/api/tests/{test_id}", headers=student)
+                    else:
+                        response = await client.post("/api/results/submit", json={
+                            "test_id": test_id, "answers": answers
+                        }, headers=student)
+                    latencies.append(time.perf_counter() - started)
+                    if response.status_code >= 400:
+                        errors += 1
+
+            started = time.perf_counter()
+            await asyncio.gather(*(one(index) for index in range(args.requests)))
+            elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "errors": errors,
+            "elapsed_s": round(elapsed, 3),
+            "throughput_rps": round(args.requests / elapsed, 1),
+            "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+            "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2),
+        }
+
+    return asyncio.run(scenario())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--mode", choices=["sync", "async"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args)))
+        return
+
+    report = {}
+    for mode in ("sync", "async"):
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(
+                os.environ,
+                DATABASE_URL=f"sqlite:///{directory}/bench.db",
+                USE_ASYNC_DB="true" if mode == "async" else "false",
+            )
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.async_vs_sync", "--mode", mode,
+                 "--requests", str(args.requests), "--concurrency", str(args.concurrency),
+                 "--questions", str(args.questions)],
+                env=env, check=True, capture_output=True, text=True,
+            ).stdout
+            report[mode] = json.loads(output.strip().splitlines()[-1])
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
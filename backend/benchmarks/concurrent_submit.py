@@ -0,0 +1,198 @@
+"""Стресс-тест параллельной отправки результатов на SQLite.
+
+Сравнивает профиль по умолчанию (WAL, synchronous=NORMAL, busy_timeout,
+пул под пул потоков) с прежними настройками SQLAlchemy/SQLite. Каждый
+профиль запускается в отдельном процессе на свежей базе.
+
+Прогон проверяет, что прежние настройки воспроизводят ошибки
+"database is locked", а профиль по умолчанию проходит без них и сводка
+test_statistics совпадает с пересчетом по results; иначе код выхода 1.
+
+    python -m benchmarks.concurrent_submit --threads 40 --submits 25 --readers 4
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+PROFILES = {
+    # прежнее поведение: rollback journal, FULL, таймаут блокировки 5 с, пул 5 + 10
+    "legacy": {
+        "SQLITE_JOURNAL_MODE": "DELETE",
+        "SQLITE_SYNCHRONOUS": "FULL",
+        "SQLITE_BUSY_TIMEOUT_MS": "5000",
+        "SQLITE_CACHE_SIZE_KB": "2000",
+        "SQLITE_MMAP_SIZE": "0",
+        "DB_POOL_SIZE": "5",
+        "DB_MAX_OVERFLOW": "10",
+    },
+    "tuned": {},
+}
+
+
+def run_profile(args) -> dict:
+    from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
+    from app.core.database import SessionLocal, init_db
+    from app.models import question, result, test_statistics, user  # регистрация моделей
+    from app.models.question import Question, QuestionType
+    from app.models.result import Result
+    from app.models.test import Test
+    from app.models.user import User, UserRole
+    from app.schemas.result import TestSubmit
+    from app.services.export_service import ResultExportService
+    from app.services.result_service import ResultService
+    from app.services.statistics_service import StatisticsService
+
+    init_db()
+    db = SessionLocal()
+    teacher = User(email="teacher@bench.io", full_name="Teacher", hashed_password="-", role=UserRole.TEACHER)
+    students = [
+        User(email=f"student{index}@bench.io", full_name=f"Student {index}", hashed_password="-")
+        for index in range(args.threads)
+    ]
+    db.add_all([teacher, *students])
+    db.flush()
+    test = Test(title="Stress", creator_id=teacher.id)
+    db.add(test)
+    db.flush()
+    db.add_all([
+        Question(
+            test_id=test.id, question_text=f"Q{index}", question_type=QuestionType.SINGLE,
+            options=["a", "b", "c"], correct_answers=["a"], order_number=index,
+        )
+        for index in range(args.questions)
+    ])
+    db.commit()
+    test_id = test.id
+    student_ids = [student.id for student in students]
+    question_ids = [question_id for (question_id,) in db.query(Question.id).filter(Question.test_id == test_id)]
+    db.close()
+
+    submission = TestSubmit(test_id=test_id, answers={question_id: ["a"] for question_id in question_ids})
+
+    def worker(student_id: int) -> dict:
+        stats = {"ok": 0, "locked": 0, "pool_timeout": 0}
+        for _ in range(args.submits):
+            session = SessionLocal()
+            try:
+                ResultService.submit_test(session, student_id, submission)
+                stats["ok"] += 1
+            except OperationalError:
+                session.rollback()
+                stats["locked"] += 1
+            except PoolTimeoutError:
+                stats["pool_timeout"] += 1
+            finally:
+                session.close()
+        return stats
+
+    done = threading.Event()
+    reads = {"ok": 0, "locked": 0}
+
+    def reader() -> None:
+        # учитель параллельно выгружает результаты на медленный канал: в режиме rollback journal
+        # открытый курсор выгрузки держит SHARED-блокировку, и commit отправок ждет ее снятия
+        while not done.is_set():
+            session = SessionLocal()
+            try:
+                for index, _ in enumerate(ResultExportService.iter_rows(session, test_id, chunk_size=50)):
+                    if index % 50 == 0:
+                        time.sleep(args.download_pause_ms / 1000)
+                reads["ok"] += 1
+            except OperationalError:
+                reads["locked"] += 1
+            finally:
+                session.close()
+
+    readers = [threading.Thread(target=reader) for _ in range(args.readers)]
+    for thread in readers:
+        thread.start()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        outcomes = list(executor.map(worker, student_ids))
+    elapsed = time.perf_counter() - started
+
+    done.set()
+    for thread in readers:
+        thread.join()
+
+    totals = {key: sum(outcome[key] for outcome in outcomes) for key in ("ok", "locked", "pool_timeout")}
+    db = SessionLocal()
+    summary, = StatisticsService.rebuild_summaries(db, [test_id], check_only=True)
+    stored = db.query(Result.id).filter(Result.test_id == test_id).count()
+    db.close()
+    return {
+        "threads": args.threads,
+        "attempted": args.threads * args.submits,
+        **totals,
+        "elapsed_s": round(elapsed, 3),
+        "committed_per_s": round(totals["ok"] / elapsed, 1),
+        "reads_ok": reads["ok"],
+        "reads_locked": reads["locked"],
+        "results_stored": stored,
+        "summary_drift": summary["drift"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=40)
+    parser.add_argument("--submits", type=int, default=25)
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--download-pause-ms", type=float, default=200,
+                        help="пауза выгрузки на каждые 50 строк: медленный клиент")
+    parser.add_argument("--profile", choices=sorted(PROFILES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile:
+        print(json.dumps(run_profile(args)))
+        return
+
+    report = {}
+    for profile, overrides in PROFILES.items():
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(os.environ, DATABASE_URL=f"sqlite:///{directory}/stress.db", **overrides)
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.concurrent_submit", "--profile", profile,
+                 "--threads", str(args.threads), "--submits", str(args.submits),
+                 "--questions", str(args.questions), "--readers", str(args.readers),
+                 "--download-pause-ms", str(args.download_pause_ms)],
+                env=env, check=True, capture_output=True, text=True,
+            ).stdout
+            report[profile] = json.loads(output.strip().splitlines()[-1])
+
+    print(json.dumps(report, indent=2))
+
+    failures = check(report)
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+def check(report: dict) -> list:
+    legacy, tuned = report["legacy"], report["tuned"]
+    failures = []
+    if not legacy["locked"] + legacy["reads_locked"]:
+        failures.append("legacy profile did not reproduce 'database is locked'; raise --threads or --readers")
+    if tuned["locked"] or tuned["reads_locked"] or tuned["pool_timeout"]:
+        failures.append(
+            f"tuned profile: {tuned['locked']} locked submits, {tuned['reads_locked']} locked reads, "
+            f"{tuned['pool_timeout']} pool timeouts"
+        )
+    if tuned["results_stored"] != tuned["ok"]:
+        failures.append(f"tuned profile: {tuned['ok']} committed submits, {tuned['results_stored']} results stored")
+    if tuned["summary_drift"]:
+        failures.append(f"tuned profile: test_statistics drift in {tuned['summary_drift']}")
+    return failures
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""Нагрузочный прогон экзаменационного дня.
+
+Заполняет свежую базу SQLite учителями, тестами, вопросами, учениками и
+историей результатов (объемы задаются аргументами, данные детерминированы
+--seed), затем прогоняет приложение в процессе через httpx.ASGITransport по
+сценариям: массовый вход, загрузка тестов учениками, одновременная отправка
+результатов и опрос статистики учителями. Для каждого сценария выводятся
+пропускная способность, p50/p95/p99 и число SQL-запросов.
+
+Прогон выполняется в отдельном процессе, настройки приложения меняются через
+--env. Результат можно сохранить и сравнить с прошлым прогоном:
+
+    python -m benchmarks.exam_day --save baseline.json
+    python -m benchmarks.exam_day --env USE_ASYNC_DB=1 --baseline baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+SCENARIOS = ("login_storm", "test_fetch", "submit_burst", "statistics_polling")
+PASSWORD = "benchmark"
+COMPARED_METRICS = ("throughput_rps", "p50_ms", "p95_ms", "p99_ms", "sql_per_request")
+
+
+def seed(args) -> dict:
+    from datetime import datetime, timedelta
+    from sqlalchemy import insert
+    from app.core.database import SessionLocal, init_db
+    from app.core.passwords import get_password_hash
+    from app.models.question import Question, QuestionType
+    from app.models.test import Test
+    from app.models.user import User, UserRole
+    from app.services.result_service import ResultService
+
+    init_db()
+    rng = random.Random(args.seed)
+    # один хеш на всех: вход проверяет bcrypt так же, а заполнение не занимает минуты
+    hashed_password = get_password_hash(PASSWORD)
+    db = SessionLocal()
+
+    db.execute(insert(User), [
+        {"email": f"teacher{index}@bench.io", "full_name": f"Teacher {index}",
+         "hashed_password": hashed_password, "role": UserRole.TEACHER}
+        for index in range(args.teachers)
+    ] + [
+        {"email": f"student{index}@bench.io", "full_name": f"Student {index}",
+         "hashed_password": hashed_password, "role": UserRole.STUDENT}
+        for index in range(args.students)
+    ])
+    teachers = db.query(User.id, User.email).filter(User.role == UserRole.TEACHER).order_by(User.id).all()
+    students = db.query(User.id, User.email).filter(User.role == UserRole.STUDENT).order_by(User.id).all()
+
+    db.execute(insert(Test), [
+        {"title": f"Exam {teacher_id}.{index}", "creator_id": teacher_id, "duration_minutes": 60, "is_active": True}
+        for teacher_id, _ in teachers
+        for index in range(args.tests_per_teacher)
+    ])
+    tests = db.query(Test.id, Test.creator_id).order_by(Test.id).all()
+
+    options = ["a", "b", "c", "d"]
+    db.execute(insert(Question), [
+        {"test_id": test_id, "question_text": f"Question {number}",
+         "question_type": QuestionType.MULTIPLE if number % 5 == 0 else QuestionType.SINGLE,
+         "options": options, "correct_answers": ["a", "b"] if number % 5 == 0 else ["a"],
+         "points": 1, "order_number": number}
+        for test_id, _ in tests
+        for number in range(args.questions)
+    ])
+    question_ids = {test_id: [] for test_id, _ in tests}
+    for question_id, test_id in db.query(Question.id, Question.test_id).order_by(Question.id):
+        question_ids[test_id].append(question_id)
+    db.commit()
+
+    def random_answers(test_id: int) -> dict:
+        return {question_id: [rng.choice(options)] for question_id in question_ids[test_id]}
+
+    started = datetime.utcnow() - timedelta(days=30)
+    for test_id, _ in tests:
+        rows = [
+            ResultService.build_row(
+                db, test_id, rng.choice(students)[0], random_answers(test_id),
+                rng.randint(5, 60), started + timedelta(minutes=index),
+            )
+            for index in range(args.results_per_test)
+        ]
+        if rows:
+            ResultService.insert_results(db, rows)
+            db.commit()
+    users = db.query(User).order_by(User.id).all()
+    db.close()
+
+    return {
+        "teachers": [user for user in users if user.role == UserRole.TEACHER],
+        "students": [user for user in users if user.role == UserRole.STUDENT],
+        "tests": tests,
+        "question_ids": question_ids,
+        "random_answers": random_answers,
+        "rng": rng,
+    }
+
+
+def summarize(latencies: list, statuses: list, elapsed: float, statements: int, db_seconds: float) -> dict:
+    latencies = sorted(latencies)
+
+    def quantile(q: float):
+        if not latencies:
+            return None
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000, 2)
+
+    errors = {}
+    for code in statuses:
+        if code >= 400:
+            errors[str(code)] = errors.get(str(code), 0) + 1
+    return {
+        "requests": len(latencies),
+        "ok": sum(1 for code in statuses if code < 400),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "p50_ms": quantile(0.5),
+        "p95_ms": quantile(0.95),
+        "p99_ms": quantile(0.99),
+        "sql_statements": statements,
+        "sql_per_request": round(statements / len(latencies), 2) if latencies else None,
+        "sql_ms": round(db_seconds * 1000, 1),
+    }
+
+
+def run_suite(args) -> dict:
+    import httpx
+    from app.main import app
+    from app.core.metrics import metrics_registry
+    from app.core.security import create_access_token, token_claims
+
+    seed_started = time.perf_counter()
+    data = seed(args)
+    seed_elapsed = time.perf_counter() - seed_started
+    rng = data["rng"]
+
+    def bearer(user) -> dict:
+        return {"Authorization": f"Bearer {create_access_token(token_claims(user))}"}
+
+    students = [bearer(user) for user in data["students"]]
+    teachers = {user.id: bearer(user) for user in data["teachers"]}
+    tests = data["tests"]
+
+    def requests_for(scenario: str) -> list:
+        # (method, url, json, headers); порядок и данные зависят только от --seed
+        if scenario == "login_storm":
+            return [
+                ("POST", "/api/auth/login", {"email": user.email, "password": PASSWORD}, None)
+                for user in data["students"][:args.logins]
+            ]
+        if scenario == "test_fetch":
+            return [
+                ("GET", f"/api/tests/{rng.choice(tests)[0]}", None, rng.choice(students))
+                for _ in range(args.fetches)
+            ]
+        if scenario == "submit_burst":
+            # к дедлайну: все отправки по одному тесту в один момент
+            test_id = tests[0][0]
+            return [
+                ("POST", "/api/results/submit",
+                 {"test_id": test_id, "answers": data["random_answers"](test_id)},
+                 students[index % len(students)])
+                for index in range(args.submits)
+            ]
+        return [
+            ("GET", f"/api/results/statistics/{test_id}", None, teachers[creator_id])
+            for test_id, creator_id in (rng.choice(tests) for _ in range(args.polls))
+        ]
+
+    async def drive() -> dict:
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            report = {}
+            for scenario in args.scenarios:
+                requests = requests_for(scenario)
+                semaphore = asyncio.Semaphore(args.concurrency)
+                latencies, statuses = [], []
+
+                async def one(method, url, body, headers) -> None:
+                    async with semaphore:
+                        started = time.perf_counter()
+                        response = await client.request(method, url, json=body, headers=headers)
+                        latencies.append(time.perf_counter() - started)
+                        statuses.append(response.status_code)
+
+                statements, db_seconds = metrics_registry.db_totals()
+                started = time.perf_counter()
+                await asyncio.gather(*(one(*request) for request in requests))
+                elapsed = time.perf_counter() - started
+                after_statements, after_db_seconds = metrics_registry.db_totals()
+                report[scenario] = summarize(
+                    latencies, statuses, elapsed, after_statements - statements, after_db_seconds - db_seconds
+                )
+            return report
+
+    return {
+        "seed_s": round(seed_elapsed, 3),
+        "scenarios": asyncio.run(drive()),
+    }
+
+
+def compare(current: dict, baseline: dict) -> dict:
+    diff = {}
+    for scenario, metrics in current["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(scenario)
+        if not previous:
+            continue
+        diff[scenario] = {}
+        for metric in COMPARED_METRICS:
+            before, after = previous.get(metric), metrics.get(metric)
+            if before is None or after is None:
+                continue
+            diff[scenario][metric] = {
+                "baseline": before,
+                "current": after,
+                "change_pct": round((after - before) / before * 100, 1) if before else None,
+            }
+    return diff
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--teachers", type=int, default=5)
+    parser.add_argument("--tests-per-teacher", type=int, default=4)
+    parser.add_argument("--questions", type=int, default=30)
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--results-per-test", type=int, default=500)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--fetches", type=int, default=2000)
+    parser.add_argument("--submits", type=int, default=1000)
+    parser.add_argument("--polls", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="настройка приложения для прогона, например USE_ASYNC_DB=1")
+    parser.add_argument("--save", help="сохранить результат в JSON")
+    parser.add_argument("--baseline", help="сравнить с сохраненным результатом")
+    parser.add_argument("--run", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_suite(args)))
+        return
+
+    overrides = dict(item.split("=", 1) for item in args.env)
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{directory}/exam_day.db",
+                   SUBMISSION_QUEUE_PATH=f"{directory}/queue.db", SLOW_REQUEST_MS="0", **overrides)
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.exam_day", "--run", *sys.argv[1:]],
+            env=env, check=True, capture_output=True, text=True,
+        ).stdout
+    report = json.loads(output.strip().splitlines()[-1])
+    report["config"] = {
+        key: value for key, value in vars(args).items() if key not in ("run", "save", "baseline")
+    }
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(report, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            report["baseline_diff"] = compare(report, json.load(file))
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
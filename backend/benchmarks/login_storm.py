@@ -0,0 +1,104 @@
+"""Задержка обычных запросов во время массового входа.
+
+Сравнивает хеширование bcrypt в пуле потоков обработчиков (прежнее
+поведение) с выделенным пулом процессов и лимитом одновременных входов.
+Каждый профиль запускается в отдельном процессе на свежей базе.
+
+    python -m benchmarks.login_storm --logins 300 --reads 600
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+PROFILES = {
+    "inline": {"PASSWORD_HASH_WORKERS": "0", "LOGIN_CONCURRENCY": "100000"},
+    "pool": {},
+}
+
+
+def run_profile(args) -> dict:
+    import httpx
+    from app.main import app
+    from app.core.database import init_db
+
+    init_db()
+
+    async def scenario() -> dict:
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            await client.post("/api/auth/register", json={
+                "email": "teacher@bench.io", "full_name": "Teacher", "role": "teacher", "password": "benchmark"
+            })
+            response = await client.post("/api/auth/login", json={"email": "teacher@bench.io", "password": "benchmark"})
+            teacher = {"Authorization": f"Bearer {response.json()['access_token']}"}
+            test_id = (await client.post("/api/tests", json={"title": "Benchmark"}, headers=teacher)).json()["id"]
+
+            async def read() -> float:
+                started = time.perf_counter()
+                await client.get(f"/api/tests/{test_id}", headers=teacher)
+                return time.perf_counter() - started
+
+            baseline = sorted(await asyncio.gather(*(read() for _ in range(args.reads))))
+
+            login_statuses = []
+
+            async def login() -> None:
+                response = await client.post("/api/auth/login", json={
+                    "email": "teacher@bench.io", "password": "benchmark"
+                })
+                login_statuses.append(response.status_code)
+
+            started = time.perf_counter()
+            logins = asyncio.gather(*(login() for _ in range(args.logins)))
+            await asyncio.sleep(0.05)
+            during = sorted(await asyncio.gather(*(read() for _ in range(args.reads))))
+            await logins
+            elapsed = time.perf_counter() - started
+
+        def p99(latencies):
+            return round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2)
+
+        return {
+            "logins": args.logins,
+            "logins_ok": login_statuses.count(200),
+            "logins_rejected": login_statuses.count(503),
+            "storm_elapsed_s": round(elapsed, 3),
+            "read_p99_idle_ms": p99(baseline),
+            "read_p99_storm_ms": p99(during),
+        }
+
+    return asyncio.run(scenario())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=300)
+    parser.add_argument("--reads", type=int, default=600)
+    parser.add_argument("--profile", choices=sorted(PROFILES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile:
+        print(json.dumps(run_profile(args)))
+        return
+
+    report = {}
+    for profile, overrides in PROFILES.items():
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(os.environ, DATABASE_URL=f"sqlite:///{directory}/bench.db", **overrides)
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.login_storm", "--profile", profile,
+                 "--logins", str(args.logins), "--reads", str(args.reads)],
+                env=env, check=True, capture_output=True, text=True,
+            ).stdout
+            report[profile] = json.loads(output.strip().splitlines()[-1])
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Сериализация списков результатов: стандартный путь против FAST_JSON_RESPONSES.
+
+Заполняет базу заданным числом строк Result и замеряет полный ответ
+/api/results/test/{id} и /api/results/my одной страницей. Профили
+запускаются в отдельных процессах (режим выбирается при импорте приложения).
+
+    python -m benchmarks.serialization --rows 10000 --repeat 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+PROFILES = {
+    "default": {"FAST_JSON_RESPONSES": "false"},
+    "fast": {"FAST_JSON_RESPONSES": "true"},
+}
+
+
+def run_profile(args) -> dict:
+    from fastapi.testclient import TestClient
+    from sqlalchemy import insert
+    from app.main import app
+    from app.core.database import SessionLocal, init_db
+    from app.core.security import create_access_token, token_claims
+    from app.models.question import Question, QuestionType
+    from app.models.result import Result
+    from app.models.test import Test
+    from app.models.user import User, UserRole
+
+    init_db()
+    db = SessionLocal()
+    teacher = User(email="teacher@bench.io", full_name="Teacher", hashed_password="-", role=UserRole.TEACHER)
+    student = User(email="student@bench.io", full_name="Student", hashed_password="-")
+    db.add_all([teacher, student])
+    db.flush()
+    test = Test(title="Serialization", creator_id=teacher.id)
+    db.add(test)
+    db.flush()
+    questions = [
+        Question(
+            test_id=test.id, question_text=f"Q{index}", question_type=QuestionType.MULTIPLE,
+            options=["a", "b", "c", "d"], correct_answers=["a", "b"], order_number=index,
+        )
+        for index in range(args.questions)
+    ]
+    db.add_all(questions)
+    db.flush()
+    started_at = datetime.utcnow()
+    db.execute(insert(Result), [
+        {
+            "test_id": test.id,
+            "user_id": student.id,
+            "score": index % args.questions,
+            "max_score": args.questions,
+            "percentage": round((index % args.questions) / args.questions * 100, 2),
+            "answers": {str(question.id): ["a", "b"] for question in questions},
+            "time_spent_minutes": 30,
+            "completed_at": started_at + timedelta(seconds=index),
+        }
+        for index in range(args.rows)
+    ])
+    db.commit()
+    headers = {
+        "teacher": {"Authorization": f"Bearer {create_access_token(token_claims(teacher))}"},
+        "student": {"Authorization": f"Bearer {create_access_token(token_claims(student))}"},
+    }
+    test_id = test.id
+    db.close()
+
+    report = {"rows": args.rows}
+    with TestClient(app) as client:
+        for name, url, role in (
+            ("test_results", f"/api/results/test/{test_id}", "teacher"),
+            ("my_results", "/api/results/my", "student"),
+        ):
+            timings = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                response = client.get(url, params={"limit": args.rows}, headers=headers[role])
+                timings.append(time.perf_counter() - started)
+                assert response.status_code == 200 and len(response.json()) == args.rows, response.text[:200]
+            report[f"{name}_median_ms"] = round(statistics.median(timings) * 1000, 1)
+            report[f"{name}_bytes"] = len(response.content)
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--profile", choices=sorted(PROFILES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile:
+        print(json.dumps(run_profile(args)))
+        return
+
+    report = {}
+    for profile, overrides in PROFILES.items():
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(os.environ, DATABASE_URL=f"sqlite:///{directory}/bench.db", **overrides)
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.serialization", "--profile", profile,
+                 "--rows", str(args.rows), "--questions", str(args.questions), "--repeat", str(args.repeat)],
+                env=env, check=True, capture_output=True, text=True,
+            ).stdout
+            report[profile] = json.loads(output.strip().splitlines()[-1])
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Задержка подтверждения при одновременной отправке к дедлайну экзамена.
+
+Сравнивает синхронный /results/submit (оценка, commit и refresh в запросе)
+с приемом через журнал /results/submissions и фоновой записью пачками.
+Для очереди дополнительно измеряется время, за которое worker записал все
+результаты в основную базу. Клиент работает в том же процессе и цикле
+событий, что и приложение, поэтому абсолютные задержки завышены одинаково
+для обоих профилей. Каждый профиль запускается в отдельном процессе на
+свежей базе.
+
+    python -m benchmarks.submission_queue --submits 5000 --questions 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+PROFILES = {
+    "sync": {"SUBMISSION_QUEUE_ENABLED": "0"},
+    "queued": {"SUBMISSION_QUEUE_ENABLED": "1"},
+}
+
+
+def run_profile(args) -> dict:
+    import httpx
+    from app.main import app
+    from app.core.config import settings
+    from app.core.database import SessionLocal, init_db
+    from app.core.security import create_access_token, token_claims
+    from app.models.question import Question, QuestionType
+    from app.models.result import Result
+    from app.models.test import Test
+    from app.models.user import User, UserRole
+    from app.services.submission_queue import SubmissionQueueService
+
+    init_db()
+    db = SessionLocal()
+    teacher = User(email="teacher@bench.io", full_name="Teacher", hashed_password="-", role=UserRole.TEACHER)
+    students = [
+        User(email=f"student{index}@bench.io", full_name=f"Student {index}", hashed_password="-")
+        for index in range(args.students)
+    ]
+    db.add_all([teacher, *students])
+    db.flush()
+    test = Test(title="Deadline", creator_id=teacher.id)
+    db.add(test)
+    db.flush()
+    db.add_all([
+        Question(
+            test_id=test.id, question_text=f"Q{index}", question_type=QuestionType.SINGLE,
+            options=["a", "b", "c"], correct_answers=["a"], order_number=index,
+        )
+        for index in range(args.questions)
+    ])
+    db.commit()
+    test_id = test.id
+    tokens = [
+        {"Authorization": f"Bearer {create_access_token(token_claims(student))}"} for student in students
+    ]
+    question_ids = [question_id for (question_id,) in db.query(Question.id).filter(Question.test_id == test_id)]
+    db.close()
+
+    body = {"test_id": test_id, "answers": {str(question_id): ["a"] for question_id in question_ids}}
+    url = "/api/results/submissions" if settings.SUBMISSION_QUEUE_ENABLED else "/api/results/submit"
+    if settings.SUBMISSION_QUEUE_ENABLED:
+        SubmissionQueueService.start()
+
+    async def scenario() -> dict:
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            statuses = []
+
+            async def submit(index: int) -> float:
+                started = time.perf_counter()
+                response = await client.post(url, json=body, headers=tokens[index % len(tokens)])
+                statuses.append(response.status_code)
+                return time.perf_counter() - started
+
+            started = time.perf_counter()
+            latencies = sorted(await asyncio.gather(*(submit(index) for index in range(args.submits))))
+            return {"latencies": latencies, "statuses": statuses, "acked_s": time.perf_counter() - started}
+
+    started = time.perf_counter()
+    outcome = asyncio.run(scenario())
+
+    # для очереди ждем, пока worker запишет все принятые отправки
+    while True:
+        db = SessionLocal()
+        stored = db.query(Result.id).filter(Result.test_id == test_id).count()
+        db.close()
+        if stored >= args.submits or not settings.SUBMISSION_QUEUE_ENABLED:
+            break
+        time.sleep(0.05)
+    persisted = time.perf_counter() - started
+    SubmissionQueueService.stop()
+
+    latencies = outcome["latencies"]
+
+    def quantile(q: float) -> float:
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000, 2)
+
+    return {
+        "submits": args.submits,
+        "accepted": sum(1 for code in outcome["statuses"] if code in (200, 202)),
+        "ack_p50_ms": quantile(0.5),
+        "ack_p99_ms": quantile(0.99),
+        "ack_max_ms": round(latencies[-1] * 1000, 2),
+        "all_acked_s": round(outcome["acked_s"], 3),
+        "all_persisted_s": round(persisted, 3),
+        "stored": stored,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--submits", type=int, default=5000)
+    parser.add_argument("--students", type=int, default=500)
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--profile", choices=sorted(PROFILES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile:
+        print(json.dumps(run_profile(args)))
+        return
+
+    report = {}
+    for profile, overrides in PROFILES.items():
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(
+                os.environ,
+                DATABASE_URL=f"sqlite:///{directory}/bench.db",
+                SUBMISSION_QUEUE_PATH=f"{directory}/queue.db",
+                **overrides,
+            )
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.submission_queue", "--profile", profile,
+                 "--submits", str(args.submits), "--students", str(args.students),
+                 "--questions", str(args.questions)],
+                env=env, check=True, capture_output=True, text=True,
+            ).stdout
+            report[profile] = json.loads(output.strip().splitlines()[-1])
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
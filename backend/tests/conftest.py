@@ -0,0 +1,75 @@
+import os
+import sys
+import tempfile
+
+# настройки читаются при импорте app: отдельная база SQLite на прогон
+DATA_DIR = tempfile.mkdtemp(prefix="testing-system-")
+os.environ["DATABASE_URL"] = f"sqlite:///{DATA_DIR}/test.db"
+os.environ["SUBMISSION_QUEUE_PATH"] = f"{DATA_DIR}/queue.db"
+os.environ.setdefault("PASSWORD_HASH_WORKERS", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi.testclient import TestClient
+from app.core.database import SessionLocal, init_db
+from app.core.security import create_access_token, token_claims
+from app.main import app
+from app.models.question import Question, QuestionType
+from app.models.test import Test
+from app.models.user import User, UserRole
+from app.services.statistics_service import StatisticsService
+from app.models.test_statistics import TestStatistics
+
+init_db()
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def create_user(db, role: UserRole) -> User:
+    count = db.query(User).count()
+    user = User(email=f"{role.value}{count}@example.com", full_name=f"{role.value} {count}",
+                hashed_password="-", role=role)
+    db.add(user)
+    db.commit()
+    return user
+
+
+def auth_headers(user: User) -> dict:
+    return {"Authorization": f"Bearer {create_access_token(token_claims(user))}"}
+
+
+def create_test(db, creator: User, questions: int = 3) -> Test:
+    test = Test(title="Test", creator_id=creator.id, duration_minutes=30, is_active=True)
+    test.statistics = TestStatistics(**StatisticsService.empty_summary())
+    db.add(test)
+    db.flush()
+    for number in range(questions):
+        db.add(Question(
+            test_id=test.id, question_text=f"Question {number}", question_type=QuestionType.SINGLE,
+            options=["a", "b", "c"], correct_answers=["a"], points=1, order_number=number,
+        ))
+    db.commit()
+    return test
+
+
+@pytest.fixture
+def teacher(db) -> User:
+    return create_user(db, UserRole.TEACHER)
+
+
+@pytest.fixture
+def student(db) -> User:
+    return create_user(db, UserRole.STUDENT)
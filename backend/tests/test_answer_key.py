@@ -0,0 +1,62 @@
+from datetime import timedelta
+from app.core.database import SessionLocal
+from app.models.question import Question
+from app.models.test import Test
+from app.schemas.result import TestSubmit
+from app.services.answer_key import SESSION_KEYS, AnswerKeyService, answer_key_cache
+from app.services.result_service import ResultService
+from app.services.test_payload import TestPayloadService
+from conftest import create_test
+
+
+def test_key_from_before_an_edit_is_not_used(db, teacher):
+    test = create_test(db, teacher, questions=1)
+    stale = AnswerKeyService.get_answer_key(db, test.id)
+    db.commit()
+
+    # правка в другом процессе: локальный кэш не сброшен, меняется только версия теста
+    other = SessionLocal()
+    try:
+        question = other.query(Question).filter(Question.test_id == test.id).one()
+        question.options = ["c", "b", "a"]
+        TestPayloadService.touch(other.get(Test, test.id))
+        other.commit()
+    finally:
+        other.close()
+
+    assert answer_key_cache.get(test.id, stale.version) is stale
+    fresh = AnswerKeyService.get_answer_key(db, test.id)
+    assert fresh.version > stale.version
+    assert next(iter(fresh.questions.values())).options == ("c", "b", "a")
+
+
+def test_late_compile_does_not_replace_newer_key(db, teacher):
+    test = create_test(db, teacher, questions=1)
+    current = AnswerKeyService.get_answer_key(db, test.id)
+
+    # сборка, начатая до правки, заканчивается после нее
+    answer_key_cache.put(current._replace(version=current.version - timedelta(seconds=1)))
+
+    assert answer_key_cache.get(test.id, current.version) is current
+
+
+def test_submission_encoded_with_stale_key_is_redone(db, teacher, student):
+    test = create_test(db, teacher, questions=1)
+    stale = AnswerKeyService.get_answer_key(db, test.id)
+    db.commit()
+    question_id = next(iter(stale.questions))
+
+    other = SessionLocal()
+    try:
+        other.get(Question, question_id).options = ["c", "b", "a"]
+        TestPayloadService.touch(other.get(Test, test.id))
+        other.commit()
+    finally:
+        other.close()
+
+    # процесс, прочитавший ключ до правки: "a" для него — бит 0, в новом порядке — бит 2
+    db.info[SESSION_KEYS] = {test.id: stale}
+    result = ResultService.submit_test(db, student.id, TestSubmit(test_id=test.id, answers={question_id: ["a"]}))
+
+    assert result.answers == {str(question_id): 1 << 2}
+    assert result.score == 1
@@ -0,0 +1,105 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import pytest
+from app.core.database import SessionLocal
+from app.models.attempt import Attempt
+from app.models.question import Question
+from app.schemas.result import TestSubmit
+from app.services.attempt_service import AttemptService
+from app.services.errors import ConflictError
+from app.services.result_service import ResultService
+from conftest import create_test
+
+
+def question_ids(db, test):
+    return [question_id for (question_id,) in db.query(Question.id).filter(Question.test_id == test.id)]
+
+
+def test_concurrent_saves_keep_every_answer(db, teacher, student):
+    test = create_test(db, teacher, questions=12)
+    attempt = AttemptService.start_attempt(db, student.id, test.id)
+    ids = question_ids(db, test)
+
+    def save(question_id: int) -> None:
+        session = SessionLocal()
+        try:
+            AttemptService.save_answers(session, attempt.id, student.id, {question_id: ["a"]})
+        finally:
+            session.close()
+
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        list(executor.map(save, ids))
+
+    db.expire_all()
+    assert set(db.get(Attempt, attempt.id).answers) == {str(question_id) for question_id in ids}
+
+
+def test_save_after_finalize_is_rejected(db, teacher, student):
+    test = create_test(db, teacher)
+    attempt = AttemptService.start_attempt(db, student.id, test.id)
+    stale = SessionLocal()
+    try:
+        stale_attempt = AttemptService.get_own_attempt(stale, attempt.id, student.id)
+        AttemptService.finalize_attempt(db, attempt.id, student.id)
+
+        # сессия прочитала попытку до завершения: запись не должна пройти молча
+        with pytest.raises(ConflictError):
+            AttemptService.save_answers(stale, stale_attempt.id, student.id, {question_ids(db, test)[0]: ["a"]})
+    finally:
+        stale.close()
+
+
+def test_submit_time_comes_from_attempt(db, teacher, student):
+    test = create_test(db, teacher)
+    assert ResultService.submit_test(db, student.id, TestSubmit(test_id=test.id)).time_spent_minutes is None
+
+    attempt = AttemptService.start_attempt(db, student.id, test.id)
+    attempt.started_at = datetime.utcnow() - timedelta(minutes=6, seconds=30)
+    db.commit()
+    submission = TestSubmit.model_validate({"test_id": test.id, "time_spent_minutes": 1})
+    assert ResultService.submit_test(db, student.id, submission).time_spent_minutes == 7
+
+
+def test_submit_closes_the_open_attempt(db, teacher, student):
+    test = create_test(db, teacher)
+    attempt = AttemptService.start_attempt(db, student.id, test.id)
+
+    result = ResultService.submit_test(db, student.id, TestSubmit(test_id=test.id))
+
+    db.refresh(attempt)
+    assert attempt.submitted_at is not None
+    assert attempt.result_id == result.id
+    # finalize после отправки возвращает тот же результат, второго не создает
+    assert AttemptService.finalize_attempt(db, attempt.id, student.id).id == result.id
+
+
+def test_submit_after_deadline_is_rejected(db, teacher, student):
+    test = create_test(db, teacher)
+    attempt = AttemptService.start_attempt(db, student.id, test.id)
+    attempt.deadline_at = datetime.utcnow() - timedelta(minutes=5)
+    db.commit()
+
+    with pytest.raises(ConflictError, match="Time is over"):
+        ResultService.submit_test(db, student.id, TestSubmit(test_id=test.id))
+    # сохраненные до дедлайна ответы по-прежнему оцениваются через finalize
+    assert AttemptService.finalize_attempt(db, attempt.id, student.id).test_id == test.id
+
+
+def test_batch_rejects_late_and_duplicate_submissions(db, teacher, student):
+    from app.core.security import CurrentUser
+    from app.schemas.result import BatchSubmitItem
+
+    late_test, open_test = create_test(db, teacher), create_test(db, teacher)
+    late = AttemptService.start_attempt(db, student.id, late_test.id)
+    late.deadline_at = datetime.utcnow() - timedelta(minutes=5)
+    AttemptService.start_attempt(db, student.id, open_test.id)
+    db.commit()
+    submitter = CurrentUser(student.id, student.email, student.full_name, student.role)
+
+    outcomes = ResultService.submit_batch(db, submitter, [
+        BatchSubmitItem(test_id=late_test.id),
+        BatchSubmitItem(test_id=open_test.id),
+        BatchSubmitItem(test_id=open_test.id),
+    ])
+
+    assert [outcome["error"] for outcome in outcomes] == ["Time is over", None, "Attempt already submitted"]
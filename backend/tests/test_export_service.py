@@ -0,0 +1,22 @@
+from app.services.export_service import ResultExportService
+
+
+def rows(count: int):
+    for index in range(count):
+        yield (index, 1, "Student", "s@example.com", 1.0, 2.0, 50.0, True, 5, "2026-01-01T00:00:00")
+
+
+def test_ndjson_yields_first_row_before_filling_a_chunk():
+    chunks = ResultExportService.iter_ndjson(rows(25), chunk_size=10)
+
+    assert next(chunks).count("\n") == 1
+    assert [chunk.count("\n") for chunk in chunks] == [10, 10, 4]
+
+
+def test_csv_yields_header_and_first_row_immediately():
+    chunks = list(ResultExportService.iter_csv(rows(25), chunk_size=10))
+
+    assert chunks[0].startswith("result_id,")
+    assert chunks[1].count("\n") == 1
+    assert sum(chunk.count("\n") for chunk in chunks) == 26
+    assert [chunk.count("\n") for chunk in chunks[2:]] == [10, 10, 4]
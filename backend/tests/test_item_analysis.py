@@ -0,0 +1,25 @@
+from types import SimpleNamespace
+from app.services.item_analysis import ItemAnalysisService
+
+
+def test_selection_matrix_reads_masks_and_option_lists():
+    questions = [
+        SimpleNamespace(id=1, options=["a", "b", "c"], correct_answers=["a"]),
+        SimpleNamespace(id=2, options=["x", "y"], correct_answers=["y"]),
+    ]
+    layout = ItemAnalysisService.build_layout(questions)
+    answers = [
+        {"1": 0b101, "2": 0b10},
+        {"2": ["x", "z"]},
+        {},
+    ]
+
+    selected, answered, foreign = ItemAnalysisService.selection_matrix(layout, answers)
+
+    assert selected.tolist() == [
+        [True, False, True, False, True],
+        [False, False, False, True, False],
+        [False, False, False, False, False],
+    ]
+    assert answered.tolist() == [[True, True], [False, True], [False, False]]
+    assert foreign.tolist() == [[False, False], [False, True], [False, False]]
@@ -0,0 +1,26 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from app.core.database import engine
+from app.core.metrics import metrics_registry
+
+
+def test_failed_statement_is_counted_once(db):
+    statements, _ = metrics_registry.db_totals()
+
+    with pytest.raises(OperationalError):
+        db.execute(text("SELECT * FROM missing_table"))
+    db.rollback()
+    db.execute(text("SELECT 1"))
+
+    after, _ = metrics_registry.db_totals()
+    assert after - statements == 2
+
+
+def test_failed_statement_leaves_no_connection_state(db):
+    with pytest.raises(OperationalError):
+        db.execute(text("SELECT * FROM missing_table"))
+    db.rollback()
+
+    with engine.connect() as connection:
+        assert "query_started" not in connection.info
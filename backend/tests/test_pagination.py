@@ -0,0 +1,26 @@
+from conftest import auth_headers, create_test
+
+
+def test_limit_is_bounded(client, db, teacher):
+    headers = auth_headers(teacher)
+    assert client.get("/api/tests/my", params={"limit": 0}, headers=headers).status_code == 422
+    assert client.get("/api/tests/my", params={"limit": 501}, headers=headers).status_code == 422
+
+
+def test_cursor_and_skip_walk_the_same_rows(client, db, teacher):
+    created = [create_test(db, teacher).id for _ in range(5)]
+    headers = auth_headers(teacher)
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/api/tests/my", params=params, headers=headers)
+        seen.extend(test["id"] for test in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert seen == created
+
+    skipped = client.get("/api/tests/my", params={"skip": 3, "limit": 2}, headers=headers).json()
+    assert [test["id"] for test in skipped] == created[3:]
+
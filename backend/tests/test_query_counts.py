@@ -0,0 +1,64 @@
+from contextlib import contextmanager
+from sqlalchemy import event
+from app.core.database import engine
+from app.models.question import Question
+from app.models.user import UserRole
+from app.schemas.result import TestSubmit
+from app.services.result_service import ResultService
+from conftest import auth_headers, create_test, create_user
+
+MAX_STATEMENTS_PER_LIST = 4
+
+
+@contextmanager
+def count_statements():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+def seed(db, tests: int, questions: int, results_per_test: int = 3):
+    teacher = create_user(db, UserRole.TEACHER)
+    student = create_user(db, UserRole.STUDENT)
+    created = [create_test(db, teacher, questions) for _ in range(tests)]
+    for test in created:
+        question_ids = [question_id for (question_id,) in db.query(Question.id).filter(Question.test_id == test.id)]
+        submission = TestSubmit(test_id=test.id, answers={question_id: ["a"] for question_id in question_ids})
+        for _ in range(results_per_test):
+            ResultService.submit_test(db, student.id, submission)
+    return teacher, student, created[0]
+
+
+def list_endpoint_counts(client, teacher, student, test) -> dict:
+    # заголовки и id считаются заранее: обновление истекших объектов сессии теста не в счет;
+    # один токен на пользователя, чтобы попадания в кэш токенов не зависели от секунды выпуска
+    student_headers, teacher_headers = auth_headers(student), auth_headers(teacher)
+    requests = {
+        "/api/tests": student_headers,
+        "/api/tests/my": teacher_headers,
+        "/api/results/my": student_headers,
+        "/api/results/test/{test_id}": teacher_headers,
+    }
+    test_id = test.id
+    counts = {}
+    for route, headers in requests.items():
+        with count_statements() as statements:
+            response = client.get(route.format(test_id=test_id), headers=headers)
+        assert response.status_code == 200, response.text
+        counts[route] = len(statements)
+    return counts
+
+
+def test_list_endpoints_do_not_issue_per_row_queries(client, db):
+    # число запросов не зависит от числа тестов, вопросов и результатов: без N+1
+    small = list_endpoint_counts(client, *seed(db, tests=1, questions=1))
+    large = list_endpoint_counts(client, *seed(db, tests=10, questions=8))
+    assert small == large
+    assert max(large.values()) <= MAX_STATEMENTS_PER_LIST, large
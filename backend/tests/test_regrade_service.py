@@ -0,0 +1,56 @@
+import random
+import numpy as np
+from app.models.question import QuestionType
+from app.services.answer_key import AnswerKeyService, CompiledAnswerKey
+from app.services.regrade_service import RegradeService
+
+
+def build_key() -> CompiledAnswerKey:
+    questions = [
+        AnswerKeyService.compile_question(1, QuestionType.SINGLE, 1, ["a"], ["a", "b", "c"]),
+        AnswerKeyService.compile_question(2, QuestionType.MULTIPLE, 2, ["a", "c"], ["a", "b", "c"]),
+        AnswerKeyService.compile_question(3, QuestionType.TEXT, 1, [], []),
+        # правильный ответ вне вариантов: проверяется сравнением строк
+        AnswerKeyService.compile_question(4, QuestionType.SINGLE, 1, ["x"], ["a", "b"]),
+        AnswerKeyService.compile_question(5, QuestionType.MULTIPLE, 1, ["o70"], [f"o{index}" for index in range(80)]),
+        AnswerKeyService.compile_question(6, QuestionType.SINGLE, 1, [], ["a", "b"]),
+    ]
+    return CompiledAnswerKey(
+        test_id=1,
+        questions={question.question_id: question for question in questions},
+        max_score=sum(question.points for question in questions),
+    )
+
+
+def random_answer(rng, question):
+    choice = rng.random()
+    if choice < 0.15:
+        return None
+    if choice < 0.3:
+        return [rng.choice(["x", "zzz"])]
+    selected = rng.sample(question.options, rng.randint(1, min(2, len(question.options)))) if question.options else ["text"]
+    return question.encode(selected) if choice < 0.8 else selected
+
+
+def test_matrix_matches_per_answer_check():
+    rng = random.Random(7)
+    answer_key = build_key()
+    gradable = [question for question in answer_key.questions.values() if question.question_type != QuestionType.TEXT]
+    answers = []
+    for _ in range(500):
+        row = {}
+        for question in answer_key.questions.values():
+            stored = random_answer(rng, question)
+            if stored is not None:
+                row[str(question.question_id)] = stored
+        answers.append(row)
+
+    expected = np.array(
+        [[question.is_correct(row.get(str(question.question_id)) or ()) for question in gradable] for row in answers],
+        dtype=bool,
+    )
+    assert np.array_equal(RegradeService.correctness_matrix(answer_key, answers), expected)
+
+
+def test_empty_chunk():
+    assert RegradeService.correctness_matrix(build_key(), []).shape == (0, 5)
@@ -0,0 +1,13 @@
+from app.models.user import UserRole
+from conftest import auth_headers, create_test, create_user
+
+
+def test_token_of_deleted_user_is_rejected(client, db, teacher):
+    test = create_test(db, teacher)
+    user = create_user(db, UserRole.STUDENT)
+    headers = auth_headers(user)
+    db.delete(user)
+    db.commit()
+
+    response = client.post("/api/attempts", json={"test_id": test.id}, headers=headers)
+    assert response.status_code == 401
@@ -0,0 +1,59 @@
+import random
+from concurrent.futures import ThreadPoolExecutor
+from app.core.database import SessionLocal
+from app.models.question import Question
+from app.models.test_statistics import TestStatistics
+from app.services.result_service import ResultService
+from app.services.statistics_service import StatisticsService
+from conftest import create_test
+
+SUBMITS = 100
+
+
+def test_summary_matches_rebuild_after_concurrent_submits(db, teacher, student):
+    test = create_test(db, teacher, questions=5)
+    question_ids = [question_id for (question_id,) in db.query(Question.id).filter(Question.test_id == test.id)]
+
+    def submit(seed: int) -> None:
+        rng = random.Random(seed)
+        session = SessionLocal()
+        try:
+            answers = {question_id: [rng.choice("abc")] for question_id in question_ids}
+            ResultService.add_result(session, test.id, student.id, answers, 10)
+            session.commit()
+        finally:
+            session.close()
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        list(executor.map(submit, range(SUBMITS)))
+
+    report = StatisticsService.rebuild_summaries(db, [test.id], check_only=True)
+    assert report == [{"test_id": test.id, "attempts": SUBMITS, "drift": []}]
+
+
+def test_estimated_percentiles_stay_inside_the_bucket(db, teacher, student):
+    test = create_test(db, teacher, questions=4)
+    question_ids = [question_id for (question_id,) in
+                    db.query(Question.id).filter(Question.test_id == test.id).order_by(Question.order_number)]
+    # 0, 25, 50, 75, 100 %: по одному результату в интервалах 0, 20, 50, 70 и 90
+    for correct in range(5):
+        answers = {question_id: ["a" if position < correct else "b"] for position, question_id in enumerate(question_ids)}
+        ResultService.add_result(db, test.id, student.id, answers, 10)
+    db.commit()
+
+    summary = db.get(TestStatistics, test.id)
+    assert StatisticsService.estimate_percentiles(summary) == {25: 20, 50: 50, 75: 70, 90: 90}
+    exact = StatisticsService.get_live_statistics(db, test.id)["percentiles"]
+    assert exact == {25: 25, 50: 50, 75: 75, 90: 100}
+
+
+def test_sql_statistics_match_python_reference(db, teacher, student):
+    test = create_test(db, teacher, questions=7)
+    question_ids = [question_id for (question_id,) in db.query(Question.id).filter(Question.test_id == test.id)]
+    rng = random.Random(7)
+    for _ in range(40):
+        answers = {question_id: [rng.choice("abc")] for question_id in question_ids}
+        ResultService.add_result(db, test.id, student.id, answers, 10)
+    db.commit()
+
+    assert StatisticsService.get_live_statistics(db, test.id) == StatisticsService.get_statistics_python(db, test.id)
@@ -0,0 +1,142 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy.exc import IntegrityError, OperationalError
+from app.core.config import settings
+from app.schemas.result import TestSubmit
+from app.services import submission_queue
+from app.services.submission_queue import (
+    DONE, FAILED, PENDING, PROCESSING, SubmissionJournal, SubmissionQueueService,
+)
+from conftest import auth_headers, create_test
+
+
+@pytest.fixture
+def journal(tmp_path, monkeypatch):
+    journal = SubmissionJournal(str(tmp_path / "queue.db"))
+    monkeypatch.setattr(SubmissionQueueService, "_journal", journal)
+    yield journal
+    journal.close()
+
+
+def enqueue(test, student, count: int = 1):
+    return [
+        SubmissionQueueService.enqueue(student.id, TestSubmit(test_id=test.id, answers={}))
+        for _ in range(count)
+    ]
+
+
+def test_claims_do_not_overlap(db, teacher, student, journal):
+    test = create_test(db, teacher)
+    receipts = enqueue(test, student, 5)
+
+    first = journal.claim("worker-1", 3)
+    second = journal.claim("worker-2", 3)
+
+    assert [entry.receipt for entry in first] == receipts[:3]
+    assert [entry.receipt for entry in second] == receipts[3:]
+    assert journal.claim("worker-3", 3) == []
+    assert journal.get(receipts[0])["status"] == PROCESSING
+
+
+def test_transient_error_keeps_entry_pending(db, teacher, student, journal, monkeypatch):
+    test = create_test(db, teacher)
+    receipt, = enqueue(test, student)
+
+    def locked(db, entries):
+        raise OperationalError("INSERT", {}, Exception("database is locked"))
+
+    monkeypatch.setattr(SubmissionQueueService, "insert_batch", locked)
+    SubmissionQueueService.drain_once(10)
+
+    entry = journal.get(receipt)
+    assert entry["status"] == PENDING
+    assert "database is locked" in entry["error"]
+
+
+def test_permanent_error_marks_entry_failed(db, teacher, student, journal, monkeypatch):
+    test = create_test(db, teacher)
+    receipt, = enqueue(test, student)
+
+    def broken(db, entries):
+        raise IntegrityError("INSERT", {}, Exception("constraint failed"))
+
+    monkeypatch.setattr(SubmissionQueueService, "insert_batch", broken)
+    SubmissionQueueService.drain_once(10)
+
+    assert journal.get(receipt)["status"] == FAILED
+
+
+def test_entry_fails_after_max_attempts(db, teacher, student, journal, monkeypatch):
+    test = create_test(db, teacher)
+    receipt, = enqueue(test, student)
+    monkeypatch.setattr(submission_queue.settings, "SUBMISSION_QUEUE_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(submission_queue.settings, "SUBMISSION_QUEUE_POLL_SECONDS", 0)
+
+    for _ in range(2):
+        entries = journal.claim("worker", 10)
+        journal.complete("worker", {}, {}, {entry.receipt: "database is locked" for entry in entries})
+
+    assert journal.get(receipt)["status"] == FAILED
+
+
+def test_drain_inserts_result(db, teacher, student, journal):
+    test = create_test(db, teacher)
+    receipt, = enqueue(test, student)
+
+    SubmissionQueueService.drain_once(10)
+
+    entry = journal.get(receipt)
+    assert entry["status"] == DONE
+    assert entry["result_id"] is not None
+
+
+def test_deleting_test_cancels_queued_submissions(client, db, teacher, student, journal, monkeypatch):
+    test = create_test(db, teacher)
+    other = create_test(db, teacher)
+    claimed, pending = enqueue(test, student, 2)
+    unrelated, = enqueue(other, student)
+    journal.claim("worker", 1)
+    monkeypatch.setattr(settings, "SUBMISSION_QUEUE_ENABLED", True)
+
+    response = client.delete(f"/api/tests/{test.id}", headers=auth_headers(teacher))
+
+    assert response.status_code == 204
+    for receipt in (claimed, pending):
+        entry = journal.get(receipt)
+        assert entry["status"] == FAILED
+        assert entry["error"] == "Test deleted"
+    assert journal.get(unrelated)["status"] == PENDING
+    # worker, захвативший запись до удаления, не отметит ее выполненной
+    journal.complete("worker", {claimed: 1}, {})
+    assert journal.get(claimed)["status"] == FAILED
+
+
+def test_error_before_batch_is_split_is_retried(db, teacher, student, journal, monkeypatch):
+    test = create_test(db, teacher)
+    receipt, = enqueue(test, student)
+    monkeypatch.setattr(submission_queue.settings, "SUBMISSION_QUEUE_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(submission_queue.settings, "SUBMISSION_QUEUE_POLL_SECONDS", 0)
+
+    def broken(db, entries):
+        raise RuntimeError("receipts lookup failed")
+
+    monkeypatch.setattr(SubmissionQueueService, "process_batch", broken)
+    SubmissionQueueService.drain_once(10)
+
+    entry = journal.get(receipt)
+    assert entry["status"] == PENDING
+    assert entry["error"] == "receipts lookup failed"
+
+    SubmissionQueueService.drain_once(10)
+    assert journal.get(receipt)["status"] == FAILED
+
+
+def test_released_stale_claims_count_as_attempts(db, teacher, student, journal, monkeypatch):
+    test = create_test(db, teacher)
+    receipt, = enqueue(test, student)
+    monkeypatch.setattr(submission_queue.settings, "SUBMISSION_QUEUE_MAX_ATTEMPTS", 2)
+
+    for status in (PENDING, FAILED):
+        journal.claim("worker", 10)
+        journal.release_stale(datetime.utcnow() + timedelta(seconds=1))
+        assert journal.get(receipt)["status"] == status
@@ -0,0 +1,45 @@
+import pytest
+from app.models.question import Question
+from app.schemas.test import TestClone
+from app.services.test_service import TestService
+from conftest import auth_headers, create_test
+
+
+def question_ids(db, test) -> list:
+    return [question_id for (question_id,) in
+            db.query(Question.id).filter(Question.test_id == test.id).order_by(Question.order_number)]
+
+
+def test_clone_rejects_duplicate_and_foreign_questions(db, teacher):
+    test = create_test(db, teacher)
+    first, *_ = question_ids(db, test)
+
+    with pytest.raises(ValueError, match="Duplicate"):
+        TestService.clone_test(db, test, TestClone(question_ids=[first, first]), teacher.id)
+    with pytest.raises(ValueError, match="not in this test"):
+        TestService.clone_test(db, test, TestClone(question_ids=[first, 10 ** 9]), teacher.id)
+
+
+def test_reorder_rejects_incomplete_order(db, teacher):
+    test = create_test(db, teacher)
+    ids = question_ids(db, test)
+
+    with pytest.raises(ValueError, match="Duplicate"):
+        TestService.reorder_questions(db, test, [ids[0], *ids])
+    with pytest.raises(ValueError, match="exactly once"):
+        TestService.reorder_questions(db, test, ids[1:])
+
+    reordered = TestService.reorder_questions(db, test, ids[::-1])
+    assert [question.id for question in reordered] == ids[::-1]
+
+
+def test_invalid_question_lists_are_bad_requests(client, db, teacher):
+    test = create_test(db, teacher)
+    ids = question_ids(db, test)
+    headers = auth_headers(teacher)
+
+    response = client.post(f"/api/tests/{test.id}/clone", json={"question_ids": [ids[0], ids[0]]}, headers=headers)
+    assert response.status_code == 400
+    response = client.put(f"/api/tests/{test.id}/questions/order", json={"question_ids": ids[1:]}, headers=headers)
+    assert response.status_code == 400
+    assert "missing" in response.json()["detail"]
@@ -1,6 +1,8 @@
 import axios, { AxiosInstance, AxiosError } from 'axios';
 
 const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || 'http://localhost:8000/api';
+const PAGE_SIZE = 500;
+const NEXT_CURSOR_HEADER = 'x-next-cursor';
 
 export interface User {
   id: number;
@@ -112,6 +114,21 @@ class ApiClient {
     );
   }
 
+  // Списки отдаются страницами: следующая запрашивается по курсору из заголовка X-Next-Cursor
+  private async getAllPages<T>(url: string, params: Record<string, unknown> = {}): Promise<T[]> {
+    const items: T[] = [];
+    let cursor: string | undefined;
+    do {
+      const response = await this.client.get<T[]>(url, {
+        params: { ...params, limit: PAGE_SIZE, ...(cursor ? { cursor } : {}) },
+      });
+      items.push(...response.data);
+      const next = response.headers[NEXT_CURSOR_HEADER];
+      cursor = typeof next === 'string' && next ? next : undefined;
+    } while (cursor);
+    return items;
+  }
+
   // Auth
   async login(email: string, password: string): Promise<AuthResponse> {
     const { data } = await this.client.post<AuthResponse>('/auth/login', {
@@ -138,15 +155,11 @@ class ApiClient {
 
   // Tests
   async getTests(activeOnly: boolean = true): Promise<Test[]> {
-    const { data } = await this.client.get<Test[]>('/tests', {
-      params: { active_only: activeOnly },
-    });
-    return data;
+    return this.getAllPages<Test>('/tests', { active_only: activeOnly });
   }
 
   async getMyTests(): Promise<Test[]> {
-    const { data } = await this.client.get<Test[]>('/tests/my');
-    return data;
+    return this.getAllPages<Test>('/tests/my');
   }
 
   async getTest(id: number): Promise<Test> {
@@ -193,13 +206,11 @@ class ApiClient {
   }
 
   async getMyResults(): Promise<TestResult[]> {
-    const { data } = await this.client.get<TestResult[]>('/results/my');
-    return data;
+    return this.getAllPages<TestResult>('/results/my');
   }
 
   async getTestResults(testId: number): Promise<TestResult[]> {
-    const { data } = await this.client.get<TestResult[]>(`/results/test/${testId}`);
-    return data;
+    return this.getAllPages<TestResult>(`/results/test/${testId}`);
   }
 
   async getTestStatistics(testId: number): Promise<Statistics> {